@@ -1,11 +1,47 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+
+from core.security import get_hash_executor, shutdown_hash_executor
+from dao.users import UserRepository, UserAlreadyExistsError
+from db import database, create_db_and_tables
 from routers import auth
 
+# Demo account, password "secret"
+DEMO_USER = {
+    "username": "testuser",
+    "email": "test@example.com",
+    "hashed_password": "$2b$12$O8p1FmLGdlnth6U/zvxzOebKoMJft6ozXwuFg1BaD.rgHJL1Cnp8a",
+}
+
+
+async def seed_demo_user():
+    async with database.session_maker() as session:
+        users = UserRepository(session)
+        if await users.get_by_username(DEMO_USER["username"]) is None:
+            try:
+                await users.create(**DEMO_USER)
+            except UserAlreadyExistsError:
+                pass  # Seeded by another worker
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await create_db_and_tables()
+    await seed_demo_user()
+    # Start the password hashing pool before the first login arrives
+    get_hash_executor()
+    yield
+    shutdown_hash_executor()
+    await database.dispose()
+
+
 app = FastAPI(
     title="JWT Authentication Service",
     description="Centralized authentication service for microservices",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Enable CORS for remote servers
@@ -27,7 +63,9 @@ async def root():
             "login": "/auth/login",
             "register": "/auth/register",
             "validate": "/auth/validate",
+            "validate_batch": "/auth/validate/batch",
             "refresh": "/auth/refresh",
-            "public_key": "/auth/public-key"
+            "public_key": "/auth/public-key",
+            "jwks": "/auth/jwks"
         }
     }
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""
+Login throughput / latency benchmark for /auth/login
+
+Compares the old handler (bcrypt on the event loop) with the current one
+(bcrypt in the password hashing pool) under concurrent load. A probe hits
+the cheap "/" endpoint while logins run, to show how long other requests on
+the same worker are stalled.
+
+    python benchmarks/bench_auth_login.py --requests 64 --concurrency 16
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.security import OAuth2PasswordRequestForm
+
+import auth_app
+from core.security import verify_password
+from dao.users import UserRepository, get_user_repository
+
+
+def build_blocking_app() -> FastAPI:
+    """Login handler as it was before: bcrypt runs inline in the coroutine"""
+    app = FastAPI()
+
+    @app.post("/auth/login")
+    async def login(
+            form_data: OAuth2PasswordRequestForm = Depends(),
+            users: UserRepository = Depends(get_user_repository)
+    ):
+        user = await users.get_by_username(form_data.username)
+        if not user or not verify_password(form_data.password, user.hashed_password):
+            raise HTTPException(status_code=401, detail="Incorrect username or password")
+        return {"username": user.username}
+
+    @app.get("/")
+    async def root():
+        return {}
+
+    return app
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+async def run(app: FastAPI, total: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    latencies = []
+    probe_latencies = []
+    statuses = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(
+                    "/auth/login",
+                    data={"username": "testuser", "password": "secret"}
+                )
+                latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe():
+            # Time the whole cycle, so waiting for a blocked loop is counted too
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.01)
+                await client.get("/")
+                probe_latencies.append(time.perf_counter() - start - 0.01)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    return {
+        "throughput": total / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": percentile(latencies, 0.99),
+        "probe_p99": percentile(probe_latencies, 0.99),
+        "statuses": statuses,
+    }
+
+
+def report(name: str, result: dict):
+    print(
+        f"{name:<10} {result['throughput']:8.1f} req/s  "
+        f"p50 {result['p50']:8.1f} ms  p99 {result['p99']:8.1f} ms  "
+        f"probe p99 {result['probe_p99']:8.1f} ms  "
+        f"status {result['statuses']}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    # Creates the users table and the demo user
+    async with auth_app.lifespan(auth_app.app):
+        report("blocking", await run(build_blocking_app(), args.requests, args.concurrency))
+        report("offloaded", await run(auth_app.app, args.requests, args.concurrency))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+"""
+Benchmark for validate_token_remotely against a local stand-in auth app
+
+Runs a minimal /auth/validate app under uvicorn on localhost and compares:
+  - per-request client: a new httpx.AsyncClient (and TCP connection) per call
+  - pooled client:      the shared client from dependencies.get_auth_client
+  - pooled + cache:     the shared client with the short-TTL result cache on
+
+    python benchmarks/bench_remote_validation.py --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Header
+
+import dependencies
+from schemas.auth import TokenValidationResponse
+
+TOKENS = [f"token-{i}" for i in range(20)]
+
+
+def build_stand_in_auth_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/auth/validate", response_model=TokenValidationResponse)
+    async def validate(authorization: str = Header(...)):
+        return TokenValidationResponse(valid=True, user_id=1, username="testuser")
+
+    return app
+
+
+def start_server(app: FastAPI) -> tuple[uvicorn.Server, str]:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def per_request_client(token: str) -> dict:
+    """validate_token_remotely as it was: one client per call"""
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            f"{dependencies.settings.AUTH_SERVER_URL}/auth/validate",
+            headers={"Authorization": f"Bearer {token}"},
+            timeout=5.0
+        )
+        return response.json()
+
+
+async def run(validate, total: int, concurrency: int) -> dict:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            await validate(TOKENS[i % len(TOKENS)])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "throughput": total / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def report(name: str, result: dict):
+    print(
+        f"{name:<20} {result['throughput']:8.1f} req/s  "
+        f"p50 {result['p50']:7.2f} ms  p99 {result['p99']:7.2f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--cache-ttl", type=int, default=5)
+    args = parser.parse_args()
+
+    server, url = start_server(build_stand_in_auth_app())
+    dependencies.settings.AUTH_SERVER_URL = url
+
+    try:
+        report("per-request client", await run(per_request_client, args.requests, args.concurrency))
+
+        dependencies.remote_validation_cache.ttl = 0
+        report("pooled client", await run(dependencies.validate_token_remotely, args.requests, args.concurrency))
+
+        dependencies.remote_validation_cache.ttl = args.cache_ttl
+        report("pooled + cache", await run(dependencies.validate_token_remotely, args.requests, args.concurrency))
+        print(f"cache: {dependencies.remote_validation_cache.stats()}")
+    finally:
+        await dependencies.close_auth_client()
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""
+Load benchmark for the auth service's user repository
+
+Bulk-loads users into a scratch SQLite database, then measures username
+lookups (the query behind every /auth/validate and /auth/refresh call):
+  - indexed:     cache disabled, every lookup hits the unique username index
+  - read-through: lookups over a hot set of users with the cache enabled
+
+    python benchmarks/bench_user_store.py --users 1000000 --lookups 20000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from dao.users import UserRepository, user_cache
+from models.users import User
+
+HASHED_PASSWORD = "$2b$12$O8p1FmLGdlnth6U/zvxzOebKoMJft6ozXwuFg1BaD.rgHJL1Cnp8a"
+CHUNK_SIZE = 50000
+
+
+async def load_users(engine, total: int) -> float:
+    start = time.perf_counter()
+    for offset in range(0, total, CHUNK_SIZE):
+        rows = [
+            {
+                "username": f"user{i}",
+                "email": f"user{i}@example.com",
+                "hashed_password": HASHED_PASSWORD,
+                "is_active": True,
+            }
+            for i in range(offset, min(offset + CHUNK_SIZE, total))
+        ]
+        async with engine.begin() as conn:
+            await conn.execute(insert(User), rows)
+    return time.perf_counter() - start
+
+
+async def lookups(session_maker, usernames: list[str]) -> dict:
+    latencies = []
+    async with session_maker() as session:
+        users = UserRepository(session)
+        start = time.perf_counter()
+        for username in usernames:
+            lookup_start = time.perf_counter()
+            assert await users.get_by_username(username) is not None
+            latencies.append(time.perf_counter() - lookup_start)
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "throughput": len(usernames) / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def report(name: str, result: dict):
+    print(
+        f"{name:<13} {result['throughput']:9.1f} lookups/s  "
+        f"p50 {result['p50']:7.3f} ms  p99 {result['p99']:7.3f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--hot-set", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp}/users.db")
+        session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+
+        elapsed = await load_users(engine, args.users)
+        print(f"loaded {args.users} users in {elapsed:.1f}s")
+
+        random_names = [f"user{random.randrange(args.users)}" for _ in range(args.lookups)]
+        user_cache.ttl = 0
+        report("indexed", await lookups(session_maker, random_names))
+
+        hot_names = [f"user{random.randrange(args.hot_set)}" for _ in range(args.lookups)]
+        user_cache.ttl = 60
+        report("read-through", await lookups(session_maker, hot_names))
+        print(f"cache: {user_cache.stats()}")
+
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
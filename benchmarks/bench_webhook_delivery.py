@@ -0,0 +1,133 @@
+"""
+Benchmark for the webhook outbox and dispatcher against local stub receivers
+
+Creates subscriptions pointing at a minimal receiver app running under uvicorn
+on localhost, enqueues events into a fresh outbox database and drains it with
+WebhookDispatcher.run_until_idle, reporting enqueue and delivery rates.
+--dead-subscribers adds subscriptions to a second receiver that answers 503
+after --dead-latency seconds, to see how much capacity they take.
+--batch-size and --gzip put the live subscriptions in batch mode.
+
+    python benchmarks/bench_webhook_delivery.py --events 100000 --subscribers 1 --workers 64
+    python benchmarks/bench_webhook_delivery.py --events 5000 --dead-subscribers 3
+    python benchmarks/bench_webhook_delivery.py --events 100000 --batch-size 500 --gzip
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from bench_remote_validation import start_server
+from db import Database
+from webhooks.delivery import close_webhook_client
+from webhooks.dispatcher import WebhookDispatcher, enqueue_event
+from webhooks.models import Base, WebhookDelivery, WebhookLog, WebhookSubscription
+from webhooks.routing import subscription_events
+
+
+def build_receiver_app(latency: float = 0.0, status_code: int = 200, received: dict = None) -> FastAPI:
+    app = FastAPI()
+    received = received if received is not None else {}
+
+    @app.post("/hook")
+    async def hook(request: Request):
+        body = await request.body()
+        received["requests"] = received.get("requests", 0) + 1
+        received["bytes"] = received.get("bytes", 0) + len(body)
+        if latency:
+            await asyncio.sleep(latency)
+        return Response(status_code=status_code)
+
+    return app
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--subscribers", type=int, default=1)
+    parser.add_argument("--dead-subscribers", type=int, default=0)
+    parser.add_argument("--dead-latency", type=float, default=1.0)
+    parser.add_argument("--no-circuit-breaker", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--batch-window", type=float, default=0.1)
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--workers", type=int, default=64)
+    parser.add_argument("--claim-batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    received = {}
+    server, url = start_server(build_receiver_app(received=received))
+    dead_server, dead_url = start_server(build_receiver_app(args.dead_latency, 503))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(f"sqlite+aiosqlite:///{tmp}/webhooks.db", session_class=AsyncSession)
+        await database.create_all(Base.metadata)
+
+        try:
+            async with database.session_maker() as db:
+                subscriptions = [
+                    WebhookSubscription(
+                        url=f"{url}/hook",
+                        events=json.dumps(["bench.event"]),
+                        secret="bench-secret",
+                        batch_max_size=args.batch_size,
+                        batch_window_seconds=args.batch_window,
+                        gzip=args.gzip
+                    )
+                    for _ in range(args.subscribers)
+                ] + [
+                    WebhookSubscription(url=f"{dead_url}/hook", events=json.dumps(["bench.event"]))
+                    for _ in range(args.dead_subscribers)
+                ]
+                db.add_all(subscriptions)
+                await db.flush()
+                for subscription in subscriptions:
+                    db.add_all(subscription_events(subscription.id, ["bench.event"]))
+                await db.commit()
+
+            start = time.perf_counter()
+            async with database.session_maker() as db:
+                for i in range(args.events):
+                    await enqueue_event(db, "bench.event", {"sequence": i})
+            enqueue_elapsed = time.perf_counter() - start
+
+            dispatcher = WebhookDispatcher(
+                database,
+                workers=args.workers,
+                claim_batch_size=args.claim_batch_size,
+                poll_interval=0.05
+            )
+            if args.no_circuit_breaker:
+                dispatcher.circuit_breaker.failure_threshold = float("inf")
+            start = time.perf_counter()
+            await dispatcher.run_until_idle()
+            deliver_elapsed = time.perf_counter() - start
+
+            async with database.session_maker() as db:
+                delivered = await db.scalar(select(func.count()).where(WebhookLog.success == True))
+                failed = await db.scalar(select(func.count()).where(WebhookLog.success == False))
+                left = await db.scalar(select(func.count()).select_from(WebhookDelivery))
+        finally:
+            await close_webhook_client()
+            await database.dispose()
+            server.should_exit = True
+            dead_server.should_exit = True
+
+    deliveries = args.events * args.subscribers
+    print(f"enqueued {args.events} events in {enqueue_elapsed:.1f}s ({args.events / enqueue_elapsed:.0f} events/s)")
+    print(f"delivered {delivered}/{deliveries} in {deliver_elapsed:.1f}s ({delivered / deliver_elapsed:.0f} deliveries/s)")
+    print(f"failed attempts: {failed}, left in outbox: {left}")
+    print(f"receiver: {received.get('requests', 0)} requests, {received.get('bytes', 0) / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
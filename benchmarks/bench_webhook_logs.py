@@ -0,0 +1,94 @@
+"""
+Benchmark for /webhooks/logs queries on a large webhook_logs table
+
+Fills a fresh webhooks database with --logs rows spread over --subscriptions
+subscriptions and times, per query:
+  - first page: the keyset query (newest first by id) with the indexes
+  - deep page:  the keyset query starting from a before_id halfway down
+  - unindexed:  the old query (filter by subscription, newest first by
+                created_at) after dropping the log indexes
+
+    python benchmarks/bench_webhook_logs.py --logs 1000000 --subscriptions 1000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import Database
+from webhooks.models import Base, WebhookEvent, WebhookLog
+
+CHUNK = 50000
+
+
+async def timed(database: Database, query, runs: int) -> float:
+    start = time.perf_counter()
+    async with database.session_maker() as db:
+        for _ in range(runs):
+            (await db.execute(query)).scalars().all()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logs", type=int, default=1000000)
+    parser.add_argument("--subscriptions", type=int, default=1000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(f"sqlite+aiosqlite:///{tmp}/webhooks.db", session_class=AsyncSession)
+        await database.create_all(Base.metadata)
+
+        try:
+            start_time = datetime.utcnow() - timedelta(days=3)
+            async with database.engine.begin() as conn:
+                await conn.execute(insert(WebhookEvent), [{"id": 1, "event": "bench.event", "payload": "{}"}])
+                for offset in range(0, args.logs, CHUNK):
+                    await conn.execute(insert(WebhookLog), [
+                        {
+                            "subscription_id": i % args.subscriptions,
+                            "event": "bench.event",
+                            "event_id": 1,
+                            "status_code": 200,
+                            "success": True,
+                            "attempts": 1,
+                            "created_at": start_time + timedelta(milliseconds=i)
+                        }
+                        for i in range(offset, min(offset + CHUNK, args.logs))
+                    ])
+
+            subscription_id = args.subscriptions // 2
+            by_subscription = select(WebhookLog).where(WebhookLog.subscription_id == subscription_id)
+            middle_id = args.logs // 2
+
+            first_page = by_subscription.order_by(WebhookLog.id.desc()).limit(args.page_size)
+            deep_page = (
+                by_subscription.where(WebhookLog.id < middle_id)
+                .order_by(WebhookLog.id.desc())
+                .limit(args.page_size)
+            )
+            print(f"{args.logs} logs, {args.logs // args.subscriptions} per subscription")
+            print(f"{'first page':<12} {await timed(database, first_page, args.runs):9.3f} ms")
+            print(f"{'deep page':<12} {await timed(database, deep_page, args.runs):9.3f} ms")
+
+            async with database.engine.begin() as conn:
+                for index in WebhookLog.__table__.indexes:
+                    await conn.execute(text(f"DROP INDEX {index.name}"))
+            unindexed = by_subscription.order_by(WebhookLog.created_at.desc()).limit(args.page_size)
+            print(f"{'unindexed':<12} {await timed(database, unindexed, max(1, args.runs // 10)):9.3f} ms")
+        finally:
+            await database.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
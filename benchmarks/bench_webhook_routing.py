@@ -0,0 +1,96 @@
+"""
+Benchmark for matching an event to its webhook subscribers
+
+Fills a fresh webhooks database with --subscriptions subscriptions, each to
+one of --event-types event names (plus --wildcards "*" subscriptions), and
+compares per-event lookup time for:
+  - full scan:   load every active subscription and filter its JSON events
+  - index:       webhook_subscription_events lookup, routing cache off
+  - index+cache: SubscriptionRouter with its routing cache
+
+    python benchmarks/bench_webhook_routing.py --subscriptions 50000 --event-types 1000 --hot-events 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import Database
+from webhooks.models import Base, WebhookSubscription, WebhookSubscriptionEvent
+from webhooks.routing import SubscriptionRouter
+
+
+async def full_scan(db: AsyncSession, event: str) -> tuple[int, ...]:
+    """enqueue_event as it was: every active subscription, filtered in Python"""
+    result = await db.execute(
+        select(WebhookSubscription.id, WebhookSubscription.events)
+        .where(WebhookSubscription.active == True)
+    )
+    return tuple(
+        subscription_id
+        for subscription_id, events in result.all()
+        if event in json.loads(events) or "*" in json.loads(events)
+    )
+
+
+async def run(match, database: Database, events: list[str]) -> float:
+    start = time.perf_counter()
+    async with database.session_maker() as db:
+        for event in events:
+            await match(db, event)
+    return (time.perf_counter() - start) / len(events) * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscriptions", type=int, default=50000)
+    parser.add_argument("--event-types", type=int, default=1000)
+    parser.add_argument("--wildcards", type=int, default=5)
+    parser.add_argument("--hot-events", type=int, default=50)  # Distinct event names looked up
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database = Database(f"sqlite+aiosqlite:///{tmp}/webhooks.db", session_class=AsyncSession)
+        await database.create_all(Base.metadata)
+
+        try:
+            subscriptions = [
+                (i + 1, f"event.{i % args.event_types}") for i in range(args.subscriptions)
+            ] + [
+                (args.subscriptions + i + 1, "*") for i in range(args.wildcards)
+            ]
+            async with database.engine.begin() as conn:
+                await conn.execute(insert(WebhookSubscription), [
+                    {"id": subscription_id, "url": "http://127.0.0.1/hook", "events": json.dumps([event]), "active": True}
+                    for subscription_id, event in subscriptions
+                ])
+                await conn.execute(insert(WebhookSubscriptionEvent), [
+                    {"subscription_id": subscription_id, "event": event}
+                    for subscription_id, event in subscriptions
+                ])
+
+            events = [f"event.{i % min(args.hot_events, args.event_types)}" for i in range(args.lookups)]
+            uncached = SubscriptionRouter(ttl=0)
+            cached = SubscriptionRouter()
+
+            async with database.session_maker() as db:
+                matches = len(await full_scan(db, events[0]))
+            print(f"{args.subscriptions + args.wildcards} subscriptions, {matches} match each event")
+            print(f"{'full scan':<12} {await run(full_scan, database, events):8.3f} ms/event")
+            print(f"{'index':<12} {await run(uncached.match, database, events):8.3f} ms/event")
+            print(f"{'index+cache':<12} {await run(cached.match, database, events):8.3f} ms/event")
+        finally:
+            await database.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
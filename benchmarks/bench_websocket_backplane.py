@@ -0,0 +1,101 @@
+"""
+Benchmark for chat fan-out across processes over the Unix socket backplane
+
+Starts --nodes processes, each a ConnectionManager with a UnixSocketBackplane
+and its share of --clients simulated clients (see bench_websocket_broadcast).
+The first node broadcasts --messages messages; every node delivers them to
+its own clients. Reports the time until every client, on every node, had
+each message, to compare one node holding all clients with several sharing
+them:
+
+    python benchmarks/bench_websocket_backplane.py --clients 40000 --nodes 1
+    python benchmarks/bench_websocket_backplane.py --clients 40000 --nodes 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_websocket_broadcast import SimulatedClient, percentile
+from chat.backplane import UnixSocketBackplane
+from chat.manager import ConnectionManager
+
+
+async def run_node(index: int, args, directory: str, barrier, results) -> None:
+    arrivals: dict[int, tuple[int, float]] = {}
+    manager = ConnectionManager(backplane=UnixSocketBackplane(directory, refresh_interval=3600))
+    await manager.start()
+    clients = args.clients // args.nodes
+    for _ in range(clients):
+        await manager.connect(SimulatedClient(arrivals))
+
+    await asyncio.to_thread(barrier.wait)
+
+    sent_at = {}
+    if index == 0:
+        for seq in range(args.messages):
+            sent_at[seq] = time.perf_counter()
+            await manager.broadcast(str(seq))
+            await asyncio.sleep(args.interval)
+
+    deadline = time.perf_counter() + args.drain_timeout
+    while time.perf_counter() < deadline:
+        if all(arrivals.get(seq, (0, 0.0))[0] == clients for seq in range(args.messages)):
+            break
+        await asyncio.sleep(0.01)
+
+    await manager.stop()
+    results.put((index, sent_at, {seq: arrivals.get(seq, (0, None)) for seq in range(args.messages)}))
+
+
+def node_main(index: int, args, directory: str, barrier, results) -> None:
+    asyncio.run(run_node(index, args, directory, barrier, results))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=40000)
+    parser.add_argument("--nodes", type=int, default=4)
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.02)
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        barrier = multiprocessing.Barrier(args.nodes)
+        results = multiprocessing.Queue()
+        nodes = [
+            multiprocessing.Process(target=node_main, args=(index, args, directory, barrier, results))
+            for index in range(args.nodes)
+        ]
+        for node in nodes:
+            node.start()
+        collected = [results.get() for _ in nodes]
+        for node in nodes:
+            node.join()
+
+    sent_at = next(sent for index, sent, _ in collected if index == 0)
+    clients = args.clients // args.nodes
+    fan_out = []
+    delivered = 0
+    for seq, start in sent_at.items():
+        node_arrivals = [arrivals[seq] for _, _, arrivals in collected]
+        delivered += sum(count for count, _ in node_arrivals)
+        if all(count == clients for count, _ in node_arrivals):
+            fan_out.append(max(arrived for _, arrived in node_arrivals) - start)
+
+    print(f"{clients * args.nodes} clients on {args.nodes} nodes, {args.messages} messages")
+    print(
+        f"fan-out p50 {statistics.median(fan_out) * 1000:8.1f} ms  p99 {percentile(fan_out, 0.99):8.1f} ms  "
+        f"delivered {delivered / (clients * args.nodes * args.messages) * 100:5.1f}%"
+    )
+
+
+if __name__ == "__main__":
+    main()
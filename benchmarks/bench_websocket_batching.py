@@ -0,0 +1,101 @@
+"""
+Benchmark for batched and binary chat frames, with permessage-deflate
+
+Connects --clients simulated clients to a ConnectionManager and broadcasts
+--rate messages a second for --duration seconds, for each way a client can
+connect: text or msgpack encoding, one frame per message or batched. The
+clients count frames and bytes sent to them, raw and as permessage-deflate
+would put them on the wire (one zlib stream per connection, flushed per
+frame). Reports per client: frames, raw KB and deflated KB, and the CPU
+time the run took.
+
+    python benchmarks/bench_websocket_batching.py --clients 1000 --rate 2000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat.encoding import MessageEncoding
+from chat.manager import ConnectionManager
+
+
+class CountingClient:
+    """Stands in for a WebSocket; counts frames and bytes, deflating like permessage-deflate"""
+
+    def __init__(self):
+        self.frames = 0
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self._deflate = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000, reason: str = None):
+        pass
+
+    async def send_text(self, message: str):
+        await self.send_bytes(message.encode())
+
+    async def send_bytes(self, data: bytes):
+        self.frames += 1
+        self.raw_bytes += len(data)
+        # The 4-byte 00 00 ff ff tail of each flush is not sent
+        self.wire_bytes += len(self._deflate.compress(data) + self._deflate.flush(zlib.Z_SYNC_FLUSH)) - 4
+
+
+async def run(args, encoding: str, batch: bool) -> dict:
+    manager = ConnectionManager(max_queue_size=100000)
+    await manager.start()
+    clients = [CountingClient() for _ in range(args.clients)]
+    for client_id, client in enumerate(clients):
+        await manager.connect(client, client_id, encoding=encoding, batch=batch)
+
+    messages = int(args.rate * args.duration)
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    for seq in range(messages):
+        await manager.broadcast(f'{{"user": {seq % 100}, "text": "message number {seq} in the chat"}}')
+        # Keep to the rate, yielding so writers run
+        await asyncio.sleep(max(0.0, start + (seq + 1) / args.rate - time.perf_counter()))
+    # Until the writers are done
+    frames = -1
+    while frames != sum(client.frames for client in clients):
+        frames = sum(client.frames for client in clients)
+        await asyncio.sleep(0.2)
+    cpu = time.process_time() - cpu_start
+
+    await manager.stop()
+    return {
+        "frames": sum(client.frames for client in clients) / len(clients),
+        "raw_kb": sum(client.raw_bytes for client in clients) / len(clients) / 1024,
+        "wire_kb": sum(client.wire_bytes for client in clients) / len(clients) / 1024,
+        "cpu": cpu,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=2000)
+    parser.add_argument("--duration", type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients, {args.rate:.0f} messages/s for {args.duration:.0f} s")
+    for encoding in (MessageEncoding.TEXT, MessageEncoding.MSGPACK):
+        for batch in (False, True):
+            result = await run(args, encoding, batch)
+            name = f"{encoding}{' batched' if batch else ''}"
+            print(
+                f"{name:<16} frames {result['frames']:8.0f}  raw {result['raw_kb']:8.1f} KB  "
+                f"deflated {result['wire_kb']:8.1f} KB  cpu {result['cpu']:6.2f} s"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
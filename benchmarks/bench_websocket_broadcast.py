@@ -0,0 +1,156 @@
+"""
+Benchmark for chat broadcast fan-out to many WebSocket clients
+
+Connects --clients simulated clients (in-memory sockets, no network) to a
+ConnectionManager, --slow-clients of which take --slow-latency seconds per
+message and --dead-clients of which fail every send, then broadcasts
+--messages messages --interval seconds apart. For each message it reports
+how long until every healthy client had it (fan-out latency) and how long
+the broadcast call took, for:
+  - sequential: the old broadcast, awaiting send_text on each client in turn
+  - queued:     ConnectionManager, a bounded queue and writer task per client
+
+    python benchmarks/bench_websocket_broadcast.py --clients 10000 --slow-clients 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat.manager import ConnectionManager
+
+
+class SimulatedClient:
+    """Stands in for a WebSocket; records when each message arrives"""
+
+    def __init__(self, arrivals: dict, latency: float = 0.0, dead: bool = False, healthy: bool = True):
+        self.arrivals = arrivals
+        self.latency = latency
+        self.dead = dead
+        self.healthy = healthy
+
+    async def accept(self):
+        pass
+
+    async def close(self, code: int = 1000, reason: str = None):
+        pass
+
+    async def send_text(self, message: str):
+        if self.dead:
+            raise ConnectionResetError("Connection lost")
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.healthy:
+            seq = int(message)
+            count, _ = self.arrivals.get(seq, (0, 0.0))
+            self.arrivals[seq] = (count + 1, time.perf_counter())
+
+
+class SequentialManager:
+    """ConnectionManager.broadcast as it was"""
+
+    def __init__(self):
+        self.active_connections = []
+
+    async def connect(self, websocket):
+        await websocket.accept()
+        self.active_connections.append(websocket)
+
+    async def broadcast(self, message: str):
+        for connection in self.active_connections:
+            await connection.send_text(message)
+
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+async def run(manager, args) -> dict:
+    arrivals: dict[int, tuple[int, float]] = {}
+    kinds = (
+        ["slow"] * args.slow_clients
+        + ["dead"] * args.dead_clients
+        + ["healthy"] * (args.clients - args.slow_clients - args.dead_clients)
+    )
+    random.Random(0).shuffle(kinds)
+    for kind in kinds:
+        await manager.connect(SimulatedClient(
+            arrivals,
+            latency=args.slow_latency if kind == "slow" else 0.0,
+            dead=kind == "dead",
+            healthy=kind == "healthy"
+        ))
+    healthy = kinds.count("healthy")
+
+    sent_at = {}
+    call_times = []
+    errors = 0
+    for seq in range(args.messages):
+        sent_at[seq] = time.perf_counter()
+        try:
+            await manager.broadcast(str(seq))
+        except Exception:
+            # The old loop stops at the first dead socket
+            errors += 1
+        call_times.append(time.perf_counter() - sent_at[seq])
+        await asyncio.sleep(args.interval)
+
+    # Give writer tasks time to drain
+    deadline = time.perf_counter() + args.drain_timeout
+    while time.perf_counter() < deadline:
+        if all(arrivals.get(seq, (0, 0.0))[0] == healthy for seq in sent_at):
+            break
+        await asyncio.sleep(0.01)
+
+    complete = [seq for seq in sent_at if arrivals.get(seq, (0, 0.0))[0] == healthy]
+    fan_out = [arrivals[seq][1] - sent_at[seq] for seq in complete]
+    delivered = sum(arrivals.get(seq, (0, 0.0))[0] for seq in sent_at)
+    return {
+        "fan_out_p50": statistics.median(fan_out) * 1000 if fan_out else float("nan"),
+        "fan_out_p99": percentile(fan_out, 0.99) if fan_out else float("nan"),
+        "call_p50": statistics.median(call_times) * 1000,
+        "delivered": delivered / (healthy * len(sent_at)) * 100,
+        "errors": errors,
+        "connections": len(manager.active_connections),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--slow-clients", type=int, default=10)
+    parser.add_argument("--slow-latency", type=float, default=0.05)
+    parser.add_argument("--dead-clients", type=int, default=1)
+    parser.add_argument("--messages", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.01)
+    parser.add_argument("--queue-size", type=int, default=256)
+    parser.add_argument("--policy", default="drop_oldest", choices=["drop_oldest", "disconnect"])
+    parser.add_argument("--drain-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    print(
+        f"{args.clients} clients, {args.slow_clients} slow ({args.slow_latency * 1000:.0f} ms/message), "
+        f"{args.dead_clients} dead, {args.messages} messages"
+    )
+    managers = {
+        "sequential": SequentialManager(),
+        "queued": ConnectionManager(max_queue_size=args.queue_size, slow_consumer_policy=args.policy),
+    }
+    for name, manager in managers.items():
+        result = await run(manager, args)
+        print(
+            f"{name:<11} fan-out p50 {result['fan_out_p50']:9.1f} ms  p99 {result['fan_out_p99']:9.1f} ms  "
+            f"broadcast call p50 {result['call_p50']:8.2f} ms  "
+            f"delivered {result['delivered']:5.1f}%  errors {result['errors']}  "
+            f"connections left {result['connections']}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
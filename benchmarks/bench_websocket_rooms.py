@@ -0,0 +1,74 @@
+"""
+Benchmark for room messages and disconnect storms in the chat ConnectionManager
+
+Connects --clients simulated clients (see bench_websocket_broadcast), each
+subscribed to one of --rooms rooms, and times:
+  - room message: sending one message to a room, as the old manager had to
+                  (to everyone) and with room membership (to the room only)
+  - disconnect:   every client disconnecting, from the old list of
+                  connections (list.remove) and from the manager
+
+    python benchmarks/bench_websocket_rooms.py --clients 50000 --rooms 500
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_websocket_broadcast import SequentialManager, SimulatedClient
+from chat.manager import ConnectionManager
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=50000)
+    parser.add_argument("--rooms", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=100)
+    args = parser.parse_args()
+
+    arrivals: dict[int, tuple[int, float]] = {}
+    clients = [SimulatedClient(arrivals) for _ in range(args.clients)]
+
+    legacy = SequentialManager()
+    manager = ConnectionManager()
+    await manager.start()
+    for client_id, client in enumerate(clients):
+        await legacy.connect(client)
+        connection = await manager.connect(client, client_id)
+        manager.join(connection, f"room-{client_id % args.rooms}")
+    print(f"{args.clients} clients in {args.rooms} rooms")
+
+    start = time.perf_counter()
+    for seq in range(args.messages):
+        await legacy.broadcast(str(seq))
+    legacy_time = (time.perf_counter() - start) / args.messages * 1000
+
+    start = time.perf_counter()
+    for seq in range(args.messages):
+        await manager.broadcast(str(seq), f"room-{seq % args.rooms}")
+    room_time = (time.perf_counter() - start) / args.messages * 1000
+    print(f"{'room message':<14} everyone {legacy_time:9.3f} ms   room only {room_time:9.3f} ms")
+
+    # Clients leave in no particular order
+    random.Random(0).shuffle(clients)
+
+    start = time.perf_counter()
+    for client in clients:
+        legacy.active_connections.remove(client)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for client in clients:
+        manager.disconnect(client)
+    manager_time = time.perf_counter() - start
+    print(f"{'disconnect all':<14} list     {legacy_time * 1000:9.1f} ms   manager   {manager_time * 1000:9.1f} ms")
+
+    await manager.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
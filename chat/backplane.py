@@ -0,0 +1,191 @@
+import asyncio
+import os
+import socket
+import stat
+import tempfile
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Callable, Optional
+
+from core.chat_config import get_settings
+
+settings = get_settings()
+
+MessageHandler = Callable[[bytes], None]
+
+
+class BackplaneKind:
+    MEMORY = "memory"  # One process; several managers in it can share a channel
+    UNIX = "unix"  # Processes on one machine, e.g. uvicorn --workers N
+
+
+class Backplane(ABC):
+    """
+    Carries encoded chat messages between the nodes (processes) of one chat
+
+    A node publishes each message once, already encoded, and the backplane
+    hands it to every other node's handler; nodes deliver to their own
+    clients themselves, including the publishing node. Delivery between
+    nodes is best effort.
+    """
+
+    @abstractmethod
+    async def start(self, handler: MessageHandler) -> None:
+        """Start handing messages from other nodes to `handler`"""
+
+    @abstractmethod
+    async def publish(self, data: bytes) -> None:
+        """Send a message to every other node"""
+
+    @abstractmethod
+    async def stop(self) -> None:
+        """Stop receiving and release the node's resources"""
+
+
+class InProcessBackplane(Backplane):
+    """Backplane between the managers of one process sharing a `channel`"""
+
+    _channels: dict[str, set["InProcessBackplane"]] = {}
+
+    def __init__(self, channel: str = "default"):
+        self.channel = channel
+        self._handler: Optional[MessageHandler] = None
+
+    async def start(self, handler: MessageHandler) -> None:
+        self._handler = handler
+        self._channels.setdefault(self.channel, set()).add(self)
+
+    async def publish(self, data: bytes) -> None:
+        for node in self._channels.get(self.channel, ()):
+            if node is not self:
+                node._handler(data)
+
+    async def stop(self) -> None:
+        nodes = self._channels.get(self.channel, set())
+        nodes.discard(self)
+        if not nodes:
+            self._channels.pop(self.channel, None)
+
+
+class UnixSocketBackplane(Backplane):
+    """
+    Backplane between processes on one machine, over Unix datagram sockets
+
+    Every node binds a socket in `directory` and publishes by sending the
+    datagram to each other socket found there, so there is no broker to
+    run. The directory must be private to the user running the chat, as
+    anyone who can write to it can send to every node; `start` creates it
+    and refuses to use one with another owner or mode than 0700. The
+    directory listing is re-read every `refresh_interval` seconds;
+    a node that has just started may miss messages sent before others
+    see it. Sockets left behind by dead nodes are removed on the first
+    refused send. A node whose receive buffer is full drops the message
+    (counted in `dropped`). A message must fit in one datagram, about
+    200 KB with the default Linux buffer sizes.
+    """
+
+    MAX_DATAGRAM_BYTES = 256 * 1024
+
+    def __init__(
+            self,
+            directory: Optional[str] = settings.CHAT_BACKPLANE_SOCKET_DIR,
+            refresh_interval: float = settings.CHAT_BACKPLANE_REFRESH_SECONDS
+    ):
+        self.directory = directory or default_socket_directory()
+        self.refresh_interval = refresh_interval
+        self.path = os.path.join(self.directory, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+        self.dropped = 0
+        self._handler: Optional[MessageHandler] = None
+        self._socket: Optional[socket.socket] = None
+        self._peers: list[str] = []
+        self._peers_read_at = 0.0
+
+    async def start(self, handler: MessageHandler) -> None:
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        check_private_directory(self.directory)
+        self._handler = handler
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._socket.setblocking(False)
+        self._socket.bind(self.path)
+        asyncio.get_running_loop().add_reader(self._socket.fileno(), self._receive)
+
+    async def publish(self, data: bytes) -> None:
+        for peer in self._current_peers():
+            try:
+                self._socket.sendto(data, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                self._remove_peer(peer)
+            except BlockingIOError:
+                self.dropped += 1
+            except OSError as e:
+                print(f"Chat backplane failed to send {len(data)} bytes to {peer}: {e}")
+
+    async def stop(self) -> None:
+        if self._socket is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._socket.fileno())
+        self._socket.close()
+        self._socket = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _current_peers(self) -> list[str]:
+        now = time.monotonic()
+        if now - self._peers_read_at >= self.refresh_interval:
+            self._peers = [
+                os.path.join(self.directory, name)
+                for name in os.listdir(self.directory)
+                if name.endswith(".sock") and os.path.join(self.directory, name) != self.path
+            ]
+            self._peers_read_at = now
+        return self._peers
+
+    def _remove_peer(self, peer: str) -> None:
+        self._peers = [path for path in self._peers if path != peer]
+        try:
+            os.unlink(peer)
+        except FileNotFoundError:
+            pass
+
+    def _receive(self) -> None:
+        while True:
+            try:
+                data = self._socket.recv(self.MAX_DATAGRAM_BYTES)
+            except (BlockingIOError, InterruptedError):
+                return
+            try:
+                self._handler(data)
+            except Exception as e:
+                print(f"Chat backplane message could not be handled: {e}")
+
+
+def default_socket_directory() -> str:
+    """A per-user runtime directory, shared by the workers of one user"""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "chat-backplane")
+    return os.path.join(tempfile.gettempdir(), f"chat-backplane-{os.getuid()}")
+
+
+def check_private_directory(directory: str) -> None:
+    """Raise RuntimeError unless `directory` is a real directory of this user, mode 0700"""
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode):
+        raise RuntimeError(f"Chat backplane socket directory {directory} is not a directory")
+    if info.st_uid != os.getuid():
+        raise RuntimeError(f"Chat backplane socket directory {directory} is owned by uid {info.st_uid}")
+    if stat.S_IMODE(info.st_mode) != 0o700:
+        raise RuntimeError(
+            f"Chat backplane socket directory {directory} has mode {stat.S_IMODE(info.st_mode):o}, expected 700"
+        )
+
+
+def create_backplane(kind: str = settings.CHAT_BACKPLANE) -> Backplane:
+    if kind == BackplaneKind.MEMORY:
+        return InProcessBackplane()
+    if kind == BackplaneKind.UNIX:
+        return UnixSocketBackplane()
+    raise ValueError(f"Unknown chat backplane {kind!r}")
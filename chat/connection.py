@@ -0,0 +1,145 @@
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Optional, Union
+
+from fastapi import WebSocket, status
+
+from core.chat_config import get_settings
+from core.ratelimit import TokenBucket
+from .encoding import MessageEncoding, encode_batch, encode_message
+
+settings = get_settings()
+
+
+class SlowConsumerPolicy:
+    DROP_OLDEST = "drop_oldest"  # Keep the newest messages, the client misses some
+    DISCONNECT = "disconnect"  # Close the connection, the client reconnects and catches up
+
+
+class Connection:
+    """
+    A client socket with a bounded outbound queue drained by its own writer task
+
+    `send` only queues the message, so a broadcast never waits on a client.
+    When `max_queue_size` messages are already waiting the client is too slow
+    to keep up and `policy` decides: drop its oldest queued message, or
+    disconnect it. A send that fails (the socket is gone) stops the writer.
+    Either way the connection is closed and `on_close` is called once.
+    With a `batch_interval`, the messages queued during each interval are
+    sent together as one frame, in the client's `encoding`.
+    Inbound messages are reported with `received`, which keeps the time of
+    the client's last activity and applies its rate limit. `answers_pings`
+    is set once the client has answered a heartbeat ping.
+    """
+
+    def __init__(
+            self,
+            websocket: WebSocket,
+            on_close: Callable[["Connection"], None],
+            max_queue_size: int = settings.CHAT_SEND_QUEUE_SIZE,
+            policy: str = settings.CHAT_SLOW_CONSUMER_POLICY,
+            client_id: Optional[int] = None,
+            encoding: str = MessageEncoding.TEXT,
+            batch_interval: Optional[float] = None,
+            rate_limit: float = settings.CHAT_RATE_LIMIT_PER_SECOND,
+            rate_limit_burst: int = settings.CHAT_RATE_LIMIT_BURST,
+            sequenced: bool = False
+    ):
+        self.websocket = websocket
+        self.client_id = client_id
+        self.rooms: set[str] = set()  # Kept by the ConnectionManager
+        self.max_queue_size = max_queue_size
+        self.policy = policy
+        self.encoding = encoding
+        self.batch_interval = batch_interval
+        self.sequenced = sequenced  # Gets room messages as numbered frames, see ReplayBuffer
+        self.last_seen = time.monotonic()
+        self.answers_pings = False
+        self.rate_limiter = TokenBucket(rate_limit, rate_limit_burst) if rate_limit else None
+        self.closed = False
+        self.dropped = 0
+        self._on_close = on_close
+        self._queue: deque[str] = deque()
+        self._ready = asyncio.Event()
+        self._writer: Optional[asyncio.Task] = None
+        self._closer: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def send(self, message: str) -> bool:
+        """Queue a message for the client; False if it was not queued"""
+        if self.closed:
+            return False
+
+        if len(self._queue) >= self.max_queue_size:
+            if self.policy == SlowConsumerPolicy.DISCONNECT:
+                self.close(status.WS_1008_POLICY_VIOLATION, "Slow consumer")
+                return False
+            self._queue.popleft()
+            self.dropped += 1
+
+        self._queue.append(message)
+        self._ready.set()
+        return True
+
+    def received(self) -> bool:
+        """Note a message from the client; False if it is over its rate limit"""
+        self.last_seen = time.monotonic()
+        return self.rate_limiter is None or self.rate_limiter.allow()
+
+    def close(self, code: int = status.WS_1000_NORMAL_CLOSURE, reason: Optional[str] = None) -> None:
+        """Stop sending and close the socket in the background"""
+        if self.closed:
+            return
+        self._discard()
+        self._closer = asyncio.create_task(self._close_socket(code, reason))
+
+    def stop(self) -> None:
+        """Stop sending to a client that has gone away"""
+        if not self.closed:
+            self._discard()
+
+    def _discard(self) -> None:
+        self.closed = True
+        self._queue.clear()
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        self._on_close(self)
+
+    async def _close_socket(self, code: int, reason: Optional[str]) -> None:
+        try:
+            # A slow client may not even take the close frame
+            await asyncio.wait_for(self.websocket.close(code, reason), settings.CHAT_CLOSE_TIMEOUT_SECONDS)
+        except Exception:
+            pass
+
+    async def _send_frame(self, frame: Union[str, bytes]) -> None:
+        if isinstance(frame, bytes):
+            await self.websocket.send_bytes(frame)
+        else:
+            await self.websocket.send_text(frame)
+
+    async def _write_loop(self) -> None:
+        try:
+            while True:
+                await self._ready.wait()
+                if self.batch_interval:
+                    # Let the interval's messages gather, then send them in one frame
+                    await asyncio.sleep(self.batch_interval)
+                    self._ready.clear()
+                    messages = list(self._queue)
+                    self._queue.clear()
+                    if messages:
+                        await self._send_frame(encode_batch(messages, self.encoding))
+                    continue
+
+                self._ready.clear()
+                while self._queue:
+                    await self._send_frame(encode_message(self._queue.popleft(), self.encoding))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Dead socket; the receive side sees the disconnect on its own
+            self.stop()
@@ -0,0 +1,23 @@
+from typing import Union
+
+import msgpack
+import orjson
+
+
+class MessageEncoding:
+    TEXT = "text"  # Text frames: a message, or a JSON array of messages in batch mode
+    MSGPACK = "msgpack"  # Binary frames: a MessagePack string, or an array of them in batch mode
+
+
+def encode_message(message: str, encoding: str) -> Union[str, bytes]:
+    """One message as a frame"""
+    if encoding == MessageEncoding.MSGPACK:
+        return msgpack.packb(message)
+    return message
+
+
+def encode_batch(messages: list[str], encoding: str) -> Union[str, bytes]:
+    """Several messages as one frame, in the order given"""
+    if encoding == MessageEncoding.MSGPACK:
+        return msgpack.packb(messages)
+    return orjson.dumps(messages).decode()
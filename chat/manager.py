@@ -0,0 +1,223 @@
+import asyncio
+import time
+from typing import Optional
+
+import orjson
+from fastapi import WebSocket, WebSocketException, status
+
+from core.chat_config import get_settings
+from .backplane import Backplane, create_backplane
+from .connection import Connection
+from .encoding import MessageEncoding
+from .replay import ReplayBuffers
+
+settings = get_settings()
+
+PING = '{"action": "ping"}'
+
+
+class ConnectionManager:
+    """
+    The chat's connected clients, on this node
+
+    Sending only queues the message on each Connection, whose writer task
+    sends it, so a slow or dead client never holds up the others. Dead and
+    slow-consumer connections remove themselves.
+    Connections are indexed by room and by client id (a client may have
+    several), so a message costs the size of its audience and a disconnect
+    the number of rooms the connection was in.
+    Broadcasts and direct messages are encoded once and published on the
+    backplane; every node, this one included, delivers them to its own
+    clients only.
+    Messages to a room, or to everyone, are numbered and kept in the room's
+    replay buffer. Clients connected with `replay` get them as numbered
+    frames and can catch up on the ones they missed, on connect for
+    messages to everyone and on subscribe for a room.
+    At most `max_connections` are accepted. A background sweep pings
+    connections quiet for `heartbeat_interval` and closes those quiet for
+    `idle_timeout`, so half-open ones do not pile up. Only connections that
+    have answered a ping are closed for being idle; clients that just listen
+    never speak, and are left to the server's protocol pings.
+    """
+
+    def __init__(
+            self,
+            max_queue_size: int = settings.CHAT_SEND_QUEUE_SIZE,
+            slow_consumer_policy: str = settings.CHAT_SLOW_CONSUMER_POLICY,
+            backplane: Optional[Backplane] = None,
+            max_connections: int = settings.CHAT_MAX_CONNECTIONS,
+            heartbeat_interval: float = settings.CHAT_HEARTBEAT_INTERVAL_SECONDS,
+            idle_timeout: float = settings.CHAT_IDLE_TIMEOUT_SECONDS,
+            replay_buffers: Optional[ReplayBuffers] = None
+    ):
+        self.max_queue_size = max_queue_size
+        self.slow_consumer_policy = slow_consumer_policy
+        self.backplane = backplane or create_backplane()
+        self.max_connections = max_connections
+        self.heartbeat_interval = heartbeat_interval
+        self.idle_timeout = idle_timeout
+        self.replay = replay_buffers or ReplayBuffers()
+        self.active_connections: dict[WebSocket, Connection] = {}
+        self.rooms: dict[str, set[Connection]] = {}
+        self.clients: dict[int, set[Connection]] = {}
+        self._accepting = 0
+        self._sweeper: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self.backplane.start(self._receive)
+        if self.heartbeat_interval or self.idle_timeout:
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def stop(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        await self.backplane.stop()
+        for connection in list(self.active_connections.values()):
+            connection.close()
+
+    async def connect(
+            self,
+            websocket: WebSocket,
+            client_id: Optional[int] = None,
+            encoding: str = MessageEncoding.TEXT,
+            batch: bool = False,
+            replay: bool = False,
+            epoch: Optional[str] = None,
+            last_seq: Optional[int] = None
+    ) -> Connection:
+        """
+        Accept a client; with `batch`, its messages are sent in one frame per
+        batch interval. With `replay` it gets numbered frames, starting with
+        the messages to everyone after `last_seq` of `epoch` if given.
+        """
+        if len(self.active_connections) + self._accepting >= self.max_connections:
+            # Before accept, so the handshake itself is refused
+            raise WebSocketException(status.WS_1013_TRY_AGAIN_LATER, "Too many connections")
+
+        self._accepting += 1
+        try:
+            await websocket.accept()
+        finally:
+            self._accepting -= 1
+        connection = Connection(
+            websocket,
+            self._remove,
+            max_queue_size=self.max_queue_size,
+            policy=self.slow_consumer_policy,
+            client_id=client_id,
+            encoding=encoding,
+            batch_interval=settings.CHAT_BATCH_INTERVAL_SECONDS if batch else None,
+            sequenced=replay
+        )
+        self.active_connections[websocket] = connection
+        if client_id is not None:
+            self.clients.setdefault(client_id, set()).add(connection)
+        if replay and last_seq is not None:
+            self.catch_up(connection, None, epoch, last_seq)
+        connection.start()
+        return connection
+
+    def disconnect(self, websocket: WebSocket):
+        connection = self.active_connections.get(websocket)
+        if connection is not None:
+            connection.stop()  # Removes it, through _remove
+
+    def join(self, connection: Connection, room: str) -> None:
+        if connection.closed:
+            return
+        self.rooms.setdefault(room, set()).add(connection)
+        connection.rooms.add(room)
+
+    def catch_up(self, connection: Connection, room: Optional[str], epoch: Optional[str], last_seq: int) -> None:
+        """
+        Send the frames of `room` after `last_seq`, or a resync action if they
+        are no longer all kept. Nothing awaits in between, so live messages
+        follow on without a gap.
+        """
+        frames = self.replay.since(room, epoch, last_seq)
+        # More than the send queue holds would be dropped anyway
+        if frames is None or len(frames) > connection.max_queue_size:
+            epoch, seq = self.replay.position(room)
+            connection.send(orjson.dumps({"action": "resync", "room": room, "epoch": epoch, "seq": seq}).decode())
+            return
+        for frame in frames:
+            connection.send(frame)
+
+    def leave(self, connection: Connection, room: str) -> None:
+        connection.rooms.discard(room)
+        members = self.rooms.get(room)
+        if members is not None:
+            members.discard(connection)
+            if not members:
+                del self.rooms[room]
+
+    async def send_personal_message(self, message: str, websocket: WebSocket):
+        connection = self.active_connections.get(websocket)
+        if connection is not None:
+            connection.send(message)
+
+    async def send_to_client(self, client_id: int, message: str):
+        """Send to every connection of `client_id`, on whichever node it is"""
+        self._deliver(self.clients.get(client_id, ()), message)
+        await self.backplane.publish(orjson.dumps({"message": message, "client": client_id}))
+
+    async def broadcast(self, message: str, room: Optional[str] = None):
+        """Send to the members of `room`, or to everyone"""
+        self._deliver_to_room(room, message)
+        await self.backplane.publish(orjson.dumps({"message": message, "room": room}))
+
+    def _audience(self, room: Optional[str]):
+        if room is None:
+            return self.active_connections.values()
+        return self.rooms.get(room, ())
+
+    def _receive(self, data: bytes) -> None:
+        """A message published by another node"""
+        envelope = orjson.loads(data)
+        if "client" in envelope:
+            self._deliver(self.clients.get(envelope["client"], ()), envelope["message"])
+        else:
+            self._deliver_to_room(envelope["room"], envelope["message"])
+
+    def _deliver_to_room(self, room: Optional[str], message: str) -> None:
+        # Numbered by each node as it delivers, see ReplayBuffer.epoch
+        frame = self.replay.append(message, room)
+        for connection in list(self._audience(room)):
+            connection.send(frame if connection.sequenced else message)
+
+    def _deliver(self, connections, message: str) -> None:
+        # Copied, sending can remove slow consumers
+        for connection in list(connections):
+            connection.send(message)
+
+    async def _sweep_loop(self) -> None:
+        interval = min(value for value in (self.heartbeat_interval, self.idle_timeout) if value)
+        while True:
+            await asyncio.sleep(interval / 2)
+            try:
+                self._sweep()
+            except Exception as e:
+                print(f"Chat connection sweep failed: {e}")
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        for connection in list(self.active_connections.values()):
+            quiet = now - connection.last_seen
+            if self.idle_timeout and connection.answers_pings and quiet >= self.idle_timeout:
+                connection.close(status.WS_1000_NORMAL_CLOSURE, "Idle timeout")
+            elif self.heartbeat_interval and quiet >= self.heartbeat_interval:
+                connection.send(PING)
+
+    def _remove(self, connection: Connection) -> None:
+        if self.active_connections.pop(connection.websocket, None) is None:
+            return
+        for room in list(connection.rooms):
+            self.leave(connection, room)
+        if connection.client_id is not None:
+            connections = self.clients.get(connection.client_id)
+            if connections is not None:
+                connections.discard(connection)
+                if not connections:
+                    del self.clients[connection.client_id]
@@ -0,0 +1,105 @@
+import uuid
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Optional
+
+import orjson
+
+from core.chat_config import get_settings
+
+settings = get_settings()
+
+
+class ReplayBuffer:
+    """
+    The most recent messages of one room, numbered 1, 2, 3... as they arrive
+
+    Holds at most `max_messages` messages and `max_bytes` bytes of them; the
+    oldest go first. `since` returns what a client that last saw `last_seq`
+    missed, or None if some of it is no longer held. Sequence numbers are
+    only meaningful with the buffer's random `epoch`: a buffer created again
+    (another process, a restart, an evicted room) starts over with a new one.
+    """
+
+    def __init__(self, max_messages: int, max_bytes: int):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.epoch = uuid.uuid4().hex[:8]
+        self.seq = 0
+        self.size = 0
+        self._messages: deque[tuple[int, str, int]] = deque()
+
+    def append(self, message: str, room: Optional[str]) -> str:
+        """Number the message and return it as a frame for clients that track sequence numbers"""
+        self.seq += 1
+        data = orjson.dumps({"seq": self.seq, "epoch": self.epoch, "room": room, "message": message})
+        frame = data.decode()
+        self._messages.append((self.seq, frame, len(data)))
+        self.size += len(data)
+        while self._messages and (len(self._messages) > self.max_messages or self.size > self.max_bytes):
+            _, _, dropped = self._messages.popleft()
+            self.size -= dropped
+        return frame
+
+    def since(self, epoch: str, last_seq: int) -> Optional[list[str]]:
+        if epoch != self.epoch or last_seq > self.seq:
+            return None
+        if last_seq == self.seq:
+            return []
+        oldest = self._messages[0][0] if self._messages else self.seq + 1
+        if last_seq + 1 < oldest:
+            return None
+        # Sequence numbers in the buffer are consecutive
+        return [frame for _, frame, _ in islice(self._messages, last_seq + 1 - oldest, None)]
+
+
+class ReplayBuffers:
+    """
+    A ReplayBuffer per room, created by its first message; the least recently
+    used lose theirs beyond `max_rooms` buffers or `max_total_bytes` in all
+    """
+
+    def __init__(
+            self,
+            max_messages: int = settings.CHAT_REPLAY_MAX_MESSAGES,
+            max_bytes: int = settings.CHAT_REPLAY_MAX_BYTES,
+            max_rooms: int = settings.CHAT_REPLAY_MAX_ROOMS,
+            max_total_bytes: int = settings.CHAT_REPLAY_MAX_TOTAL_BYTES
+    ):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.max_rooms = max_rooms
+        self.max_total_bytes = max_total_bytes
+        self.size = 0
+        self._buffers: "OrderedDict[Optional[str], ReplayBuffer]" = OrderedDict()
+
+    def append(self, message: str, room: Optional[str]) -> str:
+        """Keep a message sent to `room` (None for everyone); returns its frame"""
+        buffer = self._buffers.get(room)
+        if buffer is None:
+            buffer = self._buffers[room] = ReplayBuffer(self.max_messages, self.max_bytes)
+        else:
+            self._buffers.move_to_end(room)
+
+        size = buffer.size
+        frame = buffer.append(message, room)
+        self.size += buffer.size - size
+
+        while len(self._buffers) > 1 and (len(self._buffers) > self.max_rooms or self.size > self.max_total_bytes):
+            _, evicted = self._buffers.popitem(last=False)
+            self.size -= evicted.size
+        return frame
+
+    def since(self, room: Optional[str], epoch: str, last_seq: int) -> Optional[list[str]]:
+        """Frames sent to `room` after `last_seq` of `epoch`; None if the client must resync"""
+        buffer = self._buffers.get(room)
+        if buffer is None:
+            return None
+        return buffer.since(epoch, last_seq)
+
+    def position(self, room: Optional[str]) -> tuple[Optional[str], int]:
+        """Epoch and last sequence number of `room`, for a client to start from"""
+        buffer = self._buffers.get(room)
+        if buffer is None:
+            return None, 0
+        return buffer.epoch, buffer.seq
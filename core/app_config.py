@@ -2,6 +2,7 @@ import os
 
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()  # Load .env file
@@ -16,6 +17,35 @@ class Settings(BaseSettings):
     EXPECTED_ISSUER: str = "auth-service"
     EXPECTED_AUDIENCE: str = "api-service"
 
+    # Public keys for RS*/ES* tokens, defaults to {AUTH_SERVER_URL}/auth/jwks
+    JWKS_URL: Optional[str] = None
+    JWKS_CACHE_TTL_SECONDS: int = 300  # Used when the server sends no max-age
+    JWKS_MIN_REFRESH_INTERVAL_SECONDS: int = 30  # Rate limit for refetching on unknown kid
+
+    # Verified-token cache for local validation (entries never outlive the token's exp)
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+    TOKEN_CACHE_TTL_SECONDS: int = 300
+
+    # Shared HTTP client for calls to the auth server
+    AUTH_CLIENT_TIMEOUT: float = 5.0
+    AUTH_CLIENT_MAX_CONNECTIONS: int = 100
+    AUTH_CLIENT_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    AUTH_CLIENT_KEEPALIVE_EXPIRY: float = 30.0
+    AUTH_CLIENT_HTTP2: bool = True
+
+    # Short-lived cache of remote validation results, 0 disables it
+    REMOTE_VALIDATION_CACHE_TTL_SECONDS: int = 0
+    REMOTE_VALIDATION_CACHE_MAX_SIZE: int = 10000
+
+    # Micro-batch remote validations into /auth/validate/batch calls
+    REMOTE_VALIDATION_BATCHING: bool = False
+    REMOTE_VALIDATION_BATCH_MAX_SIZE: int = 50
+    REMOTE_VALIDATION_BATCH_WINDOW_MS: float = 5.0
+
+    # Per-worker indexed copy of the travel destinations table for listings, reloaded in
+    # the background this often; costs memory for the whole table. 0 queries the table
+    TRAVEL_DESTINATION_CACHE_TTL_SECONDS: int = 0
+
 @lru_cache()
 def get_settings():
     return Settings()
\ No newline at end of file
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 from dotenv import load_dotenv
 import os
 
@@ -15,6 +16,25 @@ class Settings(BaseSettings):
     ISSUER: str = "auth-service"
     AUDIENCE: str = "api-service"
 
+    # Key pairs for RS*/ES* algorithms: one PEM private key per file, named <kid>.pem
+    # Without a directory a key is generated at startup (single worker, development only)
+    SIGNING_KEYS_DIR: Optional[str] = None
+    ACTIVE_SIGNING_KID: Optional[str] = None  # Defaults to the last key file by name
+    JWKS_MAX_AGE_SECONDS: int = 300
+
+    # Read-through cache for user lookups on /auth/validate and /auth/refresh
+    USER_CACHE_MAX_SIZE: int = 10000
+    USER_CACHE_TTL_SECONDS: int = 30  # Bounds how stale other workers can be
+
+    # Maximum number of tokens accepted by /auth/validate/batch
+    VALIDATE_BATCH_MAX_SIZE: int = 100
+
+    # Password hashing worker pool (bcrypt is CPU bound, keep it off the event loop)
+    PASSWORD_HASH_EXECUTOR: str = "thread"  # "thread" or "process"
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_QUEUE: int = 32  # Pending hashes beyond the busy workers
+    PASSWORD_HASH_RETRY_AFTER: int = 1  # Seconds, sent with 503 when the pool is full
+
 @lru_cache()
 def get_settings():
     return Settings()
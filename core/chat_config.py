@@ -0,0 +1,49 @@
+from pydantic_settings import BaseSettings
+from functools import lru_cache
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()  # Load .env file
+
+class Settings(BaseSettings):
+    # Outbound messages are queued per connection and sent by its own writer task
+    CHAT_SEND_QUEUE_SIZE: int = 256  # Messages queued for one client before it counts as slow
+    CHAT_SLOW_CONSUMER_POLICY: str = "drop_oldest"  # drop_oldest, or disconnect
+    CHAT_CLOSE_TIMEOUT_SECONDS: float = 1.0  # Longest we wait to send the close frame to a dropped client
+
+    # Clients connecting with ?batch=true get the messages of each interval in one frame.
+    # Compression is permessage-deflate, negotiated by uvicorn (--ws-per-message-deflate)
+    CHAT_BATCH_INTERVAL_SECONDS: float = 0.025
+
+    # Admission and liveness, per process. A connection that has sent nothing for the
+    # heartbeat interval is sent {"action": "ping"}. One silent for the idle timeout is
+    # closed, if it has answered a ping before, so clients that only listen are left
+    # alone (0 disables either); uvicorn's protocol pings (--ws-ping-interval) find dead sockets
+    CHAT_MAX_CONNECTIONS: int = 10000  # Beyond this, connections are rejected at accept
+    CHAT_HEARTBEAT_INTERVAL_SECONDS: float = 20.0
+    CHAT_IDLE_TIMEOUT_SECONDS: float = 0.0
+    CHAT_RATE_LIMIT_PER_SECOND: float = 10.0  # Inbound messages per client, 0 for no limit
+    CHAT_RATE_LIMIT_BURST: int = 20
+
+    # Rooms a connection can subscribe to with {"action": "subscribe", "room": ...}
+    CHAT_MAX_ROOMS_PER_CONNECTION: int = 100
+
+    # Recent messages kept per room (and for messages to everyone), so clients that track
+    # sequence numbers (?replay=true) can reconnect with the last one seen and get the gap
+    CHAT_REPLAY_MAX_MESSAGES: int = 1000
+    CHAT_REPLAY_MAX_BYTES: int = 256 * 1024
+    # Least recently used rooms lose their buffer beyond these
+    CHAT_REPLAY_MAX_ROOMS: int = 1000
+    CHAT_REPLAY_MAX_TOTAL_BYTES: int = 64 * 1024 * 1024
+
+    # Backplane carrying messages between chat processes: memory (one process),
+    # or unix (workers on one machine, through sockets in CHAT_BACKPLANE_SOCKET_DIR)
+    CHAT_BACKPLANE: str = "memory"
+    # Must be owned by the user running the chat, mode 0700; defaults to
+    # $XDG_RUNTIME_DIR/chat-backplane, or chat-backplane-<uid> in the temp directory
+    CHAT_BACKPLANE_SOCKET_DIR: Optional[str] = None
+    CHAT_BACKPLANE_REFRESH_SECONDS: float = 1.0  # How often the list of other processes is re-read
+
+@lru_cache()
+def get_settings():
+    return Settings()
@@ -0,0 +1,85 @@
+import asyncio
+import re
+import time
+from typing import Callable, Optional
+
+import httpx
+from jose import jwk, JWTError
+
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+class JWKSClient:
+    """
+    Fetches the auth service's JSON Web Key Set and caches the parsed keys
+    Keys are refreshed after the server's max-age (or `ttl`) with a
+    conditional GET. An unknown kid triggers an early refresh, at most once
+    per `min_refresh_interval`, so key rotation is picked up without
+    letting garbage tokens hammer the auth service.
+    """
+
+    def __init__(
+            self,
+            url: str,
+            get_client: Callable[[], httpx.AsyncClient],
+            ttl: float,
+            min_refresh_interval: float
+    ):
+        self.url = url
+        self.get_client = get_client
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._keys: dict = {}
+        self._etag: Optional[str] = None
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def get_key(self, kid: Optional[str]):
+        if time.monotonic() >= self._expires_at:
+            await self.refresh()
+
+        key = self._keys.get(kid)
+        if key is None and time.monotonic() - self._fetched_at >= self.min_refresh_interval:
+            await self.refresh(force=True)
+            key = self._keys.get(kid)
+
+        if key is None:
+            raise JWTError("Unknown signing key")
+        return key
+
+    async def refresh(self, force: bool = False) -> None:
+        async with self._lock:
+            # Another coroutine may have refreshed while we waited for the lock
+            if not force and time.monotonic() < self._expires_at:
+                return
+            if force and time.monotonic() - self._fetched_at < self.min_refresh_interval:
+                return
+
+            headers = {"If-None-Match": self._etag} if self._etag else {}
+            try:
+                response = await self.get_client().get(self.url, headers=headers)
+                response.raise_for_status()
+            except httpx.HTTPError:
+                # Keep serving the keys we have rather than failing every request
+                if not self._keys:
+                    raise
+                self._expires_at = time.monotonic() + self.min_refresh_interval
+                return
+
+            now = time.monotonic()
+            self._fetched_at = now
+            self._expires_at = now + self._max_age(response)
+            if response.status_code == 304:
+                return
+
+            self._keys = {
+                key_data["kid"]: jwk.construct(key_data, key_data.get("alg"))
+                for key_data in response.json().get("keys", [])
+                if "kid" in key_data
+            }
+            self._etag = response.headers.get("ETag")
+
+    def _max_age(self, response: httpx.Response) -> float:
+        match = MAX_AGE_PATTERN.search(response.headers.get("Cache-Control", ""))
+        return float(match.group(1)) if match else self.ttl
@@ -0,0 +1,125 @@
+import base64
+import hashlib
+import json
+from pathlib import Path
+from typing import Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk
+
+# Curves for the ECDSA algorithms supported by python-jose
+EC_CURVES = {
+    "ES256": ec.SECP256R1,
+    "ES384": ec.SECP384R1,
+    "ES512": ec.SECP521R1,
+}
+
+# Members that identify a public key, per RFC 7638
+THUMBPRINT_MEMBERS = {
+    "RSA": ("e", "kty", "n"),
+    "EC": ("crv", "kty", "x", "y"),
+}
+
+
+def is_asymmetric(algorithm: str) -> bool:
+    return algorithm.startswith(("RS", "ES"))
+
+
+class SigningKey:
+    """Private key used to sign tokens, plus its public JWK"""
+
+    def __init__(self, private_pem: bytes, algorithm: str, kid: Optional[str] = None):
+        self.algorithm = algorithm
+        self.private_key = jwk.construct(private_pem, algorithm)
+
+        public_jwk = self.private_key.public_key().to_dict()
+        self.kid = kid or _thumbprint(public_jwk)
+        self.public_jwk = {**public_jwk, "kid": self.kid, "use": "sig", "alg": algorithm}
+
+
+class KeyRing:
+    """
+    Signing keys of the auth service, indexed by kid
+    The active key signs new tokens. Older keys stay published in the JWKS
+    until they are retired, so tokens they signed keep validating.
+    """
+
+    def __init__(self, algorithm: str):
+        self.algorithm = algorithm
+        self.keys: dict[str, SigningKey] = {}
+        self.active_kid: Optional[str] = None
+        self._jwks: Optional[dict] = None
+        self._etag: Optional[str] = None
+
+    @property
+    def active(self) -> SigningKey:
+        if self.active_kid is None:
+            self.rotate()
+        return self.keys[self.active_kid]
+
+    def add(self, private_pem: bytes, kid: Optional[str] = None, activate: bool = True) -> SigningKey:
+        key = SigningKey(private_pem, self.algorithm, kid)
+        self.keys[key.kid] = key
+        if activate or self.active_kid is None:
+            self.active_kid = key.kid
+        self._jwks = None
+        return key
+
+    def load_dir(self, path: str, active_kid: Optional[str] = None) -> None:
+        """Load every *.pem in `path`, using the file name as kid"""
+        for pem_file in sorted(Path(path).glob("*.pem")):
+            self.add(pem_file.read_bytes(), kid=pem_file.stem)
+
+        if active_kid is not None:
+            if active_kid not in self.keys:
+                raise ValueError(f"Active signing key {active_kid!r} not found in {path}")
+            self.active_kid = active_kid
+
+    def rotate(self) -> SigningKey:
+        """Generate a new key and sign with it from now on"""
+        return self.add(_generate_private_pem(self.algorithm))
+
+    def retire(self, kid: str) -> None:
+        """Stop publishing a key once no live tokens are signed with it"""
+        if kid == self.active_kid:
+            raise ValueError("Cannot retire the active signing key")
+        self.keys.pop(kid, None)
+        self._jwks = None
+
+    def get_public_key(self, kid: Optional[str]):
+        key = self.keys.get(kid) if kid else None
+        return key.private_key.public_key() if key else None
+
+    def jwks(self) -> dict:
+        if self._jwks is None:
+            self.active  # Make sure there is at least one key to publish
+            self._jwks = {"keys": [key.public_jwk for key in self.keys.values()]}
+            body = json.dumps(self._jwks, sort_keys=True).encode()
+            self._etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        return self._jwks
+
+    @property
+    def etag(self) -> str:
+        self.jwks()
+        return self._etag
+
+
+def _generate_private_pem(algorithm: str) -> bytes:
+    if algorithm.startswith("ES"):
+        private_key = ec.generate_private_key(EC_CURVES[algorithm]())
+    else:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+
+
+def _thumbprint(public_jwk: dict) -> str:
+    """RFC 7638 JWK thumbprint, used as kid when none is configured"""
+    members = {name: public_jwk[name] for name in THUMBPRINT_MEMBERS[public_jwk["kty"]]}
+    digest = hashlib.sha256(json.dumps(members, separators=(",", ":"), sort_keys=True).encode()).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
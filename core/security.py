@@ -1,14 +1,30 @@
+import asyncio
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 
-from jose import jwt
+from fastapi import HTTPException, status
+from jose import jwt, JWTError
 from passlib.context import CryptContext
 
 from .auth_config import get_settings
+from .keys import KeyRing, is_asymmetric
 
 settings = get_settings()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Signing keys for asymmetric algorithms, published through /auth/jwks
+key_ring = KeyRing(settings.ALGORITHM)
+if is_asymmetric(settings.ALGORITHM) and settings.SIGNING_KEYS_DIR:
+    key_ring.load_dir(settings.SIGNING_KEYS_DIR, settings.ACTIVE_SIGNING_KID)
+
+# Bounded pool for bcrypt work: busy workers plus queued jobs never exceed this
+_hash_executor: Optional[Executor] = None
+_hash_slots = threading.BoundedSemaphore(
+    settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_QUEUE
+)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     password_bytes = plain_password.encode('utf-8')[:72]
@@ -20,6 +36,58 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password_bytes.decode('utf-8'))
 
 
+def get_hash_executor() -> Executor:
+    """Lazily create the worker pool used for password hashing"""
+    global _hash_executor
+    if _hash_executor is None:
+        if settings.PASSWORD_HASH_EXECUTOR == "process":
+            _hash_executor = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+        else:
+            _hash_executor = ThreadPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                thread_name_prefix="password-hash"
+            )
+    return _hash_executor
+
+
+def shutdown_hash_executor() -> None:
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=False, cancel_futures=True)
+        _hash_executor = None
+
+
+async def _run_in_hash_pool(func, *args):
+    """
+    Run a bcrypt call in the worker pool
+    Sheds load with 503 instead of queueing without bound
+    """
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Password hashing capacity exhausted, try again later",
+            headers={"Retry-After": str(settings.PASSWORD_HASH_RETRY_AFTER)},
+        )
+
+    try:
+        future = get_hash_executor().submit(func, *args)
+    except BaseException:
+        _hash_slots.release()
+        raise
+
+    # Release the slot only when the work really finishes, even if the caller is cancelled
+    future.add_done_callback(lambda _: _hash_slots.release())
+    return await asyncio.wrap_future(future)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_in_hash_pool(get_password_hash, password)
+
+
 def create_access_token(
         data: dict,
         expires_delta: Optional[timedelta] = None
@@ -40,12 +108,7 @@ def create_access_token(
         "aud": settings.AUDIENCE,  # Audience
     })
 
-    encoded_jwt = jwt.encode(
-        to_encode,
-        settings.SECRET_KEY,
-        algorithm=settings.ALGORITHM
-    )
-    return encoded_jwt
+    return encode_token(to_encode)
 
 
 def create_refresh_token(data: dict) -> str:
@@ -60,9 +123,30 @@ def create_refresh_token(data: dict) -> str:
         "type": "refresh"
     })
 
-    encoded_jwt = jwt.encode(
-        to_encode,
-        settings.SECRET_KEY,
-        algorithm=settings.ALGORITHM
+    return encode_token(to_encode)
+
+
+def encode_token(claims: dict) -> str:
+    """Sign claims with the shared secret, or the active key pair tagged with its kid"""
+    if not is_asymmetric(settings.ALGORITHM):
+        return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+    signing_key = key_ring.active
+    return jwt.encode(
+        claims,
+        signing_key.private_key,
+        algorithm=settings.ALGORITHM,
+        headers={"kid": signing_key.kid}
     )
-    return encoded_jwt
\ No newline at end of file
+
+
+def decode_token(token: str, **options) -> dict:
+    """Verify a token with the shared secret, or the public key named by its kid"""
+    if not is_asymmetric(settings.ALGORITHM):
+        key = settings.SECRET_KEY
+    else:
+        key = key_ring.get_public_key(jwt.get_unverified_header(token).get("kid"))
+        if key is None:
+            raise JWTError("Unknown signing key")
+
+    return jwt.decode(token, key, algorithms=[settings.ALGORITHM], **options)
\ No newline at end of file
@@ -0,0 +1,67 @@
+from pydantic_settings import BaseSettings
+from functools import lru_cache
+from dotenv import load_dotenv
+
+load_dotenv()  # Load .env file
+
+class Settings(BaseSettings):
+    WEBHOOK_DATABASE_URL: str = "sqlite+aiosqlite:///./webhooks.db"
+
+    # Delivery
+    WEBHOOK_TIMEOUT: float = 15.0
+    WEBHOOK_MAX_ATTEMPTS: int = 3
+
+    # Shared delivery client, reused across attempts and subscribers
+    WEBHOOK_HTTP2: bool = True
+    WEBHOOK_MAX_IN_FLIGHT: int = 200  # Requests in flight across all hosts, also the connection pool size
+    WEBHOOK_MAX_PER_HOST: int = 10  # Requests in flight to a single receiver host
+    WEBHOOK_MAX_KEEPALIVE_CONNECTIONS: int = 50
+    WEBHOOK_KEEPALIVE_EXPIRY: float = 30.0
+
+    # Signatures of recent events by (event, secret), shared by subscribers with the same secret
+    WEBHOOK_SIGNATURE_CACHE_MAX_SIZE: int = 10000
+    WEBHOOK_SIGNATURE_CACHE_TTL_SECONDS: float = 300.0
+
+    # Defaults for subscriptions in batch mode, and compression
+    WEBHOOK_BATCH_MAX_BYTES: int = 1024 * 1024  # Uncompressed body size of one batch
+    WEBHOOK_BATCH_WINDOW_SECONDS: float = 1.0  # Longest an event waits for its batch
+    WEBHOOK_GZIP_MIN_BYTES: int = 1024  # Smaller bodies are sent uncompressed
+    WEBHOOK_GZIP_LEVEL: int = 6
+
+    # Event name -> subscriber ids, cleared on subscription changes made by this process
+    # The TTL bounds how long changes made by other processes go unseen
+    WEBHOOK_ROUTING_CACHE_MAX_SIZE: int = 10000
+    WEBHOOK_ROUTING_CACHE_TTL_SECONDS: float = 30.0
+
+    # Per-subscription circuit breaker: after this many failures in a row, deliveries
+    # are deferred for the cooldown, then one probe is tried; each failed probe doubles it
+    WEBHOOK_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    WEBHOOK_CIRCUIT_COOLDOWN_SECONDS: float = 30.0
+    WEBHOOK_CIRCUIT_MAX_COOLDOWN_SECONDS: float = 1800.0
+    WEBHOOK_CIRCUIT_DEACTIVATE_AFTER_SECONDS: float = 86400.0  # Failing this long sets active=False, 0 never
+
+    # Delivery logs are queued and inserted in batches by a background writer
+    WEBHOOK_LOG_BATCH_SIZE: int = 500
+    WEBHOOK_LOG_FLUSH_INTERVAL_SECONDS: float = 0.5  # Longest a log waits for its batch to fill
+    WEBHOOK_LOG_QUEUE_MAX_SIZE: int = 10000  # Delivery waits when this many logs are unwritten
+
+    # Log retention: logs older than this many whole days are folded into daily
+    # summaries and deleted, by the dispatcher every interval; 0 keeps them forever
+    WEBHOOK_LOG_RETENTION_DAYS: int = 7
+    WEBHOOK_LOG_COMPACT_INTERVAL_SECONDS: float = 3600.0
+
+    # Retry schedule: base * 2^(attempt - 1) seconds, capped, with jitter
+    WEBHOOK_BACKOFF_BASE_SECONDS: float = 1.0
+    WEBHOOK_BACKOFF_MAX_SECONDS: float = 3600.0
+
+    # Dispatcher
+    WEBHOOK_DISPATCHER_EMBEDDED: bool = True  # Run inside web_hook_app; False when run with python -m webhooks.dispatcher
+    WEBHOOK_WORKERS: int = 64  # Well above WEBHOOK_MAX_PER_HOST, so one slow host cannot hold every worker
+    WEBHOOK_CLAIM_BATCH_SIZE: int = 100
+    WEBHOOK_LEASE_SECONDS: float = 60.0  # A claimed job is retried elsewhere if not finished in time
+    WEBHOOK_POLL_INTERVAL_SECONDS: float = 1.0
+    WEBHOOK_SHUTDOWN_TIMEOUT_SECONDS: float = 10.0
+
+@lru_cache()
+def get_settings():
+    return Settings()
@@ -0,0 +1,387 @@
+import asyncio
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterable, Optional, Sequence
+
+import sqlalchemy
+from fastapi import Depends
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.app_config import get_settings
+from db import database, get_db
+from models.travel_destinations import TravelDestinations
+from schemas.travel_destinations import TravelDestination
+
+settings = get_settings()
+
+DESTINATION_FIELDS = ("id", "city", "country", "feature")
+
+
+class _IndexBucket:
+    """The ids under one index key: in listing order, and sorted for keyset pages"""
+
+    __slots__ = ("listed", "ids")
+
+    def __init__(self):
+        self.listed: dict[int, None] = {}
+        self.ids: list[int] = []
+
+    def __iter__(self):
+        return iter(self.listed)
+
+
+class TravelDestinationStore:
+    """
+    In-memory travel destinations keyed by id, with secondary indexes on
+    country, city and (country, city). Index buckets keep their ids in
+    listing order, so "first match" behaves like the list it replaces, and
+    sorted, so a keyset page costs a bisect and its own length.
+    """
+
+    def __init__(self, destinations: Iterable[TravelDestination] = ()):
+        self._by_id: dict[int, TravelDestination] = {}
+        self._ids: list[int] = []  # Every id, sorted
+        self._by_country: dict[str, _IndexBucket] = {}
+        self._by_city: dict[str, _IndexBucket] = {}
+        self._by_country_city: dict[tuple[str, str], _IndexBucket] = {}
+        self._next_id = 1
+        # Listing position of each id, used to keep index buckets in order
+        self._position: dict[int, int] = {}
+        self._next_position = 0
+        # Handlers never await while mutating, the lock also covers threadpool callers
+        self._lock = threading.Lock()
+
+        for destination in destinations:
+            self.add(destination)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def all(self) -> list[TravelDestination]:
+        with self._lock:
+            return list(self._by_id.values())
+
+    def find(self, country: str, city: Optional[str] = None) -> list[TravelDestination]:
+        with self._lock:
+            if city is None:
+                bucket = self._by_country.get(country, ())
+            else:
+                bucket = self._by_country_city.get((country, city), ())
+            return [self._by_id[destination_id] for destination_id in bucket]
+
+    def page(
+            self,
+            limit: int,
+            after_id: Optional[int] = None,
+            country: Optional[str] = None,
+            city: Optional[str] = None
+    ) -> list[TravelDestination]:
+        """Up to `limit` destinations with an id above `after_id`, in id order"""
+        with self._lock:
+            if country is None and city is None:
+                ids = self._ids
+            else:
+                if country is None:
+                    bucket = self._by_city.get(city)
+                elif city is None:
+                    bucket = self._by_country.get(country)
+                else:
+                    bucket = self._by_country_city.get((country, city))
+                ids = bucket.ids if bucket is not None else []
+            start = 0 if after_id is None else bisect_right(ids, after_id)
+            return [self._by_id[destination_id] for destination_id in ids[start:start + limit]]
+
+    def add(self, destination: TravelDestination) -> TravelDestination:
+        with self._lock:
+            if destination.id is None or destination.id in self._by_id:
+                destination = destination.model_copy(update={"id": self._next_id})
+            self._next_id = max(self._next_id, destination.id + 1)
+            self._insert(destination)
+            return destination
+
+    def replace_by_city(self, city: str, destination: TravelDestination) -> Optional[TravelDestination]:
+        """Replace the first destination in `city`, keeping its id"""
+        with self._lock:
+            destination_id = self._first_in_city(city)
+            if destination_id is None:
+                return None
+
+            destination = destination.model_copy(update={"id": destination_id})
+            self._replace(destination)
+            return destination
+
+    def replace(self, destination: TravelDestination) -> Optional[TravelDestination]:
+        """Replace the destination with the same id, if there is one"""
+        with self._lock:
+            if destination.id not in self._by_id:
+                return None
+
+            self._replace(destination)
+            return destination
+
+    def delete_by_city(self, city: str) -> bool:
+        """Delete the first destination in `city`"""
+        with self._lock:
+            destination_id = self._first_in_city(city)
+            if destination_id is None:
+                return False
+
+            self._remove(destination_id)
+            return True
+
+    def delete(self, destination_id: int) -> bool:
+        with self._lock:
+            if destination_id not in self._by_id:
+                return False
+
+            self._remove(destination_id)
+            return True
+
+    def _first_in_city(self, city: str) -> Optional[int]:
+        return next(iter(self._by_city.get(city, ())), None)
+
+    def _index_keys(self, old: Optional[TravelDestination], new: Optional[TravelDestination]):
+        def keys(destination):
+            if destination is None:
+                return None, None, None
+            return destination.country, destination.city, (destination.country, destination.city)
+
+        indexes = (self._by_country, self._by_city, self._by_country_city)
+        return zip(indexes, keys(old), keys(new))
+
+    def _insert(self, destination: TravelDestination) -> None:
+        self._by_id[destination.id] = destination
+        insort(self._ids, destination.id)
+        self._position[destination.id] = self._next_position
+        self._next_position += 1
+        for index, _, key in self._index_keys(None, destination):
+            self._index_add(index, key, destination.id)
+
+    def _replace(self, destination: TravelDestination) -> None:
+        previous = self._by_id[destination.id]
+        # Assigning to an existing key keeps the destination's place in the listing
+        self._by_id[destination.id] = destination
+        for index, old_key, new_key in self._index_keys(previous, destination):
+            if old_key != new_key:
+                self._discard(index, old_key, destination.id)
+                self._index_add(index, new_key, destination.id)
+
+    def _remove(self, destination_id: int) -> None:
+        destination = self._by_id.pop(destination_id)
+        _remove_sorted(self._ids, destination_id)
+        del self._position[destination_id]
+        for index, key, _ in self._index_keys(destination, None):
+            self._discard(index, key, destination_id)
+
+    def _index_add(self, index: dict, key, destination_id: int) -> None:
+        bucket = index.get(key)
+        if bucket is None:
+            bucket = index[key] = _IndexBucket()
+        last_id = next(reversed(bucket.listed), None)
+        bucket.listed[destination_id] = None
+        insort(bucket.ids, destination_id)
+        # New destinations append in order; only an update that moves an older
+        # destination into this bucket needs a re-sort
+        if last_id is not None and self._position[last_id] > self._position[destination_id]:
+            bucket.listed = dict.fromkeys(sorted(bucket.listed, key=self._position.__getitem__))
+
+    @staticmethod
+    def _discard(index: dict, key, destination_id: int) -> None:
+        bucket = index.get(key)
+        if bucket is not None and destination_id in bucket.listed:
+            del bucket.listed[destination_id]
+            _remove_sorted(bucket.ids, destination_id)
+            if not bucket.listed:
+                del index[key]
+
+
+def _remove_sorted(ids: list[int], destination_id: int) -> None:
+    del ids[bisect_left(ids, destination_id)]
+
+
+class TravelDestinationCache:
+    """
+    This worker's copy of the traveldestinations table, as a TravelDestinationStore
+
+    A background task started with `start` loads it, and again every `ttl`
+    seconds, so no request waits for a load; until the first one is done,
+    listings query the table. Writes made through a
+    TravelDestinationRepository update it right away, those of other
+    workers show up within `ttl`.
+    """
+
+    def __init__(self, ttl: float, session_maker=database.session_maker):
+        self.ttl = ttl
+        self.session_maker = session_maker
+        self.store: Optional[TravelDestinationStore] = None
+        # Writes made while a load is in progress, applied to its result
+        self._pending: Optional[list[tuple[str, object]]] = None
+        self._refresher: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            await asyncio.gather(self._refresher, return_exceptions=True)
+            self._refresher = None
+
+    async def load(self) -> None:
+        self._pending = []
+        try:
+            async with self.session_maker() as session:
+                result = await session.exec(
+                    sqlalchemy.select(*(getattr(TravelDestinations, field) for field in DESTINATION_FIELDS))
+                    .order_by(TravelDestinations.id)
+                )
+                rows = result.all()
+            # Hundreds of thousands of objects take seconds to build, keep that off the event loop
+            store = await asyncio.to_thread(self._build, rows)
+            for action, value in self._pending:
+                self._apply(store, action, value)
+            self.store = store
+        finally:
+            self._pending = None
+
+    def put(self, row: TravelDestinations) -> None:
+        self._write("put", TravelDestination.model_validate(row, from_attributes=True))
+
+    def delete(self, destination_id: int) -> None:
+        self._write("delete", destination_id)
+
+    def _write(self, action: str, value) -> None:
+        if self._pending is not None:
+            self._pending.append((action, value))
+        if self.store is not None:
+            self._apply(self.store, action, value)
+
+    @staticmethod
+    def _apply(store: TravelDestinationStore, action: str, value) -> None:
+        if action == "delete":
+            store.delete(value)
+        elif store.replace(value) is None:
+            store.add(value)
+
+    @staticmethod
+    def _build(rows) -> TravelDestinationStore:
+        # Rows come from the table, they were validated on the way in
+        return TravelDestinationStore(
+            TravelDestination.model_construct(**dict(zip(DESTINATION_FIELDS, row))) for row in rows
+        )
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await self.load()
+            except Exception as e:
+                print(f"Travel destination cache refresh failed: {e}")
+            await asyncio.sleep(self.ttl)
+
+
+# Serves the listings when TRAVEL_DESTINATION_CACHE_TTL_SECONDS is set, see fast_api_app
+destination_cache = TravelDestinationCache(ttl=settings.TRAVEL_DESTINATION_CACHE_TTL_SECONDS)
+
+
+class TravelDestinationRepository:
+    """
+    Travel destinations stored in the traveldestinations table
+    With a cache, listings are read from it once loaded, and writes also
+    update it.
+    """
+
+    def __init__(self, session: AsyncSession, cache: Optional[TravelDestinationCache] = None):
+        self.session = session
+        self.cache = cache
+
+    async def list(
+            self,
+            limit: int,
+            after_id: Optional[int] = None,
+            fields: Sequence[str] = DESTINATION_FIELDS,
+            country: Optional[str] = None,
+            city: Optional[str] = None
+    ) -> list[dict]:
+        """
+        One page of destinations in id order (keyset pagination)
+        Pass the last id of a page as `after_id` to get the next one. id is
+        always selected, since it is the cursor.
+        """
+        fields = ["id"] + [field for field in fields if field != "id"]
+        store = self.cache.store if self.cache is not None else None
+        if store is not None:
+            return [
+                {field: getattr(destination, field) for field in fields}
+                for destination in store.page(limit, after_id, country, city)
+            ]
+
+        columns = [getattr(TravelDestinations, field) for field in fields]
+        # sqlmodel's select yields bare values for a single column, rows are needed here
+        query = sqlalchemy.select(*columns).order_by(TravelDestinations.id).limit(limit)
+
+        if after_id is not None:
+            query = query.where(TravelDestinations.id > after_id)
+        if country is not None:
+            query = query.where(TravelDestinations.country == country)
+        if city is not None:
+            query = query.where(TravelDestinations.city == city)
+
+        result = await self.session.exec(query)
+        return [dict(row) for row in result.mappings()]
+
+    async def add(self, destination: TravelDestination) -> TravelDestinations:
+        row = TravelDestinations(**destination.model_dump(exclude={"id"}))
+        self.session.add(row)
+        await self.session.commit()
+        await self.session.refresh(row)
+        if self.cache is not None:
+            self.cache.put(row)
+        return row
+
+    async def replace_by_city(self, city: str, destination: TravelDestination) -> Optional[TravelDestinations]:
+        """Replace the first destination in `city`, keeping its id"""
+        row = await self._first_in_city(city)
+        if row is None:
+            return None
+
+        for field, value in destination.model_dump(exclude={"id"}).items():
+            setattr(row, field, value)
+        await self.session.commit()
+        if self.cache is not None:
+            self.cache.put(row)
+        return row
+
+    async def delete_by_city(self, city: str) -> bool:
+        """Delete the first destination in `city`"""
+        row = await self._first_in_city(city)
+        if row is None:
+            return False
+
+        destination_id = row.id
+        await self.session.delete(row)
+        await self.session.commit()
+        if self.cache is not None:
+            self.cache.delete(destination_id)
+        return True
+
+    async def is_empty(self) -> bool:
+        result = await self.session.exec(select(TravelDestinations.id).limit(1))
+        return result.first() is None
+
+    async def _first_in_city(self, city: str) -> Optional[TravelDestinations]:
+        result = await self.session.exec(
+            select(TravelDestinations)
+            .where(TravelDestinations.city == city)
+            .order_by(TravelDestinations.id)
+            .limit(1)
+        )
+        return result.first()
+
+
+async def get_travel_destination_repository(
+        session: AsyncSession = Depends(get_db)
+) -> TravelDestinationRepository:
+    cache = destination_cache if destination_cache.ttl else None
+    return TravelDestinationRepository(session, cache)
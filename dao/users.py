@@ -0,0 +1,72 @@
+from typing import Optional
+
+from fastapi import Depends
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.auth_config import get_settings
+from core.cache import TTLCache
+from db import get_db
+from models.users import User
+
+settings = get_settings()
+
+# Users looked up on every /auth/validate and /auth/refresh call, keyed by username
+# Entries are detached, read-only copies; changes made here invalidate them
+user_cache = TTLCache(
+    max_size=settings.USER_CACHE_MAX_SIZE,
+    ttl=settings.USER_CACHE_TTL_SECONDS
+)
+
+
+class UserAlreadyExistsError(Exception):
+    pass
+
+
+class UserRepository:
+    """Auth service users stored in the users table"""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def get_by_username(self, username: str) -> Optional[User]:
+        user = user_cache.get(username)
+        if user is not None:
+            return user
+
+        result = await self.session.exec(select(User).where(User.username == username))
+        user = result.first()
+        if user is not None:
+            # Detached, so a rollback of this session cannot expire the cached copy
+            self.session.expunge(user)
+            user_cache.set(username, user)
+        return user
+
+    async def create(self, username: str, email: str, hashed_password: str) -> User:
+        user = User(username=username, email=email, hashed_password=hashed_password)
+        self.session.add(user)
+        try:
+            await self.session.commit()
+        except IntegrityError:
+            # Unique indexes on username and email settle concurrent registrations
+            await self.session.rollback()
+            raise UserAlreadyExistsError(username)
+
+        await self.session.refresh(user)
+        return user
+
+    async def set_active(self, username: str, is_active: bool) -> Optional[User]:
+        result = await self.session.exec(select(User).where(User.username == username))
+        user = result.first()
+        if user is None:
+            return None
+
+        user.is_active = is_active
+        await self.session.commit()
+        user_cache.delete(username)
+        return user
+
+
+async def get_user_repository(session: AsyncSession = Depends(get_db)) -> UserRepository:
+    return UserRepository(session)
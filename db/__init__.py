@@ -1,12 +1,85 @@
-from sqlalchemy import create_engine
+from typing import AsyncGenerator, Optional
+
+from sqlalchemy import MetaData, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
 from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from core.db_config import get_settings
+
+settings = get_settings()
+
+
+def create_db_engine(url: str, **overrides) -> AsyncEngine:
+    """
+    Async engine for aiosqlite or asyncpg URLs, tuned from DB_* settings
+    Keyword arguments override the settings for this engine only
+    """
+    options = {
+        "echo": settings.DB_ECHO,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+
+    sqlite = make_url(url).get_backend_name() == "sqlite"
+    in_memory = sqlite and make_url(url).database in (None, "", ":memory:")
+    if not in_memory:
+        # In-memory SQLite uses a single static connection, there is no pool to size
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    options.update(overrides)
+
+    engine = create_async_engine(url, **options)
+    if sqlite:
+        _apply_sqlite_pragmas(engine, wal=settings.SQLITE_WAL and not in_memory)
+    return engine
+
+
+def _apply_sqlite_pragmas(engine: AsyncEngine, wal: bool) -> None:
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if wal:
+            cursor.execute("PRAGMA journal_mode=WAL")
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+class Database:
+    """One engine (and connection pool) per database, shared by the whole app"""
+
+    def __init__(self, url: str, session_class: type = AsyncSession, **engine_options):
+        self.url = url
+        self.engine = create_db_engine(url, **engine_options)
+        self.session_maker = async_sessionmaker(self.engine, class_=session_class, expire_on_commit=False)
+
+    async def get_db(self) -> AsyncGenerator[AsyncSession, None]:
+        """Dependency: one session per request, committed on success"""
+        async with self.session_maker() as session:
+            try:
+                yield session
+                await session.commit()
+            except Exception:
+                await session.rollback()
+                raise
+
+    async def create_all(self, metadata: Optional[MetaData] = None) -> None:
+        async with self.engine.begin() as conn:
+            await conn.run_sync((metadata or SQLModel.metadata).create_all)
+
+    async def dispose(self) -> None:
+        await self.engine.dispose()
 
 
-sqlite_file_name = "database.db"
-sqlite_url = f"sqlite:///{sqlite_file_name}"
+# Default database of this process, selected with DATABASE_URL
+database = Database(settings.DATABASE_URL)
+get_db = database.get_db
 
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, connect_args=connect_args)
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+async def create_db_and_tables():
+    await database.create_all()
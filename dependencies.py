@@ -1,28 +1,91 @@
+from typing import Optional
+
 import httpx
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
 
 from core.app_config import get_settings
+from core.batching import MicroBatcher
+from core.cache import TTLCache, token_cache_key
+from core.jwks import JWKSClient
+from core.keys import is_asymmetric
+from core.singleflight import SingleFlight
 
 security = HTTPBearer()
 settings = get_settings()
 
+# Decoded payloads of tokens that already passed signature and claim checks
+token_cache = TTLCache(
+    max_size=settings.TOKEN_CACHE_MAX_SIZE,
+    ttl=settings.TOKEN_CACHE_TTL_SECONDS
+)
+
+# Valid responses from the auth server's /auth/validate endpoint
+remote_validation_cache = TTLCache(
+    max_size=settings.REMOTE_VALIDATION_CACHE_MAX_SIZE,
+    ttl=settings.REMOTE_VALIDATION_CACHE_TTL_SECONDS
+)
+
+# Concurrent validations of the same token share one call to the auth server
+remote_validations = SingleFlight()
+
+# One pooled client per app lifespan, so calls reuse keep-alive connections
+_auth_client: Optional[httpx.AsyncClient] = None
+
+
+def get_auth_client() -> httpx.AsyncClient:
+    """Return the shared auth server client, creating it on first use"""
+    global _auth_client
+    if _auth_client is None or _auth_client.is_closed:
+        _auth_client = httpx.AsyncClient(
+            http2=settings.AUTH_CLIENT_HTTP2,
+            timeout=settings.AUTH_CLIENT_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.AUTH_CLIENT_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.AUTH_CLIENT_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.AUTH_CLIENT_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _auth_client
+
+
+async def close_auth_client() -> None:
+    global _auth_client
+    if _auth_client is not None:
+        await _auth_client.aclose()
+        _auth_client = None
+
+
+# Cached public keys of the auth server, for local validation of RS*/ES* tokens
+jwks_client = JWKSClient(
+    settings.JWKS_URL or f"{settings.AUTH_SERVER_URL}/auth/jwks",
+    get_client=get_auth_client,
+    ttl=settings.JWKS_CACHE_TTL_SECONDS,
+    min_refresh_interval=settings.JWKS_MIN_REFRESH_INTERVAL_SECONDS
+)
+
 
 async def validate_token_locally(token: str) -> dict:
     """
-    Validate JWT token locally using shared secret
-    This is faster but requires sharing secret key
+    Validate JWT token locally using shared secret (HS*) or the auth
+    server's published public keys (RS*/ES*)
+    This is faster than remote validation, no per-request network call
+    Verified payloads are cached until the token expires
     """
+    cache_key = token_cache_key(token)
+    payload = token_cache.get(cache_key)
+    if payload is not None:
+        return payload
+
     try:
         payload = jwt.decode(
             token,
-            settings.SECRET_KEY,
+            await _verification_key(token),
             algorithms=[settings.ALGORITHM],
             audience=settings.EXPECTED_AUDIENCE,
             issuer=settings.EXPECTED_ISSUER
         )
-        return payload
     except JWTError as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -30,43 +93,95 @@ async def validate_token_locally(token: str) -> dict:
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    token_cache.set(cache_key, payload, expires_at=payload.get("exp"))
+    return payload
+
+
+async def _verification_key(token: str):
+    if not is_asymmetric(settings.ALGORITHM):
+        return settings.SECRET_KEY
+
+    kid = jwt.get_unverified_header(token).get("kid")
+    try:
+        return await jwks_client.get_key(kid)
+    except httpx.HTTPError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Auth service keys unavailable: {str(e)}"
+        )
+
 
 async def validate_token_remotely(token: str) -> dict:
     """
     Validate token by calling auth server's validation endpoint
     This is more secure but slower due to network call
+    Valid results may be cached for REMOTE_VALIDATION_CACHE_TTL_SECONDS
     """
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{settings.AUTH_SERVER_URL}/auth/validate",
-                headers={"Authorization": f"Bearer {token}"},
-                timeout=5.0
-            )
-
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token validation failed",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-
-            data = response.json()
-            if not data.get("valid"):
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail=data.get("message", "Invalid token"),
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-
-            return data
+    cache_key = token_cache_key(token)
+    data = remote_validation_cache.get(cache_key)
+    if data is not None:
+        return data
 
+    return await remote_validations.do(cache_key, lambda: _request_validation(token, cache_key))
+
+
+async def _request_validation(token: str, cache_key: str) -> dict:
+    """Validation round trip to the auth server, shared by all waiters"""
+    if settings.REMOTE_VALIDATION_BATCHING:
+        data = await remote_validation_batcher.submit(token)
+    else:
+        data = await _post_auth_server("/auth/validate", headers={"Authorization": f"Bearer {token}"})
+
+    if not data.get("valid"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=data.get("message", "Invalid token"),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    remote_validation_cache.set(cache_key, data, expires_at=_unverified_expiry(token))
+    return data
+
+
+async def _validate_batch(tokens: list[str]) -> list[dict]:
+    data = await _post_auth_server("/auth/validate/batch", json={"tokens": tokens})
+    return data["results"]
+
+
+async def _post_auth_server(path: str, **kwargs) -> dict:
+    try:
+        response = await get_auth_client().post(f"{settings.AUTH_SERVER_URL}{path}", **kwargs)
     except httpx.RequestError as e:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=f"Auth service unavailable: {str(e)}"
         )
 
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token validation failed",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    return response.json()
+
+
+# Gathers validations from concurrent requests into /auth/validate/batch calls
+remote_validation_batcher = MicroBatcher(
+    _validate_batch,
+    max_size=settings.REMOTE_VALIDATION_BATCH_MAX_SIZE,
+    max_wait=settings.REMOTE_VALIDATION_BATCH_WINDOW_MS / 1000
+)
+
+
+def _unverified_expiry(token: str) -> Optional[float]:
+    """Read exp without verifying, only used to cap how long a result is cached"""
+    try:
+        return jwt.get_unverified_claims(token).get("exp")
+    except JWTError:
+        return None
+
 
 async def get_current_user_local(
         credentials: HTTPAuthorizationCredentials = Depends(security)
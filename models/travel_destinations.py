@@ -1,7 +1,12 @@
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 
 class TravelDestinations(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_traveldestinations_country_city", "country", "city"),
+    )
+
     id: int = Field(default=None, primary_key=True)
-    city: str
-    country: str
+    city: str = Field(index=True)
+    country: str = Field(index=True)
     feature: str
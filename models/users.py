@@ -1,14 +1,20 @@
+from typing import Optional
+
 from sqlmodel import Field, SQLModel
 
-class UserBase(SQLModel, table=True):
-    email: str = Field(description="User's email", index=True)
-    name: str = Field(description="User's name", index=True)
-    phone: str = Field(description="User's phone number", index=True)
+class UserBase(SQLModel):
+    username: str = Field(description="User's login name", unique=True, index=True)
+    email: str = Field(description="User's email", unique=True, index=True)
+    name: Optional[str] = Field(default=None, description="User's name")
+    phone: Optional[str] = Field(default=None, description="User's phone number")
 
-class User(UserBase):
-    id: int = Field(primary_key=True)
-    password: str = Field(description="User's password")
+class User(UserBase, table=True):
+    __tablename__ = "users"
 
-class UserPublic(UserBase):
-    id: int = Field(primary_key=True)
+    id: Optional[int] = Field(default=None, primary_key=True)
+    hashed_password: str = Field(description="bcrypt hash of the user's password")
+    is_active: bool = Field(default=True)
 
+class UserPublic(UserBase):
+    id: int
+    is_active: bool
@@ -1,37 +1,41 @@
+from typing import Optional
+
 from core.auth_config import get_settings
-from fastapi import APIRouter, Depends, HTTPException, status, Header
+from core.keys import is_asymmetric
+from fastapi import APIRouter, Depends, HTTPException, status, Header, Response
 from fastapi.security import OAuth2PasswordRequestForm
-from jose import jwt, JWTError
+from jose import JWTError
 
 from core.security import (
-    verify_password,
-    get_password_hash,
+    verify_password_async,
+    get_password_hash_async,
     create_access_token,
-    create_refresh_token
+    create_refresh_token,
+    decode_token,
+    key_ring
+)
+from schemas.auth import (
+    TokenResponse,
+    TokenValidationResponse,
+    BatchTokenValidationRequest,
+    BatchTokenValidationResponse,
+    PublicKeyResponse
 )
-from schemas.auth import TokenResponse, TokenValidationResponse, PublicKeyResponse
+from dao.users import UserRepository, UserAlreadyExistsError, get_user_repository
 from schemas.users import UserCreate, UserResponse
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 settings = get_settings()
 
-# Mock database
-fake_users_db = {
-    "testuser": {
-        "id": 1,
-        "username": "testuser",
-        "email": "test@example.com",
-        "hashed_password": "$2b$12$O8p1FmLGdlnth6U/zvxzOebKoMJft6ozXwuFg1BaD.rgHJL1Cnp8a",
-        "is_active": True
-    }
-}
-
 
 @router.post("/login", response_model=TokenResponse)
-async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login(
+        form_data: OAuth2PasswordRequestForm = Depends(),
+        users: UserRepository = Depends(get_user_repository)
+):
     """Login endpoint - generates JWT tokens"""
-    user = fake_users_db.get(form_data.username)
-    if not user or not verify_password(form_data.password, user["hashed_password"]):
+    user = await users.get_by_username(form_data.username)
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -40,13 +44,13 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 
     # Create tokens with user info
     token_data = {
-        "sub": user["username"],
-        "user_id": user["id"],
-        "email": user["email"]
+        "sub": user.username,
+        "user_id": user.id,
+        "email": user.email
     }
 
     access_token = create_access_token(data=token_data)
-    refresh_token = create_refresh_token(data={"sub": user["username"]})
+    refresh_token = create_refresh_token(data={"sub": user.username})
 
     return {
         "access_token": access_token,
@@ -57,48 +61,72 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
 
 
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register(user: UserCreate):
+async def register(user: UserCreate, users: UserRepository = Depends(get_user_repository)):
     """Register new user"""
-    if user.username in fake_users_db:
+    if await users.get_by_username(user.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already registered"
         )
 
-    hashed_password = get_password_hash(user.password)
-    user_dict = {
-        "id": len(fake_users_db) + 1,
-        "username": user.username,
-        "email": user.email,
-        "hashed_password": hashed_password,
-        "is_active": True
-    }
+    hashed_password = await get_password_hash_async(user.password)
 
-    fake_users_db[user.username] = user_dict
-    return user_dict
+    try:
+        # Another request may have registered the name while we were hashing
+        return await users.create(user.username, user.email, hashed_password)
+    except UserAlreadyExistsError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username or email already registered"
+        )
 
 
 @router.post("/validate", response_model=TokenValidationResponse, include_in_schema=False)
-async def validate_token(authorization: str = Header(...)):
+async def validate_token(
+        authorization: str = Header(...),
+        users: UserRepository = Depends(get_user_repository)
+):
     """
     Endpoint for remote servers to validate JWT tokens
     Remote server sends: Authorization: Bearer <token>
     """
-    try:
-        # Extract token from header
-        if not authorization.startswith("Bearer "):
-            return TokenValidationResponse(
-                valid=False,
-                message="Invalid authorization header format"
-            )
+    # Extract token from header
+    if not authorization.startswith("Bearer "):
+        return TokenValidationResponse(
+            valid=False,
+            message="Invalid authorization header format"
+        )
+
+    token = authorization.replace("Bearer ", "")
+    return await check_access_token(token, users)
 
-        token = authorization.replace("Bearer ", "")
 
+@router.post("/validate/batch", response_model=BatchTokenValidationResponse, include_in_schema=False)
+async def validate_token_batch(
+        request: BatchTokenValidationRequest,
+        users: UserRepository = Depends(get_user_repository)
+):
+    """
+    Validate many tokens in one round trip
+    Results are returned in the same order as the submitted tokens
+    """
+    if len(request.tokens) > settings.VALIDATE_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.VALIDATE_BATCH_MAX_SIZE} tokens per batch"
+        )
+
+    return BatchTokenValidationResponse(
+        results=[await check_access_token(token, users) for token in request.tokens]
+    )
+
+
+async def check_access_token(token: str, users: UserRepository) -> TokenValidationResponse:
+    """Decode an access token and check its user is still active"""
+    try:
         # Decode and validate token
-        payload = jwt.decode(
+        payload = decode_token(
             token,
-            settings.SECRET_KEY,
-            algorithms=[settings.ALGORITHM],
             audience=settings.AUDIENCE,
             issuer=settings.ISSUER
         )
@@ -113,8 +141,8 @@ async def validate_token(authorization: str = Header(...)):
             )
 
         # Verify user still exists and is active
-        user = fake_users_db.get(username)
-        if not user or not user.get("is_active"):
+        user = await users.get_by_username(username)
+        if not user or not user.is_active:
             return TokenValidationResponse(
                 valid=False,
                 message="User not found or inactive"
@@ -138,24 +166,50 @@ async def validate_token(authorization: str = Header(...)):
 async def get_public_key_info():
     """
     Endpoint for remote servers to get token validation info
-    For production, use RSA and return actual public key
+    With RS*/ES* algorithms the public keys are served from /auth/jwks
     """
+    asymmetric = is_asymmetric(settings.ALGORITHM)
     return PublicKeyResponse(
         algorithm=settings.ALGORITHM,
         issuer=settings.ISSUER,
-        audience=settings.AUDIENCE
+        audience=settings.AUDIENCE,
+        jwks_uri="/auth/jwks" if asymmetric else None,
+        active_kid=key_ring.active.kid if asymmetric else None
     )
 
 
+@router.get("/jwks")
+async def get_jwks(response: Response, if_none_match: Optional[str] = Header(None)):
+    """
+    JSON Web Key Set with every published signing key
+    Remote servers cache it and revalidate with If-None-Match
+    """
+    if not is_asymmetric(settings.ALGORITHM):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No public keys for {settings.ALGORITHM}"
+        )
+
+    jwks = key_ring.jwks()
+    headers = {
+        "ETag": key_ring.etag,
+        "Cache-Control": f"public, max-age={settings.JWKS_MAX_AGE_SECONDS}"
+    }
+    if if_none_match == key_ring.etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response.headers.update(headers)
+    return jwks
+
+
 @router.post("/refresh", response_model=TokenResponse)
-async def refresh_access_token(refresh_token: str):
+async def refresh_access_token(
+        refresh_token: str,
+        users: UserRepository = Depends(get_user_repository)
+):
     """Refresh access token using refresh token"""
     try:
-        payload = jwt.decode(
-            refresh_token,
-            settings.SECRET_KEY,
-            algorithms=[settings.ALGORITHM]
-        )
+        payload = decode_token(refresh_token)
 
         if payload.get("type") != "refresh":
             raise HTTPException(
@@ -164,7 +218,7 @@ async def refresh_access_token(refresh_token: str):
             )
 
         username = payload.get("sub")
-        user = fake_users_db.get(username)
+        user = await users.get_by_username(username)
 
         if not user:
             raise HTTPException(
@@ -174,9 +228,9 @@ async def refresh_access_token(refresh_token: str):
 
         # Create new access token
         token_data = {
-            "sub": user["username"],
-            "user_id": user["id"],
-            "email": user["email"]
+            "sub": user.username,
+            "user_id": user.id,
+            "email": user.email
         }
 
         new_access_token = create_access_token(data=token_data)
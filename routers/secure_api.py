@@ -7,7 +7,7 @@ router = APIRouter(prefix="/api", tags=["API"])
 async def protected_endpoint_local(current_user: dict = Depends(get_current_user_local)):
     """
     Protected endpoint using LOCAL token validation
-    Faster but requires shared secret
+    Faster, needs the shared secret (HS*) or the auth server's JWKS (RS*/ES*)
     """
     return {
         "message": "This is a protected endpoint (local validation)",
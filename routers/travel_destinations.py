@@ -1,9 +1,16 @@
 from time import sleep
+from typing import Optional
 
-from fastapi import APIRouter, HTTPException, Path, Query, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Path, Query, BackgroundTasks, Depends, Response
 from starlette import status
 from fastapi.responses import StreamingResponse
 
+from dao.travel_destinations import (
+    DESTINATION_FIELDS,
+    TravelDestinationRepository,
+    get_travel_destination_repository
+)
+from db import database
 from schemas.travel_destinations import TravelDestination
 
 router = APIRouter(prefix="/travel_destinations", tags=["Travel Destinations"])
@@ -17,58 +24,72 @@ destinations = [
     {'city': 'Tokyo', 'country': 'Japan', 'feature': 'Modern cityscape and traditional temples'}
 ]
 
-destination_objects = [
-    TravelDestination(id=i, **dest)
-    for i, dest in enumerate(destinations, start=1)
-]
+async def seed_travel_destinations():
+    """Load the sample destinations into an empty table"""
+    async with database.session_maker() as session:
+        repository = TravelDestinationRepository(session)
+        if await repository.is_empty():
+            for dest in destinations:
+                await repository.add(TravelDestination(**dest))
+
+def parse_fields(fields: Optional[str]) -> list[str]:
+    if not fields:
+        return list(DESTINATION_FIELDS)
+
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = set(requested) - set(DESTINATION_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested
+
+def set_next_cursor(response: Response, page: list[dict], limit: int):
+    # A full page means there may be more; clients pass this back as after_id
+    if len(page) == limit:
+        response.headers["X-Next-After-Id"] = str(page[-1]["id"])
 
 def run_long_running_job():
     sleep(10)
     print("Running Long Running Job")
 
 @router.get("/", status_code= status.HTTP_200_OK)
-async def get_travel_destinations():
-    return destination_objects
+async def get_travel_destinations(response: Response,
+                                  limit: int = Query(100, ge=1, le=1000, description="Page size"),
+                                  after_id: Optional[int] = Query(None, description="Last id of the previous page"),
+                                  fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+                                  repository: TravelDestinationRepository = Depends(get_travel_destination_repository)):
+    page = await repository.list(limit, after_id, parse_fields(fields))
+    set_next_cursor(response, page, limit)
+    return page
 
 @router.get("/{country}", status_code= status.HTTP_200_OK)
-async def get_country_travel_destinations(country: str, city: str = None):
-    country_destinations = []
-    for destination in destination_objects:
-        if destination.country == country:
-            if city and destination.city == city:
-                country_destinations.append(destination)
-            elif city is None:
-                country_destinations.append(destination)
-    return country_destinations
+async def get_country_travel_destinations(country: str, response: Response, city: str = None,
+                                          limit: int = Query(100, ge=1, le=1000, description="Page size"),
+                                          after_id: Optional[int] = Query(None, description="Last id of the previous page"),
+                                          fields: Optional[str] = Query(None, description="Comma separated fields to return"),
+                                          repository: TravelDestinationRepository = Depends(get_travel_destination_repository)):
+    page = await repository.list(limit, after_id, parse_fields(fields), country=country, city=city)
+    set_next_cursor(response, page, limit)
+    return page
 
 @router.post("/create_travel_destination", status_code= status.HTTP_201_CREATED)
-async def create_travel_destinations(new_destination: TravelDestination, background_tasks: BackgroundTasks):
+async def create_travel_destinations(new_destination: TravelDestination, background_tasks: BackgroundTasks,
+                                     repository: TravelDestinationRepository = Depends(get_travel_destination_repository)):
     background_tasks.add_task(run_long_running_job)
     new_dest =TravelDestination(**new_destination.model_dump())
-    destination_objects.append(new_dest)
+    await repository.add(new_dest)
 
 @router.put("/{city}", status_code= status.HTTP_200_OK)
 async def update_travel_destinations(city: str = Path(description="Name of City"),
-                                     new_destination: TravelDestination = Query(description="New Destination")):
-    found = False
-    for i in range(len(destination_objects)):
-        if destination_objects[i].city == city:
-            new_dest = TravelDestination(**new_destination.model_dump())
-            destination_objects[i] = new_dest
-            found = True
-            break
-    if not found:
+                                     new_destination: TravelDestination = Query(description="New Destination"),
+                                     repository: TravelDestinationRepository = Depends(get_travel_destination_repository)):
+    new_dest = TravelDestination(**new_destination.model_dump())
+    if await repository.replace_by_city(city, new_dest) is None:
         raise HTTPException(status_code=404, detail="City not found")
 
 @router.delete("/{city}", status_code= status.HTTP_204_NO_CONTENT)
-async def delete_travel_destinations(city: str):
-    found = False
-    for i in range(len(destination_objects)):
-        if destination_objects[i].city == city:
-            destination_objects.pop(i)
-            found = True
-            break
-    if not found:
+async def delete_travel_destinations(city: str,
+                                     repository: TravelDestinationRepository = Depends(get_travel_destination_repository)):
+    if not await repository.delete_by_city(city):
         raise HTTPException(status_code=404, detail="City not found")
 
 async def fake_video_streamer():
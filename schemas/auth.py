@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class TokenResponse(BaseModel):
     access_token: str
@@ -13,10 +13,19 @@ class TokenValidationResponse(BaseModel):
     username: Optional[str] = None
     message: Optional[str] = None
 
+class BatchTokenValidationRequest(BaseModel):
+    tokens: List[str]
+
+class BatchTokenValidationResponse(BaseModel):
+    """Results in the same order as the submitted tokens"""
+    results: List[TokenValidationResponse]
+
 class PublicKeyResponse(BaseModel):
     """Info for remote servers to validate tokens"""
     algorithm: str
     issuer: str
     audience: str
-    # Note: For production, use RSA and expose public key
-    # For demo with HS256, share secret_key securely
\ No newline at end of file
+    # Set for RS*/ES* algorithms, where remote servers verify with public keys
+    # For HS256, share secret_key securely instead
+    jwks_uri: Optional[str] = None
+    active_kid: Optional[str] = None
\ No newline at end of file
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# Test databases, before the settings are first read. The dispatcher runs
+# sessions concurrently, which in-memory SQLite's single connection cannot
+# keep apart, so the webhook database is a file
+_webhook_dir = tempfile.mkdtemp(prefix="webhook-tests-")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+os.environ.setdefault("WEBHOOK_DATABASE_URL", f"sqlite+aiosqlite:///{_webhook_dir}/webhooks.db")
+os.environ.setdefault("WEBHOOK_DISPATCHER_EMBEDDED", "false")
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_webhook_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def webhook_db():
+    """The webhook database, with empty tables"""
+    from webhooks.db import database
+    from webhooks.delivery import signature_cache
+    from webhooks.models import Base
+    from webhooks.routing import subscription_router
+
+    await database.create_all(Base.metadata)
+    yield database
+    async with database.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    # Closes the connection and its aiosqlite thread, the next test opens another
+    await database.dispose()
+    subscription_router.invalidate()
+    signature_cache.clear()
+
+
+@pytest.fixture
+def subscribe(webhook_db):
+    """Creates an active subscription to `events`, with any other column values given"""
+    import json
+    from webhooks.models import WebhookSubscription
+    from webhooks.routing import subscription_events, subscription_router
+
+    async def subscribe(events, url="http://receiver.test/hook", **columns) -> int:
+        async with webhook_db.session_maker() as db:
+            subscription = WebhookSubscription(url=url, events=json.dumps(events), **columns)
+            db.add(subscription)
+            await db.flush()
+            db.add_all(subscription_events(subscription.id, events))
+            await db.commit()
+            subscription_router.invalidate()
+            return subscription.id
+
+    return subscribe
+
+
+class Receiver:
+    """Stands in for subscriber endpoints: records requests, answers with `status_code`"""
+
+    def __init__(self):
+        self.requests: list = []
+        self.status_code = 200
+
+    def handle(self, request):
+        import httpx
+
+        self.requests.append(request)
+        return httpx.Response(self.status_code)
+
+
+@pytest.fixture
+async def receiver(monkeypatch):
+    """Routes webhook deliveries to a Receiver instead of the network"""
+    import httpx
+    from webhooks import delivery
+
+    receiver = Receiver()
+    client = httpx.AsyncClient(transport=httpx.MockTransport(receiver.handle))
+    monkeypatch.setattr(delivery, "_webhook_client", client)
+    yield receiver
+    await client.aclose()
+
+
+class FakeWebSocket:
+    """Stands in for a chat client's WebSocket: records frames, `close` and what it was sent"""
+
+    def __init__(self):
+        self.accepted = False
+        self.frames: list = []
+        self.closed_with = None
+
+    async def accept(self):
+        self.accepted = True
+
+    async def send_text(self, data: str):
+        self.frames.append(data)
+
+    async def send_bytes(self, data: bytes):
+        self.frames.append(data)
+
+    async def close(self, code: int = 1000, reason: str = None):
+        self.closed_with = (code, reason)
+
+
+@pytest.fixture
+def make_websocket():
+    return FakeWebSocket
@@ -0,0 +1,144 @@
+import httpx
+import pytest
+from sqlmodel import SQLModel
+
+from auth_app import DEMO_USER, app
+from core.security import create_access_token
+from dao.users import UserAlreadyExistsError, UserRepository, user_cache
+from db import database
+from routers import auth
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def users():
+    """The auth database with the demo user"""
+    await database.create_all()
+    async with database.session_maker() as session:
+        repository = UserRepository(session)
+        await repository.create(**DEMO_USER)
+        yield repository
+    async with database.engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+    await database.dispose()
+    user_cache.clear()
+
+
+@pytest.fixture
+async def client(users):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url="http://test") as client:
+        yield client
+
+
+def access_token(username: str = "testuser") -> str:
+    return create_access_token({"sub": username, "user_id": 1})
+
+
+async def test_batch_results_follow_the_order_of_the_tokens(client):
+    tokens = [access_token(), "not-a-jwt", access_token("nobody"), access_token()]
+    response = await client.post("/auth/validate/batch", json={"tokens": tokens})
+
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["valid"] for result in results] == [True, False, False, True]
+    assert results[0]["username"] == "testuser"
+    assert results[1]["message"].startswith("Invalid token")
+    assert results[2]["message"] == "User not found or inactive"
+
+
+async def test_batch_agrees_with_single_validation(client):
+    token = access_token()
+    single = await client.post("/auth/validate", headers={"Authorization": f"Bearer {token}"})
+    batch = await client.post("/auth/validate/batch", json={"tokens": [token]})
+
+    assert batch.json()["results"] == [single.json()]
+
+
+async def test_oversized_batch_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(auth.settings, "VALIDATE_BATCH_MAX_SIZE", 2)
+    response = await client.post("/auth/validate/batch", json={"tokens": [access_token()] * 3})
+
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def queries(users, monkeypatch):
+    """Counts the queries the repository runs"""
+    calls = []
+    execute = users.session.exec
+
+    async def counted(statement, *args, **kwargs):
+        calls.append(statement)
+        return await execute(statement, *args, **kwargs)
+
+    monkeypatch.setattr(users.session, "exec", counted)
+    return calls
+
+
+async def test_user_lookups_are_cached(users, queries):
+    first = await users.get_by_username("testuser")
+    second = await users.get_by_username("testuser")
+
+    assert first.email == DEMO_USER["email"]
+    assert second is first
+    assert len(queries) == 1
+
+
+async def test_cached_user_survives_a_rollback_of_its_session(users):
+    await users.get_by_username("testuser")
+    await users.session.rollback()
+
+    async with database.session_maker() as session:
+        user = await UserRepository(session).get_by_username("testuser")
+    assert user.hashed_password == DEMO_USER["hashed_password"]
+
+
+async def test_unknown_users_are_looked_up_every_time(users, queries):
+    assert await users.get_by_username("nobody") is None
+    assert await users.get_by_username("nobody") is None
+    assert len(queries) == 2
+
+
+async def test_duplicate_users_are_rejected(users):
+    with pytest.raises(UserAlreadyExistsError):
+        await users.create("testuser", "other@example.com", DEMO_USER["hashed_password"])
+    with pytest.raises(UserAlreadyExistsError):
+        await users.create("other", DEMO_USER["email"], DEMO_USER["hashed_password"])
+    # The session is usable again after the failed insert
+    assert (await users.create("other", "other@example.com", DEMO_USER["hashed_password"])).id is not None
+
+
+async def test_deactivation_takes_effect_immediately(client, users):
+    token = access_token()
+    await users.get_by_username("testuser")
+    await users.set_active("testuser", False)
+
+    response = await client.post("/auth/validate", headers={"Authorization": f"Bearer {token}"})
+    assert response.json() == {
+        "valid": False, "user_id": None, "username": None, "message": "User not found or inactive"
+    }
+    assert await users.set_active("nobody", False) is None
+
+
+async def test_register_then_login(client):
+    response = await client.post("/auth/register", json={"username": "ada", "email": "ada@example.com", "password": "lovelace"})
+    assert response.status_code == 201
+    assert response.json()["username"] == "ada"
+
+    response = await client.post("/auth/register", json={"username": "ada", "email": "ada2@example.com", "password": "lovelace"})
+    assert response.status_code == 400
+
+    response = await client.post("/auth/login", data={"username": "ada", "password": "wrong"})
+    assert response.status_code == 401
+
+    response = await client.post("/auth/login", data={"username": "ada", "password": "lovelace"})
+    assert response.status_code == 200
+    tokens = response.json()
+
+    response = await client.post("/auth/validate", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+    assert response.json()["username"] == "ada"
+
+    response = await client.post("/auth/refresh", params={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    assert response.json()["refresh_token"] == tokens["refresh_token"]
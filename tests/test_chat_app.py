@@ -0,0 +1,63 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from web_socket_app import app, manager, parse_action
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("data", ["hello", "{hi}", "{}", '{"text": "hi"}', '["action"]', "{ not json"])
+def test_messages_without_an_action_are_chat(data):
+    assert parse_action(data) is None
+
+
+def test_actions_are_json_objects_with_an_action():
+    assert parse_action('{"action": "subscribe", "room": "news"}') == {"action": "subscribe", "room": "news"}
+
+
+def test_text_that_looks_like_json_is_broadcast(client):
+    with client.websocket_connect("/ws/1") as alice, client.websocket_connect("/ws/2") as bob:
+        alice.send_text("{hi}")
+        assert alice.receive_text() == "You wrote: {hi}"
+        assert alice.receive_text() == "Client #1 says: {hi}"
+        assert bob.receive_text() == "Client #1 says: {hi}"
+
+
+def test_room_messages_reach_members_only(client):
+    with client.websocket_connect("/ws/1") as alice, client.websocket_connect("/ws/2") as bob:
+        alice.send_text('{"action": "subscribe", "room": "news"}')
+        assert alice.receive_text() == "Subscribed to news"
+
+        bob.send_text('{"action": "publish", "room": "news", "message": "extra"}')
+        bob.send_text('{"action": "publish", "room": "sport", "message": "goal"}')
+        bob.send_text("done")
+        assert alice.receive_text() == "Client #2 in news says: extra"
+        # Nothing from sport, next is bob's broadcast to everyone
+        assert alice.receive_text() == "Client #2 says: done"
+
+        alice.send_text('{"action": "unsubscribe", "room": "news"}')
+        assert alice.receive_text() == "Unsubscribed from news"
+        assert manager.rooms == {}
+
+
+def test_direct_messages_reach_every_connection_of_the_client(client):
+    with client.websocket_connect("/ws/1") as alice, client.websocket_connect("/ws/2") as bob, \
+            client.websocket_connect("/ws/2") as bob_again:
+        alice.send_text('{"action": "direct", "to": 2, "message": "psst"}')
+        assert bob.receive_text() == "Client #1 whispers: psst"
+        assert bob_again.receive_text() == "Client #1 whispers: psst"
+    assert manager.clients == {}
+
+
+def test_invalid_actions_are_reported(client):
+    with client.websocket_connect("/ws/1") as alice:
+        alice.send_text('{"action": "subscribe"}')
+        assert alice.receive_text() == "Error: invalid action"
+        alice.send_text('{"action": "direct", "to": "bob", "message": "hi"}')
+        assert alice.receive_text() == "Error: invalid action"
+        alice.send_text('{"action": "dance"}')
+        assert alice.receive_text() == "Error: unknown action dance"
@@ -0,0 +1,147 @@
+import asyncio
+import os
+import socket
+import stat
+
+import pytest
+
+from chat.backplane import Backplane, InProcessBackplane, UnixSocketBackplane, create_backplane
+
+pytestmark = pytest.mark.anyio
+
+
+def test_incomplete_backplane_cannot_be_created():
+    class PublishOnly(Backplane):
+        async def publish(self, data: bytes) -> None:
+            pass
+
+    with pytest.raises(TypeError):
+        PublishOnly()
+
+
+def test_create_backplane_rejects_unknown_kinds():
+    assert isinstance(create_backplane("memory"), InProcessBackplane)
+    with pytest.raises(ValueError):
+        create_backplane("carrier-pigeon")
+
+
+async def test_in_process_backplane_reaches_other_nodes_of_the_channel():
+    received = {"a": [], "b": [], "other": []}
+    a, b, other = InProcessBackplane("chat"), InProcessBackplane("chat"), InProcessBackplane("elsewhere")
+    await a.start(received["a"].append)
+    await b.start(received["b"].append)
+    await other.start(received["other"].append)
+
+    await a.publish(b"hello")
+    assert received == {"a": [], "b": [b"hello"], "other": []}
+
+    await b.stop()
+    await a.publish(b"again")
+    assert received["b"] == [b"hello"]
+    await a.stop()
+    await other.stop()
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    for _ in range(int(timeout / 0.01)):
+        if condition():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("Timed out")
+
+
+async def test_unix_socket_backplane_delivers_between_nodes(tmp_path):
+    directory = str(tmp_path / "backplane")
+    received = {"a": [], "b": []}
+    a = UnixSocketBackplane(directory, refresh_interval=0)
+    b = UnixSocketBackplane(directory, refresh_interval=0)
+    await a.start(received["a"].append)
+    await b.start(received["b"].append)
+    try:
+        await a.publish(b"from a")
+        await b.publish(b"from b")
+        await wait_for(lambda: received["a"] and received["b"])
+        assert received == {"a": [b"from b"], "b": [b"from a"]}
+    finally:
+        await a.stop()
+        await b.stop()
+
+
+async def test_unix_socket_backplane_forgets_dead_nodes(tmp_path):
+    directory = tmp_path / "backplane"
+    a = UnixSocketBackplane(str(directory), refresh_interval=0)
+    await a.start(lambda data: None)
+    # A node that exited without removing its socket
+    dead = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    dead.bind(str(directory / "1-deadbeef.sock"))
+    dead.close()
+
+    await a.publish(b"hello")
+    assert [path.name for path in directory.iterdir()] == [os.path.basename(a.path)]
+    await a.stop()
+
+
+def test_default_socket_directory_is_per_user(monkeypatch, tmp_path):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    assert UnixSocketBackplane().directory == str(tmp_path / "chat-backplane")
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    assert UnixSocketBackplane().directory.endswith(f"chat-backplane-{os.getuid()}")
+
+
+async def test_unix_socket_backplane_creates_a_private_directory(tmp_path):
+    directory = tmp_path / "backplane"
+    backplane = UnixSocketBackplane(str(directory))
+    await backplane.start(lambda data: None)
+    await backplane.stop()
+    assert stat.S_IMODE(directory.stat().st_mode) == 0o700
+
+
+async def test_unix_socket_backplane_refuses_a_shared_directory(tmp_path):
+    directory = tmp_path / "backplane"
+    directory.mkdir(mode=0o700)
+    directory.chmod(0o777)
+    with pytest.raises(RuntimeError, match="mode 777"):
+        await UnixSocketBackplane(str(directory)).start(lambda data: None)
+
+
+async def test_unix_socket_backplane_refuses_a_symlink(tmp_path):
+    target = tmp_path / "elsewhere"
+    target.mkdir(mode=0o700)
+    (tmp_path / "backplane").symlink_to(target)
+    with pytest.raises(RuntimeError, match="not a directory"):
+        await UnixSocketBackplane(str(tmp_path / "backplane")).start(lambda data: None)
+
+
+@pytest.mark.skipif(os.getuid() != 0, reason="Needs root to give the directory away")
+async def test_unix_socket_backplane_refuses_another_users_directory(tmp_path):
+    directory = tmp_path / "backplane"
+    directory.mkdir(mode=0o700)
+    os.chown(directory, 65534, 65534)
+    with pytest.raises(RuntimeError, match="owned by uid 65534"):
+        await UnixSocketBackplane(str(directory)).start(lambda data: None)
+
+
+async def test_managers_reach_each_others_clients(make_websocket):
+    from chat.manager import ConnectionManager
+
+    one = ConnectionManager(backplane=InProcessBackplane("nodes"))
+    two = ConnectionManager(backplane=InProcessBackplane("nodes"))
+    await one.start()
+    await two.start()
+    try:
+        alice, bob = make_websocket(), make_websocket()
+        await one.connect(alice, 1)
+        bob_connection = await two.connect(bob, 2)
+        two.join(bob_connection, "news")
+
+        await one.broadcast("to everyone")
+        await one.broadcast("to news", "news")
+        await one.send_to_client(2, "to bob")
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+        assert alice.frames == ["to everyone"]
+        assert bob.frames == ["to everyone", "to news", "to bob"]
+    finally:
+        await one.stop()
+        await two.stop()
@@ -0,0 +1,150 @@
+import asyncio
+
+import msgpack
+import orjson
+import pytest
+
+from chat.connection import Connection, SlowConsumerPolicy
+from chat.encoding import MessageEncoding, encode_batch, encode_message
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.mark.parametrize("message", ["", "hi", "é" * 40, "x" * 300, "y" * 70000])
+def test_msgpack_frames_decode_to_the_message(message):
+    assert msgpack.unpackb(encode_message(message, MessageEncoding.MSGPACK)) == message
+    assert encode_message(message, MessageEncoding.TEXT) == message
+
+
+@pytest.mark.parametrize("count", [0, 1, 15, 16, 70000])
+def test_batches_decode_to_the_messages_in_order(count):
+    messages = [f"message {i}" for i in range(count)]
+    assert msgpack.unpackb(encode_batch(messages, MessageEncoding.MSGPACK)) == messages
+    assert orjson.loads(encode_batch(messages, MessageEncoding.TEXT)) == messages
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class BlockedWebSocket:
+    """A client that takes no frames until `unblock`"""
+
+    def __init__(self):
+        self.frames = []
+        self.closed_with = None
+        self._open = asyncio.Event()
+
+    def unblock(self):
+        self._open.set()
+
+    async def send_text(self, data):
+        await self._open.wait()
+        self.frames.append(data)
+
+    async def send_bytes(self, data):
+        await self._open.wait()
+        self.frames.append(data)
+
+    async def close(self, code=1000, reason=None):
+        self.closed_with = (code, reason)
+
+
+async def test_messages_are_sent_in_order_by_the_writer(make_websocket):
+    websocket = make_websocket()
+    connection = Connection(websocket, lambda connection: None)
+    connection.start()
+    for i in range(3):
+        assert connection.send(f"m{i}")
+    await settle()
+    assert websocket.frames == ["m0", "m1", "m2"]
+    connection.stop()
+
+
+async def test_slow_consumers_lose_their_oldest_messages():
+    websocket = BlockedWebSocket()
+    connection = Connection(websocket, lambda connection: None, max_queue_size=2, policy=SlowConsumerPolicy.DROP_OLDEST)
+    connection.start()
+    connection.send("m0")
+    await settle()  # m0 is being sent, the writer waits on the client
+    for message in ("m1", "m2", "m3"):
+        connection.send(message)
+    assert connection.dropped == 1
+
+    websocket.unblock()
+    await settle()
+    assert websocket.frames == ["m0", "m2", "m3"]
+    connection.stop()
+
+
+async def test_slow_consumers_can_be_disconnected():
+    removed = []
+    websocket = BlockedWebSocket()
+    connection = Connection(websocket, removed.append, max_queue_size=1, policy=SlowConsumerPolicy.DISCONNECT)
+    connection.start()
+    connection.send("m0")
+    await settle()
+    assert connection.send("m1")
+    assert not connection.send("m2")
+
+    await settle()
+    assert connection.closed
+    assert removed == [connection]
+    assert websocket.closed_with == (1008, "Slow consumer")
+    assert not connection.send("m3")
+
+
+async def test_a_failed_send_removes_the_connection(make_websocket):
+    removed = []
+    websocket = make_websocket()
+
+    async def gone(data):
+        raise RuntimeError("Connection closed")
+
+    websocket.send_text = gone
+    connection = Connection(websocket, removed.append)
+    connection.start()
+    connection.send("m0")
+    await settle()
+    assert connection.closed
+    assert removed == [connection]
+
+
+@pytest.mark.parametrize("encoding, decode", [
+    (MessageEncoding.TEXT, orjson.loads),
+    (MessageEncoding.MSGPACK, msgpack.unpackb),
+])
+async def test_batched_connections_get_one_frame_per_interval(make_websocket, encoding, decode):
+    websocket = make_websocket()
+    connection = Connection(websocket, lambda connection: None, encoding=encoding, batch_interval=0.01)
+    connection.start()
+    for i in range(3):
+        connection.send(f"m{i}")
+    await asyncio.sleep(0.05)
+    connection.send("m3")
+    await asyncio.sleep(0.05)
+    assert [decode(frame) for frame in websocket.frames] == [["m0", "m1", "m2"], ["m3"]]
+    connection.stop()
+
+
+async def test_a_blocked_client_does_not_hold_up_a_broadcast(make_websocket):
+    from chat.backplane import InProcessBackplane
+    from chat.manager import ConnectionManager
+
+    manager = ConnectionManager(backplane=InProcessBackplane("blocked"), max_queue_size=1,
+                                slow_consumer_policy=SlowConsumerPolicy.DISCONNECT)
+    await manager.start()
+    blocked, healthy = BlockedWebSocket(), make_websocket()
+    blocked.accept = healthy.accept
+    await manager.connect(blocked, 1)
+    await manager.connect(healthy, 2)
+    for i in range(3):
+        await manager.broadcast(f"m{i}")
+        await settle()
+
+    assert healthy.frames == ["m0", "m1", "m2"]
+    # Dropped as a slow consumer, and out of the manager's indexes
+    assert list(manager.clients) == [2]
+    assert blocked.closed_with == (1008, "Slow consumer")
+    await manager.stop()
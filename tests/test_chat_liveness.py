@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import WebSocketException
+
+from chat.backplane import InProcessBackplane
+from chat.manager import PING, ConnectionManager
+from core.ratelimit import TokenBucket
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def manager():
+    manager = ConnectionManager(
+        backplane=InProcessBackplane("liveness"),
+        max_connections=2,
+        heartbeat_interval=20,
+        idle_timeout=60
+    )
+    await manager.start()
+    yield manager
+    await manager.stop()
+
+
+async def settle():
+    # Let writer and closer tasks run
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def test_connections_beyond_the_cap_are_refused(manager, make_websocket):
+    await manager.connect(make_websocket(), 1)
+    await manager.connect(make_websocket(), 2)
+    refused = make_websocket()
+    with pytest.raises(WebSocketException):
+        await manager.connect(refused, 3)
+    assert not refused.accepted
+
+    manager.disconnect(next(iter(manager.active_connections)))
+    await manager.connect(make_websocket(), 3)
+
+
+async def test_quiet_connections_are_pinged(manager, make_websocket):
+    websocket = make_websocket()
+    connection = await manager.connect(websocket, 1)
+    manager._sweep()
+    await settle()
+    assert websocket.frames == []
+
+    connection.last_seen -= 21
+    manager._sweep()
+    await settle()
+    assert websocket.frames == [PING]
+
+
+async def test_listening_clients_are_not_closed_for_being_idle(manager, make_websocket):
+    websocket = make_websocket()
+    connection = await manager.connect(websocket, 1)
+    connection.last_seen -= 3600
+    manager._sweep()
+    await settle()
+    assert not connection.closed
+    assert websocket.frames == [PING]
+
+
+async def test_idle_clients_that_answer_pings_are_closed(manager, make_websocket):
+    websocket = make_websocket()
+    connection = await manager.connect(websocket, 1)
+    connection.received()
+    connection.answers_pings = True
+    connection.last_seen -= 61
+    manager._sweep()
+    await settle()
+    assert connection.closed
+    assert websocket.closed_with == (1000, "Idle timeout")
+    assert manager.active_connections == {}
+
+
+async def test_idle_eviction_is_off_by_default(make_websocket):
+    manager = ConnectionManager(backplane=InProcessBackplane("liveness-default"))
+    await manager.start()
+    try:
+        connection = await manager.connect(make_websocket(), 1)
+        connection.answers_pings = True
+        connection.last_seen -= 3600
+        manager._sweep()
+        assert not connection.closed
+    finally:
+        await manager.stop()
+
+
+async def test_inbound_messages_are_rate_limited(manager, make_websocket):
+    connection = await manager.connect(make_websocket(), 1)
+    connection.rate_limiter = TokenBucket(rate=1, burst=3)
+    assert [connection.received() for _ in range(4)] == [True, True, True, False]
+
+
+def test_token_bucket_refills_at_its_rate(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    bucket = TokenBucket(rate=2, burst=4)
+    assert all(bucket.allow() for _ in range(4))
+    assert not bucket.allow()
+
+    now[0] += 1  # Two tokens back
+    assert bucket.allow() and bucket.allow()
+    assert not bucket.allow()
+
+    now[0] += 60  # Never more than the burst
+    assert sum(bucket.allow() for _ in range(10)) == 4
+    assert not bucket.allow(cost=0.5)
+
+
+def test_a_pong_marks_the_client_as_answering_pings():
+    from fastapi.testclient import TestClient
+    from web_socket_app import app, manager
+
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/1") as websocket:
+            websocket.send_text("hello")
+            assert websocket.receive_text() == "You wrote: hello"
+            connection = next(iter(manager.active_connections.values()))
+            assert not connection.answers_pings
+
+            websocket.send_text('{"action": "pong"}')
+            websocket.send_text('{"action": "unsubscribe", "room": "x"}')
+            assert websocket.receive_text() == "Client #1 says: hello"
+            assert websocket.receive_text() == "Unsubscribed from x"
+            assert connection.answers_pings
@@ -0,0 +1,102 @@
+import asyncio
+
+import orjson
+import pytest
+
+from chat.backplane import InProcessBackplane
+from chat.manager import ConnectionManager
+from chat.replay import ReplayBuffer, ReplayBuffers
+
+
+def frames(buffer, count, room=None):
+    return [buffer.append(f"m{i}", room) for i in range(count)]
+
+
+def test_frames_are_numbered_within_the_epoch():
+    buffer = ReplayBuffer(max_messages=10, max_bytes=10000)
+    frame = orjson.loads(buffer.append("hello", "news"))
+    assert frame == {"seq": 1, "epoch": buffer.epoch, "room": "news", "message": "hello"}
+    assert orjson.loads(buffer.append("again", "news"))["seq"] == 2
+
+
+def test_since_returns_what_was_missed():
+    buffer = ReplayBuffer(max_messages=10, max_bytes=10000)
+    sent = frames(buffer, 5)
+    assert buffer.since(buffer.epoch, 2) == sent[2:]
+    assert buffer.since(buffer.epoch, 5) == []
+    assert buffer.since(buffer.epoch, 0) == sent
+
+
+def test_since_asks_for_a_resync_when_it_cannot_fill_the_gap():
+    buffer = ReplayBuffer(max_messages=3, max_bytes=10000)
+    sent = frames(buffer, 5)
+    assert buffer.since(buffer.epoch, 2) == sent[2:]
+    assert buffer.since(buffer.epoch, 1) is None  # m1 was evicted
+    assert buffer.since(buffer.epoch, 9) is None  # From the future
+    assert buffer.since("another", 4) is None  # Another epoch's numbers
+
+
+def test_buffer_is_bounded_by_bytes():
+    buffer = ReplayBuffer(max_messages=100, max_bytes=200)
+    frames(buffer, 20)
+    assert buffer.size <= 200
+    assert buffer.since(buffer.epoch, 19) is not None
+    assert buffer.since(buffer.epoch, 0) is None
+
+
+def test_least_recently_used_rooms_lose_their_buffer():
+    buffers = ReplayBuffers(max_messages=10, max_bytes=10000, max_rooms=2, max_total_bytes=10 ** 6)
+    buffers.append("m", "a")
+    buffers.append("m", "b")
+    buffers.append("m", "a")
+    buffers.append("m", "c")
+    assert buffers.position("b") == (None, 0)
+    assert buffers.position("a")[1] == 2
+    assert buffers.since("b", "whatever", 0) is None
+
+
+def test_buffers_are_bounded_in_total():
+    buffers = ReplayBuffers(max_messages=100, max_bytes=10000, max_rooms=100, max_total_bytes=1000)
+    for room in range(20):
+        buffers.append("x" * 100, str(room))
+    assert buffers.size <= 1000
+    assert buffers.position("19")[1] == 1
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.anyio
+async def test_reconnecting_clients_catch_up(make_websocket):
+    manager = ConnectionManager(backplane=InProcessBackplane("replay"))
+    await manager.start()
+    try:
+        first = make_websocket()
+        await manager.connect(first, 1, replay=True)
+        for i in range(3):
+            await manager.broadcast(f"m{i}")
+        await settle()
+        seen = orjson.loads(first.frames[0])
+        manager.disconnect(first)
+
+        again = make_websocket()
+        await manager.connect(again, 1, replay=True, epoch=seen["epoch"], last_seq=seen["seq"])
+        await settle()
+        assert [orjson.loads(frame)["message"] for frame in again.frames] == ["m1", "m2"]
+
+        # Unknown epoch: told where to start over instead
+        lost = make_websocket()
+        await manager.connect(lost, 2, replay=True, epoch="stale", last_seq=1)
+        await settle()
+        assert orjson.loads(lost.frames[0]) == {"action": "resync", "room": None, "epoch": seen["epoch"], "seq": 3}
+
+        # Clients without replay get the plain messages
+        plain = make_websocket()
+        await manager.connect(plain, 3)
+        await manager.broadcast("m3")
+        await settle()
+        assert plain.frames == ["m3"]
+    finally:
+        await manager.stop()
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+from chat.backplane import InProcessBackplane
+from chat.manager import ConnectionManager
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def manager():
+    manager = ConnectionManager(backplane=InProcessBackplane("rooms"), heartbeat_interval=0, idle_timeout=0)
+    await manager.start()
+    yield manager
+    await manager.stop()
+
+
+async def settle():
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+async def test_room_messages_reach_members_only(manager, make_websocket):
+    ada, bob, eve = make_websocket(), make_websocket(), make_websocket()
+    for number, websocket in enumerate((ada, bob, eve)):
+        connection = await manager.connect(websocket, number)
+        if websocket is not eve:
+            manager.join(connection, "general")
+
+    await manager.broadcast("hello", room="general")
+    await settle()
+
+    assert ada.frames == ["hello"]
+    assert bob.frames == ["hello"]
+    assert eve.frames == []
+
+
+async def test_empty_rooms_are_removed(manager, make_websocket):
+    connection = await manager.connect(make_websocket(), 1)
+    manager.join(connection, "general")
+    manager.join(connection, "random")
+
+    manager.leave(connection, "general")
+    assert set(manager.rooms) == {"random"}
+    assert connection.rooms == {"random"}
+
+    # Leaving twice, or a room never joined, is harmless
+    manager.leave(connection, "general")
+    manager.leave(connection, "nowhere")
+    assert set(manager.rooms) == {"random"}
+
+
+async def test_disconnecting_leaves_every_room(manager, make_websocket):
+    websocket = make_websocket()
+    connection = await manager.connect(websocket, 1)
+    other = await manager.connect(make_websocket(), 2)
+    for room in ("general", "random"):
+        manager.join(connection, room)
+    manager.join(other, "general")
+
+    manager.disconnect(websocket)
+    await settle()
+
+    assert manager.rooms == {"general": {other}}
+    assert manager.clients == {2: {other}}
+    assert websocket not in manager.active_connections
+
+
+async def test_closed_connections_cannot_join(manager, make_websocket):
+    websocket = make_websocket()
+    connection = await manager.connect(websocket, 1)
+    manager.disconnect(websocket)
+    await settle()
+
+    manager.join(connection, "general")
+    assert manager.rooms == {}
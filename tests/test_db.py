@@ -0,0 +1,76 @@
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.pool import StaticPool
+
+from db import Database, create_db_engine, database, settings
+from fast_api_app import lifespan, sub_app
+from models.travel_destinations import TravelDestinations
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def file_database(tmp_path):
+    database = Database(f"sqlite+aiosqlite:///{tmp_path / 'database.db'}")
+    yield database
+    await database.dispose()
+
+
+async def test_file_databases_get_a_sized_pool(file_database):
+    pool = file_database.engine.pool
+    assert pool.size() == settings.DB_POOL_SIZE
+    assert pool._max_overflow == settings.DB_MAX_OVERFLOW
+
+
+async def test_in_memory_databases_share_one_connection():
+    engine = create_db_engine("sqlite+aiosqlite://")
+    assert isinstance(engine.pool, StaticPool)
+    await engine.dispose()
+
+
+async def test_overrides_apply_to_one_engine_only(tmp_path):
+    engine = create_db_engine(f"sqlite+aiosqlite:///{tmp_path / 'other.db'}", pool_size=2)
+    assert engine.pool.size() == 2
+    await engine.dispose()
+
+
+async def test_sqlite_connections_get_the_configured_pragmas(file_database):
+    async with file_database.engine.connect() as conn:
+        assert (await conn.scalar(text("PRAGMA foreign_keys"))) == 1
+        assert (await conn.scalar(text("PRAGMA busy_timeout"))) == int(settings.SQLITE_PRAGMAS["busy_timeout"])
+        expected = "wal" if settings.SQLITE_WAL else "delete"
+        assert (await conn.scalar(text("PRAGMA journal_mode"))) == expected
+
+
+async def count_destinations(database) -> int:
+    async with database.session_maker() as session:
+        return await session.scalar(select(func.count()).select_from(TravelDestinations))
+
+
+async def test_get_db_commits_when_the_request_succeeds(file_database):
+    await file_database.create_all()
+    sessions = file_database.get_db()
+    session = await anext(sessions)
+    session.add(TravelDestinations(city="Kyoto", country="Japan", feature="Temples"))
+    with pytest.raises(StopAsyncIteration):
+        await anext(sessions)
+
+    assert await count_destinations(file_database) == 1
+
+
+async def test_get_db_rolls_back_when_the_request_fails(file_database):
+    await file_database.create_all()
+    sessions = file_database.get_db()
+    session = await anext(sessions)
+    session.add(TravelDestinations(city="Kyoto", country="Japan", feature="Temples"))
+    with pytest.raises(ValueError):
+        await sessions.athrow(ValueError("request failed"))
+
+    assert await count_destinations(file_database) == 0
+
+
+async def test_sub_app_leaves_the_shared_engine_alone():
+    pool = database.engine.pool
+    async with lifespan(sub_app):
+        pass
+    assert database.engine.pool is pool
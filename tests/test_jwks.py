@@ -0,0 +1,229 @@
+import types
+from datetime import datetime, timedelta
+from typing import Optional
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from jose import JWTError, jwt
+
+import dependencies
+from auth_app import app
+from core import jwks
+from core.jwks import JWKSClient
+from core.keys import KeyRing, _generate_private_pem
+from routers import auth
+
+pytestmark = pytest.mark.anyio
+
+ALGORITHM = "ES256"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(jwks, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+class KeyServer:
+    """Serves a KeyRing's JWKS like /auth/jwks, honouring If-None-Match"""
+
+    def __init__(self, key_ring: KeyRing, max_age: int = 300):
+        self.key_ring = key_ring
+        self.max_age = max_age
+        self.requests: list[httpx.Request] = []
+        self.statuses: list[int] = []
+        self.down = False
+        self.client: Optional[JWKSClient] = None  # Reads from this server
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if self.down:
+            raise httpx.ConnectError("Connection refused")
+
+        headers = {"ETag": self.key_ring.etag, "Cache-Control": f"public, max-age={self.max_age}"}
+        if request.headers.get("If-None-Match") == self.key_ring.etag:
+            response = httpx.Response(304, headers=headers)
+        else:
+            response = httpx.Response(200, json=self.key_ring.jwks(), headers=headers)
+        self.statuses.append(response.status_code)
+        return response
+
+
+@pytest.fixture
+async def key_server():
+    server = KeyServer(KeyRing(ALGORITHM))
+    client = httpx.AsyncClient(transport=httpx.MockTransport(server.handle))
+    server.client = JWKSClient("http://auth.test/auth/jwks", get_client=lambda: client, ttl=60, min_refresh_interval=30)
+    yield server
+    await client.aclose()
+
+
+def sign(key_ring: KeyRing, kid: str = None, **claims) -> str:
+    key = key_ring.keys[kid] if kid else key_ring.active
+    claims = {
+        "sub": "ada",
+        "iss": dependencies.settings.EXPECTED_ISSUER,
+        "aud": dependencies.settings.EXPECTED_AUDIENCE,
+        "exp": datetime.utcnow() + timedelta(minutes=5),
+        **claims
+    }
+    return jwt.encode(claims, key.private_key, algorithm=ALGORITHM, headers={"kid": key.kid})
+
+
+def test_rotation_keeps_older_keys_published():
+    key_ring = KeyRing(ALGORITHM)
+    old = key_ring.active
+    etag = key_ring.etag
+    assert key_ring.etag == etag
+
+    new = key_ring.rotate()
+    assert key_ring.active is new
+    assert [key["kid"] for key in key_ring.jwks()["keys"]] == [old.kid, new.kid]
+    assert key_ring.etag != etag
+
+    # Tokens signed before the rotation still verify
+    token = sign(key_ring, old.kid)
+    assert jwt.decode(token, key_ring.get_public_key(old.kid), algorithms=[ALGORITHM], options={"verify_aud": False})["sub"] == "ada"
+
+
+def test_retired_keys_are_no_longer_published():
+    key_ring = KeyRing(ALGORITHM)
+    old = key_ring.active
+    key_ring.rotate()
+
+    with pytest.raises(ValueError):
+        key_ring.retire(key_ring.active_kid)
+    key_ring.retire(old.kid)
+
+    assert [key["kid"] for key in key_ring.jwks()["keys"]] == [key_ring.active_kid]
+    assert key_ring.get_public_key(old.kid) is None
+
+
+def test_kid_defaults_to_the_key_thumbprint():
+    pem = _generate_private_pem(ALGORITHM)
+    assert KeyRing(ALGORITHM).add(pem).kid == KeyRing(ALGORITHM).add(pem).kid
+    assert KeyRing(ALGORITHM).add(pem, kid="2024-01").kid == "2024-01"
+
+
+def test_keys_load_from_a_directory(tmp_path):
+    for kid in ("2024-01", "2024-02"):
+        (tmp_path / f"{kid}.pem").write_bytes(_generate_private_pem(ALGORITHM))
+
+    key_ring = KeyRing(ALGORITHM)
+    key_ring.load_dir(str(tmp_path))
+    assert sorted(key_ring.keys) == ["2024-01", "2024-02"]
+    assert key_ring.active_kid == "2024-02"
+
+    key_ring.load_dir(str(tmp_path), active_kid="2024-01")
+    assert key_ring.active_kid == "2024-01"
+    with pytest.raises(ValueError):
+        key_ring.load_dir(str(tmp_path), active_kid="2023-12")
+
+
+async def test_keys_are_cached_for_max_age_then_revalidated(key_server, clock):
+    kid = key_server.key_ring.active.kid
+    assert await key_server.client.get_key(kid) is not None
+    assert await key_server.client.get_key(kid) is not None
+    assert key_server.statuses == [200]
+
+    clock.now += 300
+    assert await key_server.client.get_key(kid) is not None
+    assert key_server.statuses == [200, 304]
+    assert key_server.requests[-1].headers["If-None-Match"] == key_server.key_ring.etag
+
+
+async def test_rotated_key_is_picked_up_on_first_sight(key_server, clock):
+    await key_server.client.get_key(key_server.key_ring.active.kid)
+    new = key_server.key_ring.rotate()
+
+    clock.now += 30
+    assert await key_server.client.get_key(new.kid) is not None
+    assert key_server.statuses == [200, 200]
+
+
+async def test_unknown_kids_refresh_at_most_once_per_interval(key_server, clock):
+    await key_server.client.get_key(key_server.key_ring.active.kid)
+
+    for _ in range(3):
+        with pytest.raises(JWTError):
+            await key_server.client.get_key("forged")
+    assert len(key_server.requests) == 1
+
+    clock.now += 30
+    with pytest.raises(JWTError):
+        await key_server.client.get_key("forged")
+    assert len(key_server.requests) == 2
+
+
+async def test_cached_keys_are_served_while_the_server_is_down(key_server, clock):
+    kid = key_server.key_ring.active.kid
+    await key_server.client.get_key(kid)
+
+    key_server.down = True
+    clock.now += 300
+    assert await key_server.client.get_key(kid) is not None
+
+
+async def test_first_fetch_failure_is_raised(key_server, clock):
+    key_server.down = True
+    with pytest.raises(httpx.HTTPError):
+        await key_server.client.get_key("any")
+
+
+@pytest.fixture
+def local_validation(key_server, monkeypatch):
+    """validate_token_locally checking ES256 tokens against the key server"""
+    monkeypatch.setattr(dependencies.settings, "ALGORITHM", ALGORITHM)
+    monkeypatch.setattr(dependencies, "jwks_client", key_server.client)
+    yield dependencies.validate_token_locally
+    dependencies.token_cache.clear()
+
+
+async def test_local_validation_verifies_with_published_keys(key_server, clock, local_validation):
+    assert (await local_validation(sign(key_server.key_ring)))["sub"] == "ada"
+
+    with pytest.raises(HTTPException) as error:
+        await local_validation(sign(KeyRing(ALGORITHM)))
+    assert error.value.status_code == 401
+
+
+async def test_local_validation_without_keys_is_a_503(key_server, clock, local_validation):
+    key_server.down = True
+    with pytest.raises(HTTPException) as error:
+        await local_validation(sign(key_server.key_ring))
+    assert error.value.status_code == 503
+
+
+async def test_jwks_endpoint_answers_revalidation_with_304(monkeypatch):
+    key_ring = KeyRing(ALGORITHM)
+    monkeypatch.setattr(auth.settings, "ALGORITHM", ALGORITHM)
+    monkeypatch.setattr(auth, "key_ring", key_ring)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url="http://test") as client:
+        response = await client.get("/auth/jwks")
+        assert response.status_code == 200
+        assert response.json() == key_ring.jwks()
+        assert response.headers["ETag"] == key_ring.etag
+
+        response = await client.get("/auth/jwks", headers={"If-None-Match": key_ring.etag})
+        assert response.status_code == 304
+
+        key_ring.rotate()
+        response = await client.get("/auth/jwks", headers={"If-None-Match": response.headers["ETag"]})
+        assert response.status_code == 200
+        assert len(response.json()["keys"]) == 2
+
+
+async def test_jwks_endpoint_is_absent_for_shared_secrets():
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url="http://test") as client:
+        assert (await client.get("/auth/jwks")).status_code == 404
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from core.metrics import MetricsRegistry, _Metric
+from webhooks import metrics
+
+
+def test_metric_without_samples_cannot_be_created():
+    class Incomplete(_Metric):
+        type = "gauge"
+
+    with pytest.raises(TypeError):
+        Incomplete("incomplete", "No samples")
+
+
+def test_counter_and_gauge_render_one_series_per_label_values():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("path",))
+    depth = registry.gauge("queue_depth", "Queued items")
+    requests.inc("/a")
+    requests.inc("/a", amount=2)
+    requests.inc('/b"')
+    depth.inc(amount=5)
+    depth.dec()
+
+    assert registry.render() == (
+        "# HELP requests_total Requests\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{path="/a"} 3\n'
+        'requests_total{path="/b\\""} 1\n'
+        "# HELP queue_depth Queued items\n"
+        "# TYPE queue_depth gauge\n"
+        "queue_depth 4\n"
+    )
+
+
+def test_unlabeled_metrics_render_before_their_first_update():
+    registry = MetricsRegistry()
+    registry.counter("events_total", "Events")
+    registry.histogram("latency_seconds", "Latency", (1,))
+    assert "events_total 0\n" in registry.render()
+    assert 'latency_seconds_bucket{le="+Inf"} 0\n' in registry.render()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram("latency_seconds", "Latency", (0.1, 1), ("host",))
+    for value in (0.05, 0.5, 0.7, 3):
+        latency.observe(value, "a")
+
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{host="a",le="0.1"} 1',
+        'latency_seconds_bucket{host="a",le="1"} 3',
+        'latency_seconds_bucket{host="a",le="+Inf"} 4',
+        'latency_seconds_sum{host="a"} 4.25',
+        'latency_seconds_count{host="a"} 4',
+    ]
+
+
+def test_labels_must_match():
+    counter = MetricsRegistry().counter("requests_total", "Requests", ("path",))
+    with pytest.raises(ValueError):
+        counter.inc()
+
+
+def test_names_are_registered_once():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests")
+    with pytest.raises(ValueError):
+        registry.gauge("requests_total", "Requests")
+
+
+def sample(name: str) -> float:
+    """Current value of one series in the webhook registry, 0 if absent"""
+    for line in metrics.registry.render().splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_record_attempt_counts_each_delivery_of_a_batch():
+    due = datetime.utcnow() - timedelta(seconds=2)
+    jobs = [
+        SimpleNamespace(subscription_id=901, event="user.created", attempts=1, due_at=due),
+        SimpleNamespace(subscription_id=901, event="user.created", attempts=3, due_at=due),
+    ]
+    before = {
+        "event": sample('webhook_delivery_attempts_total{event="user.created",result="failure"}'),
+        "retries": sample("webhook_delivery_retries_count"),
+        "requests": sample("webhook_request_duration_seconds_count"),
+    }
+
+    metrics.record_attempt(jobs, success=False, elapsed=0.5, max_attempts=3)
+
+    assert sample('webhook_delivery_attempts_total{event="user.created",result="failure"}') == before["event"] + 2
+    assert sample('webhook_subscription_delivery_attempts_total{subscription_id="901",result="failure"}') == 2
+    assert sample('webhook_subscription_request_seconds_total{subscription_id="901"}') == 0.5
+    assert sample("webhook_request_duration_seconds_count") == before["requests"] + 1
+    # Only the delivery out of attempts has its retries recorded
+    assert sample("webhook_delivery_retries_count") == before["retries"] + 1
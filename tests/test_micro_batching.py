@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from core.batching import MicroBatcher
+
+pytestmark = pytest.mark.anyio
+
+
+class Handler:
+    """Records the batches it gets and answers each item with its double"""
+
+    def __init__(self):
+        self.batches: list[list[int]] = []
+        self.error = None
+
+    async def __call__(self, items: list[int]) -> list[int]:
+        self.batches.append(items)
+        if self.error is not None:
+            raise self.error
+        return [item * 2 for item in items]
+
+
+async def test_concurrent_items_go_in_one_batch():
+    handler = Handler()
+    batcher = MicroBatcher(handler, max_size=10, max_wait=0.01)
+
+    results = await asyncio.gather(*(batcher.submit(item) for item in range(4)))
+
+    assert results == [0, 2, 4, 6]
+    assert handler.batches == [[0, 1, 2, 3]]
+
+
+async def test_full_batch_is_sent_without_waiting():
+    handler = Handler()
+    batcher = MicroBatcher(handler, max_size=3, max_wait=60)
+
+    results = await asyncio.wait_for(asyncio.gather(*(batcher.submit(item) for item in range(3))), 1)
+
+    assert results == [0, 2, 4]
+    assert handler.batches == [[0, 1, 2]]
+
+
+async def test_items_beyond_max_size_start_the_next_batch():
+    handler = Handler()
+    batcher = MicroBatcher(handler, max_size=3, max_wait=0.01)
+
+    results = await asyncio.gather(*(batcher.submit(item) for item in range(7)))
+
+    assert results == [item * 2 for item in range(7)]
+    assert handler.batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+async def test_lone_item_waits_at_most_max_wait():
+    handler = Handler()
+    batcher = MicroBatcher(handler, max_size=100, max_wait=0.01)
+
+    assert await asyncio.wait_for(batcher.submit(21), 1) == 42
+    assert handler.batches == [[21]]
+
+
+async def test_every_caller_in_a_failed_batch_gets_the_exception():
+    handler = Handler()
+    handler.error = ConnectionError("auth server down")
+    batcher = MicroBatcher(handler, max_size=10, max_wait=0.01)
+
+    results = await asyncio.gather(*(batcher.submit(item) for item in range(3)), return_exceptions=True)
+
+    assert [type(result) for result in results] == [ConnectionError] * 3
+
+
+async def test_wrong_number_of_results_fails_the_batch():
+    async def short(items):
+        return items[1:]
+
+    batcher = MicroBatcher(short, max_size=10, max_wait=0.01)
+    results = await asyncio.gather(*(batcher.submit(item) for item in range(2)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+async def test_cancelled_caller_does_not_affect_the_rest_of_its_batch():
+    handler = Handler()
+    batcher = MicroBatcher(handler, max_size=10, max_wait=0.01)
+
+    leaving = asyncio.create_task(batcher.submit(1))
+    staying = asyncio.create_task(batcher.submit(2))
+    await asyncio.sleep(0)
+    leaving.cancel()
+
+    assert await staying == 4
+    assert leaving.cancelled()
+    assert handler.batches == [[1, 2]]
@@ -0,0 +1,75 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from core import security
+from core.security import get_password_hash_async, verify_password, verify_password_async
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def hash_slots(monkeypatch):
+    """Room for two hashes, with work that runs until released"""
+    monkeypatch.setattr(security, "_hash_slots", threading.BoundedSemaphore(2))
+    release = threading.Event()
+    yield release
+    release.set()
+
+
+async def test_hashes_verify_off_the_event_loop():
+    hashed = await get_password_hash_async("secret")
+    assert await verify_password_async("secret", hashed)
+    assert not await verify_password_async("wrong", hashed)
+
+
+async def test_passwords_are_cut_at_72_bytes():
+    hashed = await get_password_hash_async("x" * 72 + "ignored")
+    assert verify_password("x" * 72, hashed)
+
+
+async def test_full_pool_sheds_load(hash_slots):
+    running = [asyncio.create_task(security._run_in_hash_pool(hash_slots.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as error:
+        await security._run_in_hash_pool(hash_slots.wait)
+    assert error.value.status_code == 503
+    assert error.value.headers["Retry-After"] == str(security.settings.PASSWORD_HASH_RETRY_AFTER)
+
+    hash_slots.set()
+    await asyncio.gather(*running)
+    assert await security._run_in_hash_pool(lambda: "done") == "done"
+
+
+async def test_cancelled_caller_keeps_its_slot_until_the_work_ends(hash_slots):
+    caller = asyncio.create_task(security._run_in_hash_pool(hash_slots.wait))
+    await security._run_in_hash_pool(lambda: None)  # Lets the first job start
+    caller.cancel()
+    await asyncio.gather(caller, return_exceptions=True)
+
+    # The cancelled caller's bcrypt call is still running and holds a slot
+    blocked = asyncio.create_task(security._run_in_hash_pool(hash_slots.wait))
+    await asyncio.sleep(0)
+    with pytest.raises(HTTPException):
+        await security._run_in_hash_pool(hash_slots.wait)
+
+    hash_slots.set()
+    await blocked
+    for _ in range(100):
+        if security._hash_slots.acquire(blocking=False):
+            break
+        await asyncio.sleep(0.01)
+    else:
+        pytest.fail("slot of the cancelled call was never released")
+
+
+async def test_failed_work_releases_its_slot(hash_slots):
+    def broken():
+        raise ValueError("bad hash")
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            await security._run_in_hash_pool(broken)
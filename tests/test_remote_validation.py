@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+import httpx
+import orjson
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+import dependencies
+from core.cache import TTLCache
+from dependencies import close_auth_client, get_auth_client, validate_token_remotely
+
+pytestmark = pytest.mark.anyio
+
+
+class AuthServer:
+    """Stands in for the auth server: every token is valid except "bad" ones"""
+
+    def __init__(self):
+        self.requests: list[httpx.Request] = []
+        self.delay = 0.0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        await asyncio.sleep(self.delay)
+        if request.url.path == "/auth/validate/batch":
+            tokens = orjson.loads(request.content)["tokens"]
+            return httpx.Response(200, json={"results": [self.result(token) for token in tokens]})
+        return httpx.Response(200, json=self.result(request.headers["Authorization"].removeprefix("Bearer ")))
+
+    @staticmethod
+    def result(token: str) -> dict:
+        if token.startswith("bad"):
+            return {"valid": False, "message": "Invalid token: bad signature"}
+        return {"valid": True, "username": token, "user_id": 1, "message": "Token is valid"}
+
+
+@pytest.fixture
+async def auth_server(monkeypatch):
+    server = AuthServer()
+    client = httpx.AsyncClient(transport=httpx.MockTransport(server.handle))
+    monkeypatch.setattr(dependencies, "_auth_client", client)
+    yield server
+    await client.aclose()
+
+
+@pytest.fixture
+def validation_cache(monkeypatch):
+    cache = TTLCache(max_size=100, ttl=30)
+    monkeypatch.setattr(dependencies, "remote_validation_cache", cache)
+    return cache
+
+
+async def test_client_is_shared_until_closed(monkeypatch):
+    monkeypatch.setattr(dependencies, "_auth_client", None)
+    client = get_auth_client()
+    assert get_auth_client() is client
+
+    await close_auth_client()
+    assert client.is_closed
+    assert get_auth_client() is not client
+    await close_auth_client()
+
+
+async def test_results_are_not_cached_by_default(auth_server):
+    assert not dependencies.remote_validation_cache.enabled
+
+    for _ in range(2):
+        assert (await validate_token_remotely("ada"))["username"] == "ada"
+    assert len(auth_server.requests) == 2
+
+
+async def test_valid_results_are_cached(auth_server, validation_cache):
+    first = await validate_token_remotely("ada")
+    second = await validate_token_remotely("ada")
+
+    assert second == first
+    assert len(auth_server.requests) == 1
+    assert "ada" not in validation_cache._entries
+
+
+async def test_invalid_tokens_are_rejected_and_not_cached(auth_server, validation_cache):
+    for _ in range(2):
+        with pytest.raises(HTTPException) as error:
+            await validate_token_remotely("bad-token")
+        assert error.value.status_code == 401
+        assert error.value.detail == "Invalid token: bad signature"
+    assert len(auth_server.requests) == 2
+    assert len(validation_cache) == 0
+
+
+async def test_cached_result_does_not_outlive_the_token(auth_server, validation_cache):
+    expires = int(time.time()) + 5
+    token = jwt.encode({"sub": "ada", "exp": expires}, "any-key", algorithm="HS256")
+    await validate_token_remotely(token)
+
+    [(deadline, _)] = validation_cache._entries.values()
+    assert deadline == expires
+
+
+async def test_unreachable_auth_server_is_a_503(monkeypatch):
+    def refuse(request):
+        raise httpx.ConnectError("Connection refused")
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(refuse))
+    monkeypatch.setattr(dependencies, "_auth_client", client)
+
+    with pytest.raises(HTTPException) as error:
+        await validate_token_remotely("ada")
+    assert error.value.status_code == 503
+    await client.aclose()
+
+
+async def test_concurrent_validations_of_a_token_share_one_request(auth_server):
+    auth_server.delay = 0.05
+    results = await asyncio.gather(*(validate_token_remotely(token) for token in ["ada"] * 5 + ["bob"]))
+
+    assert [result["username"] for result in results] == ["ada"] * 5 + ["bob"]
+    assert len(auth_server.requests) == 2
+    assert len(dependencies.remote_validations) == 0
+
+
+async def test_concurrent_callers_of_an_invalid_token_all_get_401(auth_server):
+    auth_server.delay = 0.05
+    results = await asyncio.gather(*(validate_token_remotely("bad-token") for _ in range(3)), return_exceptions=True)
+
+    assert [result.status_code for result in results] == [401] * 3
+    assert len(auth_server.requests) == 1
+
+
+async def test_batching_gathers_concurrent_validations(auth_server, monkeypatch):
+    monkeypatch.setattr(dependencies.settings, "REMOTE_VALIDATION_BATCHING", True)
+
+    results = await asyncio.gather(
+        *(validate_token_remotely(token) for token in ["ada", "bob", "bad-token", "ada"]),
+        return_exceptions=True
+    )
+
+    assert [result["username"] for result in results[:2]] == ["ada", "bob"]
+    assert results[2].status_code == 401
+    assert results[3] == results[0]
+    # One request, and the repeated token is sent once
+    [request] = auth_server.requests
+    assert request.url.path == "/auth/validate/batch"
+    assert orjson.loads(request.content) == {"tokens": ["ada", "bob", "bad-token"]}
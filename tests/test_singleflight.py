@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from core.singleflight import SingleFlight
+
+pytestmark = pytest.mark.anyio
+
+
+class Call:
+    """A call that waits for `release` and counts how often it ran"""
+
+    def __init__(self, result="result"):
+        self.result = result
+        self.runs = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.runs += 1
+        await self.release.wait()
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_concurrent_calls_for_a_key_share_one_run():
+    flight, call = SingleFlight(), Call()
+    callers = [asyncio.create_task(flight.do("token", call)) for _ in range(5)]
+    await settle()
+    assert len(flight) == 1
+
+    call.release.set()
+    assert await asyncio.gather(*callers) == ["result"] * 5
+    assert call.runs == 1
+    assert len(flight) == 0
+
+
+async def test_different_keys_run_separately():
+    flight, first, second = SingleFlight(), Call("first"), Call("second")
+    first.release.set()
+    second.release.set()
+
+    assert await asyncio.gather(flight.do("a", first), flight.do("b", second)) == ["first", "second"]
+    assert (first.runs, second.runs) == (1, 1)
+
+
+async def test_every_caller_gets_the_exception_and_the_next_call_runs_again():
+    flight, call = SingleFlight(), Call(ValueError("auth server down"))
+    callers = [asyncio.create_task(flight.do("token", call)) for _ in range(3)]
+    await settle()
+    call.release.set()
+
+    results = await asyncio.gather(*callers, return_exceptions=True)
+    assert [str(result) for result in results] == ["auth server down"] * 3
+
+    call.result = "recovered"
+    assert await flight.do("token", call) == "recovered"
+    assert call.runs == 2
+
+
+async def test_cancelled_caller_leaves_the_call_running_for_others():
+    flight, call = SingleFlight(), Call()
+    first = asyncio.create_task(flight.do("token", call))
+    second = asyncio.create_task(flight.do("token", call))
+    await settle()
+
+    first.cancel()
+    await settle()
+    call.release.set()
+
+    assert await second == "result"
+    assert first.cancelled()
+    assert call.runs == 1
+
+
+async def test_call_whose_callers_all_left_is_forgotten_quietly():
+    flight, call = SingleFlight(), Call(ValueError("nobody is listening"))
+    caller = asyncio.create_task(flight.do("token", call))
+    await settle()
+    caller.cancel()
+    await settle()
+
+    call.release.set()
+    await settle()
+    assert len(flight) == 0
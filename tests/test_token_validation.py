@@ -0,0 +1,79 @@
+import time
+import types
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+import dependencies
+from core import cache
+from core.cache import token_cache_key
+from core.security import create_access_token
+from dependencies import token_cache, validate_token_locally
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    """Counts signature verifications"""
+    calls = []
+    decode = jwt.decode
+
+    def counted(token, *args, **kwargs):
+        calls.append(token)
+        return decode(token, *args, **kwargs)
+
+    monkeypatch.setattr(dependencies.jwt, "decode", counted)
+    yield calls
+    token_cache.clear()
+
+
+async def test_verified_tokens_are_cached(decodes):
+    token = create_access_token({"sub": "ada", "user_id": 1})
+
+    first = await validate_token_locally(token)
+    second = await validate_token_locally(token)
+
+    assert first["sub"] == "ada"
+    assert second == first
+    assert decodes == [token]
+
+
+async def test_invalid_tokens_are_rejected_every_time(decodes):
+    token = jwt.encode({"sub": "ada"}, "another-secret", algorithm="HS256")
+
+    for _ in range(2):
+        with pytest.raises(HTTPException) as error:
+            await validate_token_locally(token)
+        assert error.value.status_code == 401
+    assert len(decodes) == 2
+    assert len(token_cache) == 0
+
+
+async def test_cached_token_does_not_outlive_its_expiry(decodes):
+    token = create_access_token({"sub": "ada"}, expires_delta=timedelta(seconds=60))
+    payload = await validate_token_locally(token)
+
+    # Expires well within TOKEN_CACHE_TTL_SECONDS, so the exp claim sets the deadline
+    deadline, _ = token_cache._entries[token_cache_key(token)]
+    assert deadline == payload["exp"]
+
+
+async def test_expired_tokens_are_not_served_from_the_cache(decodes, monkeypatch):
+    token = create_access_token({"sub": "ada"}, expires_delta=timedelta(seconds=60))
+    await validate_token_locally(token)
+
+    # A minute later the entry has expired along with the token
+    later = time.time() + 61
+    monkeypatch.setattr(cache, "time", types.SimpleNamespace(time=lambda: later))
+    assert token_cache.get(token_cache_key(token)) is None
+
+
+async def test_raw_tokens_are_not_kept(decodes):
+    token = create_access_token({"sub": "ada"})
+    await validate_token_locally(token)
+
+    assert token not in token_cache._entries
+    assert token_cache_key(token) in token_cache._entries
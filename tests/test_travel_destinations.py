@@ -0,0 +1,243 @@
+import asyncio
+
+import httpx
+import pytest
+from sqlmodel import SQLModel
+
+import db
+from dao.travel_destinations import TravelDestinationCache, TravelDestinationRepository, TravelDestinationStore
+from db import Database
+from fast_api_app import app
+from routers.travel_destinations import seed_travel_destinations
+from schemas.travel_destinations import TravelDestination
+
+pytestmark = pytest.mark.anyio
+
+DESTINATIONS = [
+    TravelDestination(city="Kerala", country="India", feature="Backwaters and Ayurvedic retreats"),
+    TravelDestination(city="Lucerne", country="Switzerland", feature="Lake views and medieval architecture"),
+    TravelDestination(city="Zurich", country="Switzerland", feature="Financial hub with scenic old town"),
+    TravelDestination(city="Kashmir", country="India", feature="Snowy mountains and houseboats"),
+]
+
+
+def destination(id, city, country):
+    return TravelDestination(id=id, city=city, country=country, feature="Somewhere worth a visit")
+
+
+def cities(destinations):
+    return [destination.city for destination in destinations]
+
+
+def test_store_indexes_by_country_and_city():
+    store = TravelDestinationStore(DESTINATIONS)
+    assert len(store) == 4
+    assert [destination.id for destination in store.all()] == [1, 2, 3, 4]
+    assert cities(store.find("India")) == ["Kerala", "Kashmir"]
+    assert cities(store.find("Switzerland", "Zurich")) == ["Zurich"]
+    assert store.find("Japan") == []
+
+
+def test_store_assigns_free_ids():
+    store = TravelDestinationStore([destination(5, "Tokyo", "Japan")])
+    assert store.add(destination(None, "Kyoto", "Japan")).id == 6
+    assert store.add(destination(5, "Osaka", "Japan")).id == 7
+
+
+def test_store_replace_keeps_id_and_position():
+    store = TravelDestinationStore(DESTINATIONS)
+    moved = destination(None, "Zermatt", "Switzerland")
+    assert store.replace_by_city("Kerala", moved).id == 1
+    assert store.find("India") == store.find("India", "Kashmir")
+    # The older destination is listed before those already in the bucket
+    assert cities(store.find("Switzerland")) == ["Zermatt", "Lucerne", "Zurich"]
+    assert store.replace_by_city("Kerala", moved) is None
+    assert store.replace(destination(9, "Tokyo", "Japan")) is None
+
+
+def test_store_delete_updates_indexes():
+    store = TravelDestinationStore(DESTINATIONS)
+    assert store.delete_by_city("Lucerne")
+    assert not store.delete_by_city("Lucerne")
+    assert store.delete(4)
+    assert not store.delete(4)
+    assert cities(store.all()) == ["Kerala", "Zurich"]
+    assert cities(store.find("India")) == ["Kerala"]
+    assert store.find("India", "Kashmir") == []
+
+
+def test_store_pages_in_id_order():
+    store = TravelDestinationStore(DESTINATIONS)
+    store.replace(destination(4, "Kashmir", "India"))
+    store.add(destination(0, "Bali", "Indonesia"))
+    assert [destination.id for destination in store.page(2)] == [0, 1]
+    assert [destination.id for destination in store.page(2, after_id=1)] == [2, 3]
+    assert cities(store.page(10, country="India")) == ["Kerala", "Kashmir"]
+    assert cities(store.page(10, after_id=1, country="India")) == ["Kashmir"]
+    assert cities(store.page(10, city="Zurich")) == ["Zurich"]
+    assert cities(store.page(10, country="India", city="Zurich")) == []
+
+
+@pytest.fixture
+async def database():
+    database = Database("sqlite+aiosqlite://")
+    await database.create_all()
+    async with database.session_maker() as session:
+        repository = TravelDestinationRepository(session)
+        for destination in DESTINATIONS:
+            await repository.add(destination)
+    yield database
+    await database.dispose()
+
+
+@pytest.fixture
+async def repository(database):
+    async with database.session_maker() as session:
+        yield TravelDestinationRepository(session)
+
+
+async def test_list_pages_in_id_order(repository):
+    first = await repository.list(limit=3)
+    assert [row["id"] for row in first] == [1, 2, 3]
+    assert first[0] == {"id": 1, "city": "Kerala", "country": "India", "feature": "Backwaters and Ayurvedic retreats"}
+
+    rest = await repository.list(limit=3, after_id=first[-1]["id"])
+    assert [row["id"] for row in rest] == [4]
+
+
+async def test_list_projects_several_fields(repository):
+    rows = await repository.list(limit=10, fields=["city", "country"])
+    assert rows[0] == {"id": 1, "city": "Kerala", "country": "India"}
+
+
+async def test_list_projects_a_single_field(repository):
+    assert await repository.list(limit=10, fields=["id"]) == [{"id": 1}, {"id": 2}, {"id": 3}, {"id": 4}]
+    assert (await repository.list(limit=1, fields=["city"])) == [{"id": 1, "city": "Kerala"}]
+
+
+async def test_list_filters_by_country_and_city(repository):
+    rows = await repository.list(limit=10, fields=["city"], country="Switzerland")
+    assert rows == [{"id": 2, "city": "Lucerne"}, {"id": 3, "city": "Zurich"}]
+    rows = await repository.list(limit=10, fields=["city"], country="India", city="Kashmir")
+    assert rows == [{"id": 4, "city": "Kashmir"}]
+
+
+async def test_replace_and_delete_by_city(repository):
+    replacement = TravelDestination(city="Geneva", country="Switzerland", feature="Lakeside and the UN")
+    row = await repository.replace_by_city("Lucerne", replacement)
+    assert row.id == 2
+    assert await repository.replace_by_city("Lucerne", replacement) is None
+
+    assert await repository.delete_by_city("Geneva")
+    assert not await repository.delete_by_city("Geneva")
+    assert [row["id"] for row in await repository.list(limit=10, fields=["id"])] == [1, 3, 4]
+
+
+async def test_cache_serves_listings_and_follows_writes(database):
+    cache = TravelDestinationCache(ttl=60, session_maker=database.session_maker)
+    async with database.session_maker() as session:
+        repository = TravelDestinationRepository(session, cache)
+        # Until loaded, listings query the table
+        assert await repository.list(limit=2, fields=["city"]) == [{"id": 1, "city": "Kerala"}, {"id": 2, "city": "Lucerne"}]
+        assert cache.store is None
+
+        await cache.load()
+        assert len(cache.store) == 4
+        await repository.add(TravelDestination(city="Tokyo", country="Japan", feature="Modern cityscape and temples"))
+        await repository.replace_by_city("Kerala", TravelDestination(city="Bhutan", country="Bhutan", feature="Monasteries in the hills"))
+        await repository.delete_by_city("Zurich")
+        rows = await repository.list(limit=10, fields=["city", "country"])
+        assert rows == [
+            {"id": 1, "city": "Bhutan", "country": "Bhutan"},
+            {"id": 2, "city": "Lucerne", "country": "Switzerland"},
+            {"id": 4, "city": "Kashmir", "country": "India"},
+            {"id": 5, "city": "Tokyo", "country": "Japan"},
+        ]
+        assert await repository.list(limit=10, fields=["id"], country="India") == [{"id": 4}]
+        assert await TravelDestinationRepository(session).list(limit=10, fields=["city", "country"]) == rows
+
+
+async def test_cache_reload_picks_up_other_writes(database):
+    cache = TravelDestinationCache(ttl=60, session_maker=database.session_maker)
+    await cache.load()
+    async with database.session_maker() as session:
+        cached = TravelDestinationRepository(session, cache)
+        # Another worker's write
+        await TravelDestinationRepository(session).delete_by_city("Kerala")
+        assert len(await cached.list(limit=10)) == 4
+
+    await cache.load()
+    async with database.session_maker() as session:
+        assert len(await TravelDestinationRepository(session, cache).list(limit=10)) == 3
+
+
+async def test_cache_keeps_writes_made_during_a_load(database, monkeypatch):
+    cache = TravelDestinationCache(ttl=60, session_maker=database.session_maker)
+    build = cache._build
+
+    def build_after_a_write(rows):
+        # The table was read before this write, the built store misses it
+        cache.delete(1)
+        return build(rows)
+
+    monkeypatch.setattr(cache, "_build", build_after_a_write)
+    await cache.load()
+    assert [destination.id for destination in cache.store.page(10)] == [2, 3, 4]
+
+
+async def test_cache_refreshes_in_the_background(database):
+    cache = TravelDestinationCache(ttl=60, session_maker=database.session_maker)
+    cache.start()
+    try:
+        for _ in range(100):
+            if cache.store is not None:
+                break
+            await asyncio.sleep(0.01)
+        assert len(cache.store) == 4
+    finally:
+        await cache.stop()
+
+
+@pytest.fixture
+async def client():
+    """The API app on the shared database, seeded with the sample destinations"""
+    await db.database.create_all()
+    await seed_travel_destinations()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url="http://test") as client:
+        yield client
+    async with db.database.engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.drop_all)
+    await db.database.dispose()
+
+
+async def test_api_pages_with_a_cursor_header(client):
+    response = await client.get("/travel_destinations/", params={"limit": 4})
+    assert [row["id"] for row in response.json()] == [1, 2, 3, 4]
+    assert response.headers["X-Next-After-Id"] == "4"
+
+    response = await client.get("/travel_destinations/", params={"limit": 4, "after_id": 4})
+    assert [row["id"] for row in response.json()] == [5, 6]
+    assert "X-Next-After-Id" not in response.headers
+
+
+async def test_api_returns_the_requested_fields(client):
+    response = await client.get("/travel_destinations/", params={"limit": 1, "fields": "city"})
+    # The id always comes along, it is the cursor
+    assert response.json() == [{"id": 1, "city": "Bali"}]
+
+    response = await client.get("/travel_destinations/", params={"fields": "city,price"})
+    assert response.status_code == 400
+
+
+async def test_api_filters_by_country_and_city(client):
+    response = await client.get("/travel_destinations/Switzerland", params={"fields": "city"})
+    assert response.json() == [{"id": 3, "city": "Lucerne"}, {"id": 4, "city": "Zurich"}]
+
+    response = await client.get("/travel_destinations/Switzerland", params={"city": "Zurich", "fields": "id,city"})
+    assert response.json() == [{"id": 4, "city": "Zurich"}]
+
+
+async def test_api_deletes_by_city(client):
+    assert (await client.delete("/travel_destinations/Tokyo")).status_code == 204
+    assert (await client.delete("/travel_destinations/Tokyo")).status_code == 404
+    assert (await client.get("/travel_destinations/Japan")).json() == []
@@ -0,0 +1,113 @@
+import gzip
+
+import orjson
+import pytest
+from sqlalchemy import select
+
+from webhooks.delivery import deliver_webhook, generate_signature, settings
+from webhooks.dispatcher import WebhookDispatcher, enqueue_event
+from webhooks.models import DeliveryStatus, WebhookDelivery
+
+pytestmark = pytest.mark.anyio
+
+
+def make_dispatcher(database):
+    return WebhookDispatcher(database, workers=2, poll_interval=0.01, log_retention_days=0)
+
+
+async def enqueue(database, count: int, event: str = "user.created", **data) -> None:
+    async with database.session_maker() as db:
+        for n in range(count):
+            await enqueue_event(db, event, {"n": n, **data})
+
+
+def body(request) -> bytes:
+    if request.headers.get("Content-Encoding") == "gzip":
+        return gzip.decompress(request.content)
+    return request.content
+
+
+def batch_events(request) -> list[int]:
+    return [event["data"]["n"] for event in orjson.loads(body(request))["events"]]
+
+
+async def test_events_are_sent_in_batches(webhook_db, subscribe, receiver):
+    await subscribe(["user.created"], secret="s3cret", batch_max_size=3, batch_window_seconds=0)
+    await enqueue(webhook_db, 7)
+
+    await make_dispatcher(webhook_db).run_until_idle()
+
+    assert [request.headers["X-Event-Type"] for request in receiver.requests] == ["batch"] * 3
+    assert [request.headers["X-Webhook-Batch-Size"] for request in receiver.requests] == ["3", "3", "1"]
+    assert sorted(n for request in receiver.requests for n in batch_events(request)) == list(range(7))
+    for request in receiver.requests:
+        assert request.headers["X-Webhook-Signature"] == generate_signature(request.content, "s3cret")
+
+    async with webhook_db.session_maker() as db:
+        assert (await db.execute(select(WebhookDelivery))).all() == []
+
+
+async def test_batches_stay_under_the_byte_limit(webhook_db, subscribe, receiver):
+    await subscribe(["user.created"], batch_max_size=10, batch_max_bytes=300, batch_window_seconds=0)
+    await enqueue(webhook_db, 5, padding="x" * 80)
+
+    await make_dispatcher(webhook_db).run_until_idle()
+
+    assert len(receiver.requests) > 1
+    assert all(len(request.content) <= 300 + len(b'{"events":[]}') for request in receiver.requests)
+    assert sorted(n for request in receiver.requests for n in batch_events(request)) == list(range(5))
+
+
+async def test_failed_batch_is_retried_as_a_whole(webhook_db, subscribe, receiver):
+    await subscribe(["user.created"], batch_max_size=3, batch_window_seconds=0)
+    await enqueue(webhook_db, 3)
+    receiver.status_code = 500
+
+    await make_dispatcher(webhook_db).run_until_idle()
+
+    assert len(receiver.requests) == 1
+    async with webhook_db.session_maker() as db:
+        deliveries = (await db.execute(select(WebhookDelivery))).scalars().all()
+    assert [(delivery.status, delivery.attempts) for delivery in deliveries] == [(DeliveryStatus.PENDING, 1)] * 3
+
+
+async def test_events_wait_for_their_batch_window(webhook_db, subscribe, receiver):
+    await subscribe(["user.created"], batch_max_size=3, batch_window_seconds=60)
+    await enqueue(webhook_db, 2)
+
+    await make_dispatcher(webhook_db).run_until_idle()
+
+    assert receiver.requests == []
+
+
+async def test_single_event_subscriptions_are_unaffected(webhook_db, subscribe, receiver):
+    await subscribe(["user.created"], url="http://receiver.test/batched", batch_max_size=5, batch_window_seconds=0)
+    await subscribe(["user.created"], url="http://receiver.test/single")
+    await enqueue(webhook_db, 2)
+
+    await make_dispatcher(webhook_db).run_until_idle()
+
+    single = [request for request in receiver.requests if request.url.path == "/single"]
+    batched = [request for request in receiver.requests if request.url.path == "/batched"]
+    assert [request.headers["X-Event-Type"] for request in single] == ["user.created"] * 2
+    assert "X-Webhook-Batch-Size" not in single[0].headers
+    assert [request.headers["X-Webhook-Batch-Size"] for request in batched] == ["2"]
+
+
+async def test_large_bodies_are_gzipped_and_signed_uncompressed(receiver):
+    content = orjson.dumps({"event": "user.created", "data": {"padding": "x" * settings.WEBHOOK_GZIP_MIN_BYTES}})
+
+    await deliver_webhook("http://receiver.test/hook", "user.created", content, "s3cret", compress=True)
+
+    [request] = receiver.requests
+    assert request.headers["Content-Encoding"] == "gzip"
+    assert len(request.content) < len(content)
+    assert gzip.decompress(request.content) == content
+    assert request.headers["X-Webhook-Signature"] == generate_signature(content, "s3cret")
+
+
+async def test_small_bodies_are_sent_uncompressed(receiver):
+    await deliver_webhook("http://receiver.test/hook", "user.created", b"{}", compress=True)
+    await deliver_webhook("http://receiver.test/hook", "user.created", b"x" * settings.WEBHOOK_GZIP_MIN_BYTES)
+
+    assert [request.headers.get("Content-Encoding") for request in receiver.requests] == [None, None]
@@ -0,0 +1,163 @@
+import types
+
+import pytest
+from sqlalchemy import select
+
+from webhooks import circuit
+from webhooks.circuit import CircuitBreaker, CircuitState
+from webhooks.dispatcher import WebhookDispatcher, enqueue_event
+from webhooks.models import DeliveryStatus, WebhookDelivery, WebhookSubscription
+
+pytestmark = pytest.mark.anyio
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Stands in for the breaker's time.monotonic, leaving the event loop's clock alone"""
+    clock = Clock()
+    monkeypatch.setattr(circuit, "time", types.SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def make_breaker(**options):
+    options = {"failure_threshold": 3, "cooldown": 10, "max_cooldown": 40, "deactivate_after": 100, "probe_timeout": 5, **options}
+    return CircuitBreaker(**options)
+
+
+def fail(breaker, subscription_id=1, times=1):
+    for _ in range(times):
+        breaker.record_failure(subscription_id)
+
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    breaker = make_breaker()
+    fail(breaker, times=2)
+    assert breaker.state(1) == CircuitState.CLOSED
+    assert breaker.allow(1)
+    assert breaker.blocked() == []
+
+    fail(breaker)
+    assert breaker.state(1) == CircuitState.OPEN
+    assert not breaker.allow(1)
+    assert breaker.blocked() == [1]
+    assert breaker.retry_after(1) == 10
+    # Other subscriptions are unaffected
+    assert breaker.allow(2)
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = make_breaker()
+    fail(breaker, times=2)
+    breaker.record_success(1)
+    fail(breaker, times=2)
+    assert breaker.state(1) == CircuitState.CLOSED
+
+
+def test_half_open_circuit_lets_one_probe_through(clock):
+    breaker = make_breaker()
+    fail(breaker, times=3)
+
+    clock.now += 10
+    assert breaker.state(1) == CircuitState.HALF_OPEN
+    assert breaker.blocked() == []
+    assert breaker.allow(1)
+    assert not breaker.allow(1)
+    assert breaker.blocked() == [1]
+
+    # A probe that never reports back stops blocking others after probe_timeout
+    clock.now += 5
+    assert breaker.allow(1)
+
+
+def test_successful_probe_closes_the_circuit(clock):
+    breaker = make_breaker()
+    fail(breaker, times=3)
+    clock.now += 10
+    assert breaker.allow(1)
+
+    breaker.record_success(1)
+    assert breaker.state(1) == CircuitState.CLOSED
+    assert breaker.allow(1) and breaker.allow(1)
+
+
+def test_failed_probes_double_the_cooldown_up_to_the_maximum(clock):
+    breaker = make_breaker()
+    fail(breaker, times=3)
+
+    for cooldown in (20, 40, 40):
+        clock.now += breaker.retry_after(1)
+        assert breaker.allow(1)
+        fail(breaker)
+        assert breaker.state(1) == CircuitState.OPEN
+        assert breaker.retry_after(1) == cooldown
+
+
+def test_subscription_failing_long_enough_should_be_deactivated(clock):
+    breaker = make_breaker()
+    fail(breaker)
+    clock.now += 150
+    # Never opened: occasional failures do not count
+    assert not breaker.should_deactivate(1)
+
+    fail(breaker, times=2)
+    assert breaker.should_deactivate(1)
+    assert not make_breaker(deactivate_after=0).should_deactivate(1)
+
+
+def test_reset_closes_the_circuit(clock):
+    breaker = make_breaker()
+    fail(breaker, times=3)
+    breaker.reset(1)
+    assert breaker.state(1) == CircuitState.CLOSED
+    assert breaker.blocked() == []
+
+
+async def test_dispatcher_defers_deliveries_of_an_open_circuit(webhook_db, subscribe, receiver):
+    subscription_id = await subscribe(["user.created"])
+    async with webhook_db.session_maker() as db:
+        await enqueue_event(db, "user.created", {"id": 1})
+    dispatcher = WebhookDispatcher(webhook_db, workers=2, poll_interval=0.01, log_retention_days=0)
+    dispatcher.circuit_breaker = make_breaker(failure_threshold=1)
+    fail(dispatcher.circuit_breaker, subscription_id)
+
+    # Not claimed while blocked
+    assert await dispatcher._claim(10) == []
+
+    # A job claimed before the circuit opened goes back without a request or an attempt
+    dispatcher.circuit_breaker.reset(subscription_id)
+    jobs = await dispatcher._claim(10)
+    fail(dispatcher.circuit_breaker, subscription_id)
+    await dispatcher._process(jobs)
+
+    assert receiver.requests == []
+    async with webhook_db.session_maker() as db:
+        delivery = await db.scalar(select(WebhookDelivery))
+    assert delivery.status == DeliveryStatus.PENDING
+    assert delivery.attempts == 0
+
+
+async def test_dispatcher_deactivates_a_subscription_that_keeps_failing(webhook_db, subscribe, receiver, clock):
+    subscription_id = await subscribe(["user.created"])
+    async with webhook_db.session_maker() as db:
+        await enqueue_event(db, "user.created", {"id": 1})
+    receiver.status_code = 503
+    dispatcher = WebhookDispatcher(webhook_db, workers=2, poll_interval=0.01, log_retention_days=0)
+    dispatcher.circuit_breaker = make_breaker(failure_threshold=2)
+    # Failing since long ago, the next failure opens the circuit
+    fail(dispatcher.circuit_breaker, subscription_id)
+    clock.now += 100
+
+    await dispatcher.run_until_idle()
+
+    assert len(receiver.requests) == 1
+    async with webhook_db.session_maker() as db:
+        subscription = await db.get(WebhookSubscription, subscription_id)
+    assert not subscription.active
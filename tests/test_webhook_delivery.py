@@ -0,0 +1,117 @@
+import asyncio
+
+import httpx
+import pytest
+
+from webhooks import delivery
+from webhooks.delivery import HostLimiter, close_webhook_client, deliver_webhook, get_webhook_client
+
+pytestmark = pytest.mark.anyio
+
+
+class Holder:
+    """Takes a slot on `host` and keeps it until released, counting who is inside"""
+
+    def __init__(self, limiter: HostLimiter):
+        self.limiter = limiter
+        self.inside: dict[str, int] = {}
+        self.peak: dict[str, int] = {}
+        self.release = asyncio.Event()
+
+    async def hold(self, host: str) -> None:
+        async with self.limiter.limit(host):
+            self.inside[host] = self.inside.get(host, 0) + 1
+            self.peak[host] = max(self.peak.get(host, 0), self.inside[host])
+            await self.release.wait()
+            self.inside[host] -= 1
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def test_requests_per_host_are_capped():
+    holder = Holder(HostLimiter(max_in_flight=10, max_per_host=2))
+    tasks = [asyncio.create_task(holder.hold("slow.test")) for _ in range(5)]
+    tasks.append(asyncio.create_task(holder.hold("fast.test")))
+    await settle()
+
+    # A slow host queues its own requests without holding up another host
+    assert holder.inside == {"slow.test": 2, "fast.test": 1}
+    assert holder.limiter.in_flight("slow.test") == 5
+
+    holder.release.set()
+    await asyncio.gather(*tasks)
+    assert holder.peak == {"slow.test": 2, "fast.test": 1}
+
+
+async def test_requests_overall_are_capped():
+    holder = Holder(HostLimiter(max_in_flight=3, max_per_host=2))
+    tasks = [asyncio.create_task(holder.hold(f"host{n}.test")) for n in range(5)]
+    await settle()
+
+    assert sum(holder.inside.values()) == 3
+
+    holder.release.set()
+    await asyncio.gather(*tasks)
+    assert sum(holder.peak.values()) == 5
+
+
+async def test_requests_queued_for_a_host_hold_no_global_slot():
+    holder = Holder(HostLimiter(max_in_flight=2, max_per_host=1))
+    tasks = [asyncio.create_task(holder.hold("slow.test")) for _ in range(3)]
+    await settle()
+    tasks.append(asyncio.create_task(holder.hold("fast.test")))
+    await settle()
+
+    assert holder.inside == {"slow.test": 1, "fast.test": 1}
+
+    holder.release.set()
+    await asyncio.gather(*tasks)
+
+
+async def test_idle_hosts_are_forgotten():
+    limiter = HostLimiter(max_in_flight=10, max_per_host=2)
+    async with limiter.limit("receiver.test"):
+        assert limiter.in_flight("receiver.test") == 1
+
+    assert limiter.in_flight("receiver.test") == 0
+    assert limiter._hosts == {}
+
+
+async def test_client_is_shared_until_closed(monkeypatch):
+    monkeypatch.setattr(delivery, "_webhook_client", None)
+    client = get_webhook_client()
+    assert get_webhook_client() is client
+
+    await close_webhook_client()
+    assert client.is_closed
+    replacement = get_webhook_client()
+    assert replacement is not client
+    await close_webhook_client()
+
+
+async def test_delivery_reports_failure_when_the_receiver_is_unreachable(monkeypatch):
+    def refuse(request):
+        raise httpx.ConnectError("Connection refused")
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(refuse))
+    monkeypatch.setattr(delivery, "_webhook_client", client)
+
+    result = await deliver_webhook("http://receiver.test/hook", "user.created", b"{}")
+    await client.aclose()
+
+    assert not result.success
+    assert result.status_code is None
+    assert "Connection refused" in result.error
+    assert delivery.limiter.in_flight("receiver.test") == 0
+
+
+async def test_delivery_status_codes(receiver):
+    result = await deliver_webhook("http://receiver.test/hook", "user.created", b"{}")
+    assert result.success and result.status_code == 200
+
+    receiver.status_code = 410
+    result = await deliver_webhook("http://receiver.test/hook", "user.created", b"{}")
+    assert not result.success and result.status_code == 410
@@ -0,0 +1,143 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, select, update
+
+from webhooks.dispatcher import WebhookDispatcher, enqueue_event
+from webhooks.models import DeliveryStatus, WebhookDelivery, WebhookLog, WebhookSubscription
+
+pytestmark = pytest.mark.anyio
+
+
+def make_dispatcher(database, **options):
+    options = {"workers": 4, "poll_interval": 0.01, "log_retention_days": 0, **options}
+    return WebhookDispatcher(database, **options)
+
+
+async def enqueue(database, event="user.created", data=None) -> int:
+    async with database.session_maker() as db:
+        return await enqueue_event(db, event, data or {"id": 1})
+
+
+async def deliveries(database) -> list[WebhookDelivery]:
+    async with database.session_maker() as db:
+        result = await db.execute(select(WebhookDelivery).order_by(WebhookDelivery.id))
+        return list(result.scalars())
+
+
+async def logs(database) -> list[WebhookLog]:
+    async with database.session_maker() as db:
+        result = await db.execute(select(WebhookLog).order_by(WebhookLog.id))
+        return list(result.scalars())
+
+
+async def test_delivered_jobs_leave_the_outbox(webhook_db, subscribe, receiver):
+    await subscribe(["user.created"], url="http://receiver.test/a")
+    await subscribe(["*"], url="http://receiver.test/b")
+    assert await enqueue(webhook_db) == 2
+
+    await make_dispatcher(webhook_db).run_until_idle()
+
+    assert sorted(str(request.url) for request in receiver.requests) == [
+        "http://receiver.test/a", "http://receiver.test/b"
+    ]
+    assert await deliveries(webhook_db) == []
+    assert [(log.success, log.status_code, log.attempts) for log in await logs(webhook_db)] == [
+        (True, 200, 1), (True, 200, 1)
+    ]
+
+
+async def test_failed_delivery_is_scheduled_for_retry(webhook_db, subscribe, receiver):
+    await subscribe(["user.created"])
+    await enqueue(webhook_db)
+    receiver.status_code = 500
+
+    before = datetime.utcnow()
+    await make_dispatcher(webhook_db, max_attempts=3).run_until_idle()
+
+    [delivery] = await deliveries(webhook_db)
+    assert delivery.status == DeliveryStatus.PENDING
+    assert delivery.attempts == 1
+    assert delivery.last_status_code == 500
+    assert delivery.lease_token is None
+    assert delivery.next_attempt_at > before
+
+
+async def test_delivery_out_of_attempts_is_marked_failed(webhook_db, subscribe, receiver):
+    await subscribe(["user.created"])
+    await enqueue(webhook_db)
+    receiver.status_code = 500
+
+    await make_dispatcher(webhook_db, max_attempts=1).run_until_idle()
+
+    [delivery] = await deliveries(webhook_db)
+    assert delivery.status == DeliveryStatus.FAILED
+    assert delivery.attempts == 1
+    assert len(receiver.requests) == 1
+
+
+async def test_leased_jobs_are_not_claimed_again_until_the_lease_expires(webhook_db, subscribe):
+    await subscribe(["user.created"])
+    await enqueue(webhook_db)
+    await enqueue(webhook_db)
+    first, second = make_dispatcher(webhook_db), make_dispatcher(webhook_db)
+
+    claimed = await first._claim(10)
+    assert [job.attempts for job in claimed] == [1, 1]
+    assert len({job.lease_token for job in claimed}) == 1
+    assert await second._claim(10) == []
+
+    # As if the first dispatcher died holding the jobs
+    async with webhook_db.session_maker() as db:
+        await db.execute(update(WebhookDelivery).values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        await db.commit()
+
+    reclaimed = await second._claim(10)
+    assert [job.id for job in reclaimed] == [job.id for job in claimed]
+    assert [job.attempts for job in reclaimed] == [2, 2]
+    assert reclaimed[0].lease_token != claimed[0].lease_token
+
+
+async def test_outcome_of_a_lost_lease_is_discarded(webhook_db, subscribe):
+    await subscribe(["user.created"])
+    await enqueue(webhook_db)
+    first, second = make_dispatcher(webhook_db), make_dispatcher(webhook_db)
+
+    [stale] = await first._claim(10)
+    async with webhook_db.session_maker() as db:
+        await db.execute(update(WebhookDelivery).values(lease_expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        await db.commit()
+    [current] = await second._claim(10)
+
+    # The first dispatcher finishing late does not remove the job the second one holds
+    await first._finish([stale], delete(WebhookDelivery))
+    [delivery] = await deliveries(webhook_db)
+    assert delivery.lease_token == current.lease_token
+
+
+async def test_released_jobs_do_not_use_an_attempt(webhook_db, subscribe):
+    await subscribe(["user.created"])
+    await enqueue(webhook_db)
+    dispatcher = make_dispatcher(webhook_db)
+
+    claimed = await dispatcher._claim(10)
+    await dispatcher._release(claimed)
+
+    [delivery] = await deliveries(webhook_db)
+    assert delivery.status == DeliveryStatus.PENDING
+    assert delivery.attempts == 0
+    assert delivery.lease_token is None
+    assert [job.id for job in await dispatcher._claim(10)] == [delivery.id]
+
+
+async def test_deliveries_to_removed_subscriptions_are_dropped(webhook_db, subscribe, receiver):
+    subscription_id = await subscribe(["user.created"])
+    await enqueue(webhook_db)
+    async with webhook_db.session_maker() as db:
+        await db.delete(await db.get(WebhookSubscription, subscription_id))
+        await db.commit()
+
+    await make_dispatcher(webhook_db).run_until_idle()
+
+    assert receiver.requests == []
+    assert await deliveries(webhook_db) == []
@@ -0,0 +1,111 @@
+import hashlib
+
+import httpx
+import orjson
+import pytest
+from sqlalchemy import func, select
+
+from web_hook_app import app
+from webhooks.delivery import batch_body, deliver_webhook, generate_signature
+from webhooks.dispatcher import enqueue_event
+from webhooks.models import WebhookDelivery, WebhookEvent
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def client(webhook_db):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app), base_url="http://test") as client:
+        yield client
+
+
+async def subscribe(client, events, **params):
+    response = await client.post(
+        "/webhooks/subscriptions",
+        params={"url": "http://receiver.test/hook", **params},
+        json=events
+    )
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+async def test_event_is_stored_once_for_all_subscribers(client, webhook_db):
+    await subscribe(client, ["user.created"])
+    await subscribe(client, ["*"])
+    await subscribe(client, ["order.paid"])
+
+    async with webhook_db.session_maker() as db:
+        assert await enqueue_event(db, "user.created", {"name": "Ada"}) == 2
+        assert await db.scalar(select(func.count()).select_from(WebhookEvent)) == 1
+        deliveries = (await db.execute(select(WebhookDelivery))).scalars().all()
+
+    assert len({delivery.event_id for delivery in deliveries}) == 1
+    async with webhook_db.session_maker() as db:
+        event = await db.get(WebhookEvent, deliveries[0].event_id)
+    assert orjson.loads(event.payload)["data"] == {"name": "Ada"}
+
+
+async def test_test_endpoint_queues_the_event(client):
+    await subscribe(client, ["user.created"])
+    response = await client.post("/webhooks/test", params={"event": "user.created"}, json={"id": 1})
+    assert response.status_code == 200
+    assert response.json()["queued"] == 1
+
+
+async def test_test_endpoint_rejects_data_json_cannot_carry(client):
+    await subscribe(client, ["user.created"])
+    response = await client.post("/webhooks/test", params={"event": "user.created"}, content=b'{"id": 18446744073709551616}')
+    assert response.status_code == 422
+    # Rejected the same way without subscribers
+    response = await client.post("/webhooks/test", params={"event": "nobody.listens"}, content=b'{"id": 18446744073709551616}')
+    assert response.status_code == 422
+
+
+@pytest.fixture
+def signatures(monkeypatch):
+    """Counts the HMACs computed for deliveries"""
+    from webhooks import delivery
+
+    computed = []
+
+    def count(payload, secret):
+        computed.append(secret)
+        return generate_signature(payload, secret)
+
+    monkeypatch.setattr(delivery, "generate_signature", count)
+    yield computed
+    delivery.signature_cache.clear()
+
+
+async def test_signature_is_computed_once_per_event_and_secret(receiver, signatures):
+    payload = b'{"event": "user.created"}'
+    # Two subscriptions sharing a secret, one with its own, then a retry
+    await deliver_webhook("http://receiver.test/a", "user.created", payload, "shared", event_id=1)
+    await deliver_webhook("http://receiver.test/b", "user.created", payload, "shared", event_id=1)
+    await deliver_webhook("http://receiver.test/c", "user.created", payload, "own", event_id=1)
+    await deliver_webhook("http://receiver.test/a", "user.created", payload, "shared", event_id=1)
+    assert signatures == ["shared", "own"]
+
+    headers = [request.headers["X-Webhook-Signature"] for request in receiver.requests]
+    shared, own = generate_signature(payload, "shared"), generate_signature(payload, "own")
+    assert headers == [shared, shared, own, shared]
+
+    # Another event is signed again
+    await deliver_webhook("http://receiver.test/a", "user.created", b"{}", "shared", event_id=2)
+    assert signatures == ["shared", "own", "shared"]
+
+
+async def test_batches_are_not_memoized(receiver, signatures):
+    body = batch_body([b"{}", b"{}"])
+    await deliver_webhook("http://receiver.test/a", "batch", body, "shared", batch_size=2)
+    await deliver_webhook("http://receiver.test/a", "batch", body, "shared", batch_size=2)
+    assert signatures == ["shared", "shared"]
+
+
+async def test_signature_cache_keys_hold_no_secrets(receiver, signatures):
+    from webhooks.delivery import signature_cache
+
+    await deliver_webhook("http://receiver.test/a", "user.created", b"{}", "s3cret", event_id=7)
+    assert len(signature_cache) == 1
+    assert signature_cache.get((7, "s3cret")) is None
+    assert signature_cache.get((7, hashlib.sha256(b"s3cret").digest())) == generate_signature(b"{}", "s3cret")
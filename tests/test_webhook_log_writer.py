@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+from webhooks.log_writer import WebhookLogWriter
+from webhooks.models import WebhookEvent, WebhookLog
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def event_id(webhook_db) -> int:
+    async with webhook_db.session_maker() as db:
+        event = WebhookEvent(event="user.created", payload="{}")
+        db.add(event)
+        await db.commit()
+        return event.id
+
+
+def record(event_id: int, subscription_id: int = 1) -> dict:
+    return {"subscription_id": subscription_id, "event": "user.created", "event_id": event_id, "success": True}
+
+
+async def log_count(database) -> int:
+    async with database.session_maker() as db:
+        return await db.scalar(select(func.count()).select_from(WebhookLog))
+
+
+def count_flushes(writer: WebhookLogWriter) -> list[int]:
+    """Sizes of the batches the writer flushes"""
+    sizes = []
+    flush = writer._flush
+
+    async def counted(batch):
+        sizes.append(len(batch))
+        await flush(batch)
+
+    writer._flush = counted
+    return sizes
+
+
+async def test_logs_are_written_in_batches(webhook_db, event_id):
+    writer = WebhookLogWriter(webhook_db, batch_size=3, flush_interval=10)
+    flushes = count_flushes(writer)
+    writer.start()
+    started = asyncio.get_running_loop().time()
+
+    for subscription_id in range(7):
+        await writer.write(**record(event_id, subscription_id))
+    await writer.stop()
+
+    assert flushes == [3, 3, 1]
+    # Stopping flushes the rest right away instead of waiting out the interval
+    assert asyncio.get_running_loop().time() - started < 1
+    assert await log_count(webhook_db) == 7
+    async with webhook_db.session_maker() as db:
+        logs = (await db.execute(select(WebhookLog))).scalars().all()
+    assert all(log.created_at is not None for log in logs)
+
+
+async def test_partial_batch_is_written_after_the_flush_interval(webhook_db, event_id):
+    writer = WebhookLogWriter(webhook_db, batch_size=100, flush_interval=0.05)
+    writer.start()
+    try:
+        await writer.write(**record(event_id))
+        await writer.write(**record(event_id))
+        for _ in range(100):
+            if await log_count(webhook_db) == 2:
+                break
+            await asyncio.sleep(0.01)
+        assert await log_count(webhook_db) == 2
+    finally:
+        await writer.stop()
+
+
+async def test_full_queue_makes_writers_wait(webhook_db, event_id):
+    writer = WebhookLogWriter(webhook_db, batch_size=1, flush_interval=0, max_queue_size=2)
+    unblock = asyncio.Event()
+    flush = writer._flush
+
+    async def blocked(batch):
+        await unblock.wait()
+        await flush(batch)
+
+    writer._flush = blocked
+    writer.start()
+
+    # One record is being flushed, two wait in the queue, the fourth write waits for room
+    for _ in range(3):
+        await writer.write(**record(event_id))
+        await asyncio.sleep(0)
+    waiting = asyncio.create_task(writer.write(**record(event_id)))
+    await asyncio.sleep(0.05)
+    assert not waiting.done()
+
+    unblock.set()
+    await waiting
+    await writer.stop()
+    assert await log_count(webhook_db) == 4
+
+
+async def test_failed_flush_does_not_stop_the_writer(webhook_db, event_id, capsys):
+    writer = WebhookLogWriter(webhook_db, batch_size=1, flush_interval=0)
+    writer.start()
+
+    await writer.write(**{**record(event_id), "event": None})
+    await writer.write(**record(event_id))
+    await writer.stop()
+
+    assert "Failed to write 1 webhook logs" in capsys.readouterr().out
+    assert await log_count(webhook_db) == 1
@@ -0,0 +1,90 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db import Database
+from webhooks.models import Base, WebhookEvent, WebhookLog, WebhookLogSummary
+from webhooks.retention import compact_logs
+
+pytestmark = pytest.mark.anyio
+
+NOW = datetime(2024, 3, 20, 12, 0)
+
+
+async def add_logs(database, *logs):
+    """Logs as (created_at, subscription_id, success), all for one user.created event"""
+    async with database.session_maker() as db:
+        event = WebhookEvent(event="user.created", payload="{}", created_at=logs[0][0])
+        db.add(event)
+        await db.flush()
+        await db.execute(insert(WebhookLog), [
+            {"subscription_id": subscription_id, "event": "user.created", "event_id": event.id,
+             "success": success, "created_at": created_at}
+            for created_at, subscription_id, success in logs
+        ])
+        await db.commit()
+
+
+async def summaries(database):
+    async with database.session_maker() as db:
+        result = await db.execute(select(WebhookLogSummary).order_by(WebhookLogSummary.day, WebhookLogSummary.subscription_id))
+        return [(row.day, row.subscription_id, row.attempts, row.successes) for row in result.scalars()]
+
+
+async def count(database, model):
+    async with database.session_maker() as db:
+        return await db.scalar(select(func.count()).select_from(model))
+
+
+async def test_old_logs_are_folded_into_daily_summaries(webhook_db):
+    await add_logs(
+        webhook_db,
+        (datetime(2024, 3, 1, 9), 1, True),
+        (datetime(2024, 3, 1, 23, 59), 1, False),
+        (datetime(2024, 3, 1, 10), 2, True),
+        (datetime(2024, 3, 2, 0, 0), 1, True),
+    )
+    await add_logs(webhook_db, (NOW - timedelta(days=1), 1, True))
+
+    assert await compact_logs(webhook_db, retention_days=7, now=NOW) == 4
+    assert await summaries(webhook_db) == [
+        (date(2024, 3, 1), 1, 2, 1),
+        (date(2024, 3, 1), 2, 1, 1),
+        (date(2024, 3, 2), 1, 1, 1),
+    ]
+    assert await count(webhook_db, WebhookLog) == 1
+    # The old event has no logs left, the recent one keeps its own
+    assert await count(webhook_db, WebhookEvent) == 1
+
+
+async def test_late_logs_are_added_to_a_summarized_day(webhook_db):
+    await add_logs(webhook_db, (datetime(2024, 3, 1, 9), 1, True))
+    await compact_logs(webhook_db, retention_days=7, now=NOW)
+    await add_logs(webhook_db, (datetime(2024, 3, 1, 18), 1, False), (datetime(2024, 3, 1, 19), 1, True))
+
+    assert await compact_logs(webhook_db, retention_days=7, now=NOW) == 2
+    assert await summaries(webhook_db) == [(date(2024, 3, 1), 1, 3, 2)]
+
+
+async def test_concurrent_compactions_count_each_log_once(tmp_path):
+    database = Database(f"sqlite+aiosqlite:///{tmp_path / 'webhooks.db'}", session_class=AsyncSession)
+    await database.create_all(Base.metadata)
+    try:
+        start = datetime(2024, 3, 1)
+        await add_logs(database, *(
+            (start + timedelta(hours=hour), hour % 3, hour % 2 == 0) for hour in range(24 * 5)
+        ))
+
+        removed = await asyncio.gather(*(compact_logs(database, retention_days=7, now=NOW) for _ in range(4)))
+
+        assert sum(removed) == 24 * 5
+        assert await count(database, WebhookLog) == 0
+        rows = await summaries(database)
+        assert len(rows) == 5 * 3
+        assert sum(attempts for _, _, attempts, _ in rows) == 24 * 5
+        assert sum(successes for _, _, _, successes in rows) == 24 * 5 // 2
+    finally:
+        await database.dispose()
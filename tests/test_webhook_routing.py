@@ -0,0 +1,112 @@
+import json
+
+import pytest
+from sqlalchemy import func, select, update
+
+from webhooks.models import WebhookSubscription, WebhookSubscriptionEvent
+from webhooks.routing import Route, SubscriptionRouter, backfill_subscription_events, settings
+
+pytestmark = pytest.mark.anyio
+
+
+async def match(database, router, event):
+    async with database.session_maker() as db:
+        return sorted(await router.match(db, event))
+
+
+async def test_matches_exact_and_wildcard_subscriptions(webhook_db, subscribe):
+    router = SubscriptionRouter()
+    created = await subscribe(["user.created", "user.deleted"])
+    anything = await subscribe(["*"])
+    both = await subscribe(["user.created", "*"])
+    await subscribe(["order.paid"])
+
+    assert await match(webhook_db, router, "user.created") == [
+        Route(created, 0.0), Route(anything, 0.0), Route(both, 0.0)
+    ]
+    assert await match(webhook_db, router, "user.updated") == [Route(anything, 0.0), Route(both, 0.0)]
+
+
+async def test_inactive_subscriptions_are_not_matched(webhook_db, subscribe):
+    router = SubscriptionRouter()
+    await subscribe(["user.created"], active=False)
+    active = await subscribe(["user.created"])
+
+    assert await match(webhook_db, router, "user.created") == [Route(active, 0.0)]
+
+
+async def test_batched_subscriptions_wait_for_their_batch_window(webhook_db, subscribe):
+    router = SubscriptionRouter()
+    windowed = await subscribe(["user.created"], batch_max_size=10, batch_window_seconds=5.0)
+    default = await subscribe(["user.created"], batch_max_size=10)
+
+    assert await match(webhook_db, router, "user.created") == [
+        Route(windowed, 5.0), Route(default, settings.WEBHOOK_BATCH_WINDOW_SECONDS)
+    ]
+
+
+async def test_results_are_cached_until_invalidated(webhook_db, subscribe):
+    router = SubscriptionRouter()
+    first = await subscribe(["user.created"])
+    assert await match(webhook_db, router, "user.created") == [Route(first, 0.0)]
+
+    second = await subscribe(["user.created"])
+    assert await match(webhook_db, router, "user.created") == [Route(first, 0.0)]
+
+    router.invalidate()
+    assert await match(webhook_db, router, "user.created") == [Route(first, 0.0), Route(second, 0.0)]
+
+
+async def test_lookup_racing_an_invalidation_is_not_cached(webhook_db, subscribe):
+    router = SubscriptionRouter()
+    await subscribe(["user.created"])
+
+    async with webhook_db.session_maker() as db:
+        execute = db.execute
+
+        async def invalidated_meanwhile(*args, **kwargs):
+            result = await execute(*args, **kwargs)
+            router.invalidate()
+            return result
+
+        db.execute = invalidated_meanwhile
+        await router.match(db, "user.created")
+
+    assert router.cache.get("user.created") is None
+
+
+async def test_backfill_creates_missing_routing_rows(webhook_db, subscribe):
+    routed = await subscribe(["order.paid"])
+    async with webhook_db.session_maker() as db:
+        legacy = WebhookSubscription(url="http://receiver.test/old", events=json.dumps(["user.created", "*", "*"]))
+        db.add(legacy)
+        await db.commit()
+
+        assert await backfill_subscription_events(db) == 2
+        assert await backfill_subscription_events(db) == 0
+        result = await db.execute(
+            select(WebhookSubscriptionEvent.subscription_id, WebhookSubscriptionEvent.event)
+            .order_by(WebhookSubscriptionEvent.subscription_id, WebhookSubscriptionEvent.event)
+        )
+        assert result.all() == [(routed, "order.paid"), (legacy.id, "*"), (legacy.id, "user.created")]
+
+
+async def test_routing_rows_go_with_their_subscription(webhook_db, subscribe):
+    subscription_id = await subscribe(["user.created", "*"])
+    async with webhook_db.session_maker() as db:
+        await db.delete(await db.get(WebhookSubscription, subscription_id))
+        await db.commit()
+        assert await db.scalar(select(func.count()).select_from(WebhookSubscriptionEvent)) == 0
+
+
+async def test_deactivation_takes_effect_after_invalidation(webhook_db, subscribe):
+    router = SubscriptionRouter()
+    subscription_id = await subscribe(["user.created"])
+    assert await match(webhook_db, router, "user.created") == [Route(subscription_id, 0.0)]
+
+    async with webhook_db.session_maker() as db:
+        await db.execute(update(WebhookSubscription).values(active=False))
+        await db.commit()
+    router.invalidate()
+
+    assert await match(webhook_db, router, "user.created") == []
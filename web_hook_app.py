@@ -1,202 +1,106 @@
-import asyncio
-import hashlib
-import hmac
 import json
-from datetime import datetime
+from contextlib import asynccontextmanager
+from datetime import date, datetime
 from typing import Optional
 
-import httpx
-from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session
+import orjson
+from fastapi import FastAPI, Depends, HTTPException, Query, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-# Database setup
-DATABASE_URL = "sqlite:///./webhooks.db"
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(bind=engine)
-Base = declarative_base()
+from core.webhook_config import get_settings
+from webhooks.db import database
+from webhooks.delivery import close_webhook_client
+from webhooks import metrics
+from webhooks.dispatcher import WebhookDispatcher, enqueue_event
+from webhooks.models import (
+    Base, DeliveryStatus, WebhookDelivery, WebhookSubscription, WebhookLog, WebhookLogSummary
+)
+from webhooks.routing import backfill_subscription_events, subscription_events, subscription_router
 
-app = FastAPI()
+settings = get_settings()
 
+# Deliveries are made from the durable outbox by the dispatcher, which can
+# also run as its own process (python -m webhooks.dispatcher)
+dispatcher = WebhookDispatcher(database)
 
-# Models
-class WebhookSubscription(Base):
-    __tablename__ = "webhook_subscriptions"
 
-    id = Column(Integer, primary_key=True)
-    url = Column(String, nullable=False)
-    events = Column(Text, nullable=False)  # JSON array as string
-    secret = Column(String, nullable=True)
-    active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create tables
+    await database.create_all(Base.metadata)
+    async with database.session_maker() as db:
+        await backfill_subscription_events(db)
+    if settings.WEBHOOK_DISPATCHER_EMBEDDED:
+        dispatcher.start()
+    yield
+    await dispatcher.stop()
+    await close_webhook_client()
+    await database.dispose()
 
 
-class WebhookLog(Base):
-    __tablename__ = "webhook_logs"
-
-    id = Column(Integer, primary_key=True)
-    subscription_id = Column(Integer, nullable=False)
-    event = Column(String, nullable=False)
-    payload = Column(Text, nullable=False)
-    status_code = Column(Integer, nullable=True)
-    success = Column(Boolean, default=False)
-    attempts = Column(Integer, default=1)
-    error_message = Column(Text, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-
-
-# Create tables
-Base.metadata.create_all(bind=engine)
+app = FastAPI(lifespan=lifespan)
 
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
-# Webhook delivery functions
-def generate_signature(payload: str, secret: str) -> str:
-    signature = hmac.new(
-        secret.encode(),
-        payload.encode(),
-        hashlib.sha256
-    ).hexdigest()
-    return f"sha256={signature}"
+get_db = database.get_db
 
 
-async def deliver_webhook(
-        subscription_id: int,
-        url: str,
-        event: str,
-        payload: dict,
-        secret: Optional[str] = None,
-        db: Session = None
-) -> bool:
-    """Deliver webhook and log the result"""
-
-    payload_str = json.dumps(payload)
-    headers = {
-        "Content-Type": "application/json",
-        "User-Agent": "MyApp-Webhook/1.0",
-        "X-Event-Type": event
-    }
-
-    if secret:
-        headers["X-Webhook-Signature"] = generate_signature(payload_str, secret)
-
-    max_retries = 3
-    last_error = None
-
-    for attempt in range(1, max_retries + 1):
-        try:
-            async with httpx.AsyncClient(timeout=15.0) as client:
-                response = await client.post(url, content=payload_str, headers=headers)
-
-                # Log the delivery
-                log = WebhookLog(
-                    subscription_id=subscription_id,
-                    event=event,
-                    payload=payload_str,
-                    status_code=response.status_code,
-                    success=response.status_code in [200, 201, 202, 204],
-                    attempts=attempt
-                )
-                db.add(log)
-                db.commit()
-
-                if response.status_code in [200, 201, 202, 204]:
-                    return True
-
-        except Exception as e:
-            last_error = str(e)
-
-        if attempt < max_retries:
-            await asyncio.sleep(2 ** (attempt - 1))
-
-    # Log final failure
-    log = WebhookLog(
-        subscription_id=subscription_id,
-        event=event,
-        payload=payload_str,
-        success=False,
-        attempts=max_retries,
-        error_message=last_error
-    )
-    db.add(log)
-    db.commit()
+async def broadcast_event(event: str, data: dict, db: AsyncSession) -> int:
+    """Queue event for every subscriber; it is durable once this returns"""
 
-    return False
-
-
-async def broadcast_event(event: str, data: dict, db: Session):
-    """Broadcast event to all subscribers"""
-
-    payload = {
-        "event": event,
-        "data": data,
-        "timestamp": datetime.utcnow().isoformat()
-    }
-
-    subscriptions = db.query(WebhookSubscription).filter(
-        WebhookSubscription.active == True
-    ).all()
-
-    tasks = []
-    for sub in subscriptions:
-        events = json.loads(sub.events)
-        if event in events or "*" in events:
-            task = deliver_webhook(
-                subscription_id=sub.id,
-                url=sub.url,
-                event=event,
-                payload=payload,
-                secret=sub.secret,
-                db=db
-            )
-            tasks.append(task)
-
-    if tasks:
-        import asyncio
-        await asyncio.gather(*tasks, return_exceptions=True)
+    queued = await enqueue_event(db, event, data)
+    if queued:
+        dispatcher.notify()
+    return queued
 
 
 # API Endpoints
 @app.post("/webhooks/subscriptions")
-def create_subscription(
+async def create_subscription(
         url: str,
         events: list[str],
         secret: Optional[str] = None,
-        db: Session = Depends(get_db)
+        batch_max_size: Optional[int] = Query(None, ge=1, description="Send events in batches of up to this many"),
+        batch_max_bytes: Optional[int] = Query(None, ge=1),
+        batch_window_seconds: Optional[float] = Query(None, ge=0),
+        gzip: bool = False,
+        db: AsyncSession = Depends(get_db)
 ):
     """Create a new webhook subscription"""
 
     subscription = WebhookSubscription(
         url=url,
         events=json.dumps(events),
-        secret=secret
+        secret=secret,
+        batch_max_size=batch_max_size,
+        batch_max_bytes=batch_max_bytes,
+        batch_window_seconds=batch_window_seconds,
+        gzip=gzip
     )
     db.add(subscription)
-    db.commit()
-    db.refresh(subscription)
+    await db.flush()
+    db.add_all(subscription_events(subscription.id, events))
+    await db.commit()
+    await db.refresh(subscription)
+    subscription_router.invalidate()
 
     return {
         "id": subscription.id,
         "url": subscription.url,
         "events": events,
-        "active": subscription.active
+        "active": subscription.active,
+        "batch_max_size": subscription.batch_max_size,
+        "gzip": subscription.gzip
     }
 
 
 @app.get("/webhooks/subscriptions")
-def list_subscriptions(db: Session = Depends(get_db)):
+async def list_subscriptions(db: AsyncSession = Depends(get_db)):
     """List all webhook subscriptions"""
 
-    subscriptions = db.query(WebhookSubscription).all()
+    result = await db.execute(select(WebhookSubscription))
+    subscriptions = result.scalars().all()
     return {
         "subscriptions": [
             {
@@ -204,6 +108,10 @@ def list_subscriptions(db: Session = Depends(get_db)):
                 "url": sub.url,
                 "events": json.loads(sub.events),
                 "active": sub.active,
+                "batch_max_size": sub.batch_max_size,
+                "batch_max_bytes": sub.batch_max_bytes,
+                "batch_window_seconds": sub.batch_window_seconds,
+                "gzip": sub.gzip,
                 "created_at": sub.created_at.isoformat()
             }
             for sub in subscriptions
@@ -212,36 +120,62 @@ def list_subscriptions(db: Session = Depends(get_db)):
 
 
 @app.delete("/webhooks/subscriptions/{subscription_id}")
-def delete_subscription(subscription_id: int, db: Session = Depends(get_db)):
+async def delete_subscription(subscription_id: int, db: AsyncSession = Depends(get_db)):
     """Delete a webhook subscription"""
 
-    subscription = db.query(WebhookSubscription).filter(
-        WebhookSubscription.id == subscription_id
-    ).first()
+    subscription = await db.get(WebhookSubscription, subscription_id)
 
     if not subscription:
         raise HTTPException(status_code=404, detail="Subscription not found")
 
-    db.delete(subscription)
-    db.commit()
+    # Its routing rows go with it (ON DELETE CASCADE)
+    await db.delete(subscription)
+    await db.commit()
+    subscription_router.invalidate()
 
     return {"status": "deleted"}
 
 
+@app.post("/webhooks/subscriptions/{subscription_id}/activate")
+async def activate_subscription(subscription_id: int, db: AsyncSession = Depends(get_db)):
+    """Re-enable a subscription, e.g. one deactivated after failing for too long"""
+
+    subscription = await db.get(WebhookSubscription, subscription_id)
+
+    if not subscription:
+        raise HTTPException(status_code=404, detail="Subscription not found")
+
+    subscription.active = True
+    await db.commit()
+    subscription_router.invalidate()
+    dispatcher.circuit_breaker.reset(subscription_id)
+
+    return {"id": subscription.id, "active": subscription.active}
+
+
 @app.get("/webhooks/logs")
-def get_webhook_logs(
-        limit: int = 50,
+async def get_webhook_logs(
+        response: Response,
+        limit: int = Query(50, ge=1, le=1000, description="Page size"),
+        before_id: Optional[int] = Query(None, description="Last id of the previous page"),
         subscription_id: Optional[int] = None,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    """Get webhook delivery logs"""
+    """Get webhook delivery logs, newest first (keyset pagination)"""
 
-    query = db.query(WebhookLog)
+    query = select(WebhookLog)
 
     if subscription_id:
-        query = query.filter(WebhookLog.subscription_id == subscription_id)
+        query = query.where(WebhookLog.subscription_id == subscription_id)
+    if before_id is not None:
+        query = query.where(WebhookLog.id < before_id)
+
+    result = await db.execute(query.order_by(WebhookLog.id.desc()).limit(limit))
+    logs = result.scalars().all()
 
-    logs = query.order_by(WebhookLog.created_at.desc()).limit(limit).all()
+    # A full page means there may be more; clients pass this back as before_id
+    if len(logs) == limit:
+        response.headers["X-Next-Before-Id"] = str(logs[-1].id)
 
     return {
         "logs": [
@@ -260,13 +194,57 @@ def get_webhook_logs(
     }
 
 
+@app.get("/webhooks/logs/summaries")
+async def get_webhook_log_summaries(
+        subscription_id: Optional[int] = None,
+        since: Optional[date] = None,
+        limit: int = Query(1000, ge=1, le=10000),
+        db: AsyncSession = Depends(get_db)
+):
+    """Daily totals for logs older than the retention period"""
+
+    query = select(WebhookLogSummary)
+
+    if subscription_id:
+        query = query.where(WebhookLogSummary.subscription_id == subscription_id)
+    if since is not None:
+        query = query.where(WebhookLogSummary.day >= since)
+
+    result = await db.execute(query.order_by(WebhookLogSummary.day.desc()).limit(limit))
+    summaries = result.scalars().all()
+
+    return {
+        "summaries": [
+            {
+                "day": summary.day.isoformat(),
+                "subscription_id": summary.subscription_id,
+                "event": summary.event,
+                "attempts": summary.attempts,
+                "successes": summary.successes
+            }
+            for summary in summaries
+        ]
+    }
+
+
+@app.get("/metrics")
+async def get_metrics(db: AsyncSession = Depends(get_db)):
+    """Delivery metrics in the Prometheus text format"""
+
+    pending = await db.scalar(
+        select(func.count()).select_from(WebhookDelivery).where(WebhookDelivery.status == DeliveryStatus.PENDING)
+    )
+    metrics.outbox_pending.set(pending)
+
+    return Response(content=metrics.registry.render(), media_type=metrics.registry.CONTENT_TYPE)
+
+
 # Example: Trigger webhooks from business events
 @app.post("/users")
 async def create_user(
         name: str,
         email: str,
-        background_tasks: BackgroundTasks,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     """Create user and send webhook"""
 
@@ -277,7 +255,7 @@ async def create_user(
         "created_at": datetime.utcnow().isoformat()
     }
 
-    background_tasks.add_task(broadcast_event, "user.created", user_data, db)
+    await broadcast_event("user.created", user_data, db)
 
     return {"status": "success", "user": user_data}
 
@@ -287,10 +265,13 @@ async def create_user(
 async def test_webhook(
         event: str,
         data: dict,
-        background_tasks: BackgroundTasks,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     """Test webhook delivery"""
 
-    background_tasks.add_task(broadcast_event, event, data, db)
-    return {"status": "triggered", "event": event}
\ No newline at end of file
+    try:
+        queued = await broadcast_event(event, data, db)
+    except orjson.JSONEncodeError as e:
+        # e.g. integers beyond 64 bits, which JSON parsing accepted
+        raise HTTPException(status_code=422, detail=f"Event data cannot be serialized: {e}")
+    return {"status": "triggered", "event": event, "queued": queued}
\ No newline at end of file
@@ -1,8 +1,30 @@
-from fastapi import FastAPI, WebSocket
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import orjson
+from fastapi import FastAPI, Query, WebSocket
 from fastapi.responses import HTMLResponse
 from starlette.websockets import WebSocketDisconnect
 
-app = FastAPI()
+from chat.connection import Connection
+from chat.encoding import MessageEncoding
+from chat.manager import ConnectionManager
+from core.chat_config import get_settings
+
+settings = get_settings()
+
+# Clients of this process; other workers' clients are reached through its backplane
+manager = ConnectionManager()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await manager.start()
+    yield
+    await manager.stop()
+
+
+app = FastAPI(lifespan=lifespan)
 
 html = """
 <!DOCTYPE html>
@@ -24,6 +46,10 @@ html = """
             document.querySelector("#ws-id").textContent = client_id;
             var ws = new WebSocket(`ws://localhost:8002/ws/${client_id}`);
             ws.onmessage = function(event) {
+                if (event.data === '{"action": "ping"}') {
+                    ws.send('{"action": "pong"}')
+                    return
+                }
                 var messages = document.getElementById('messages')
                 var message = document.createElement('li')
                 var content = document.createTextNode(event.data)
@@ -41,40 +67,88 @@ html = """
 </html>
 """
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
+@app.get("/")
+async def get():
+    return HTMLResponse(html)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            await connection.send_text(message)
 
+def parse_action(data: str) -> Optional[dict]:
+    """The action a client message carries, None for a plain chat message"""
+    if not data.startswith("{"):
+        return None
+    try:
+        action = orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return None
+    # Any other JSON, or text that only looks like it, is chat
+    return action if isinstance(action, dict) and "action" in action else None
 
-manager = ConnectionManager()
 
-@app.get("/")
-async def get():
-    return HTMLResponse(html)
+async def handle_action(connection: Connection, client_id: int, action: dict) -> None:
+    """
+    A JSON action sent by the client:
+      {"action": "subscribe", "room": "news"}
+      {"action": "subscribe", "room": "news", "epoch": "...", "last_seq": 41}  (catch up first, with replay)
+      {"action": "unsubscribe", "room": "news"}
+      {"action": "publish", "room": "news", "message": "..."}
+      {"action": "direct", "to": 42, "message": "..."}
+      {"action": "pong"}  (answers the server's ping)
+    """
+    try:
+        name = action["action"]
+        if name == "subscribe":
+            room = str(action["room"])
+            if room not in connection.rooms and len(connection.rooms) >= settings.CHAT_MAX_ROOMS_PER_CONNECTION:
+                connection.send(f"Error: at most {settings.CHAT_MAX_ROOMS_PER_CONNECTION} rooms")
+                return
+            last_seq = int(action["last_seq"]) if "last_seq" in action else None
+            connection.send(f"Subscribed to {room}")
+            if connection.sequenced and last_seq is not None:
+                manager.catch_up(connection, room, action.get("epoch"), last_seq)
+            manager.join(connection, room)
+        elif name == "unsubscribe":
+            room = str(action["room"])
+            manager.leave(connection, room)
+            connection.send(f"Unsubscribed from {room}")
+        elif name == "publish":
+            room = str(action["room"])
+            await manager.broadcast(f"Client #{client_id} in {room} says: {action['message']}", room)
+        elif name == "pong":
+            # Received, so the connection is not idle; from now on it is expected to answer
+            connection.answers_pings = True
+        elif name == "direct":
+            await manager.send_to_client(int(action["to"]), f"Client #{client_id} whispers: {action['message']}")
+        else:
+            connection.send(f"Error: unknown action {name}")
+    except (KeyError, TypeError, ValueError):
+        connection.send("Error: invalid action")
 
 
 @app.websocket("/ws/{client_id}")
-async def websocket_endpoint(websocket: WebSocket, client_id: int):
-    await manager.connect(websocket)
+async def websocket_endpoint(
+        websocket: WebSocket,
+        client_id: int,
+        encoding: str = Query(MessageEncoding.TEXT, pattern=f"^({MessageEncoding.TEXT}|{MessageEncoding.MSGPACK})$"),
+        batch: bool = Query(False, description="Receive messages batched, one frame per interval"),
+        replay: bool = Query(False, description="Receive room messages as numbered frames"),
+        epoch: Optional[str] = None,
+        last_seq: Optional[int] = Query(None, description="Last message to everyone seen, to catch up from")
+):
+    connection = await manager.connect(websocket, client_id, encoding, batch, replay, epoch, last_seq)
     try:
-        while True:
+        # Closed by the manager when it drops a slow consumer
+        while not connection.closed:
             data = await websocket.receive_text()
+            if not connection.received():
+                connection.send("Error: rate limit exceeded, message dropped")
+                continue
+            action = parse_action(data)
+            if action is not None:
+                await handle_action(connection, client_id, action)
+                continue
             await manager.send_personal_message(f"You wrote: {data}", websocket)
             await manager.broadcast(f"Client #{client_id} says: {data}")
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
-        await manager.broadcast(f"Client #{client_id} left the chat")
\ No newline at end of file
+        pass
+    manager.disconnect(websocket)
+    await manager.broadcast(f"Client #{client_id} left the chat")
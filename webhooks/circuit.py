@@ -0,0 +1,127 @@
+import time
+from typing import Optional
+
+from core.webhook_config import get_settings
+
+settings = get_settings()
+
+
+class CircuitState:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class _Circuit:
+    __slots__ = ("failures", "failing_since", "opened_until", "cooldown", "probe_started_at")
+
+    def __init__(self):
+        self.failures = 0
+        self.failing_since: Optional[float] = None
+        self.opened_until: Optional[float] = None
+        self.cooldown = 0.0
+        self.probe_started_at: Optional[float] = None
+
+
+class CircuitBreaker:
+    """
+    Per-subscription delivery health
+
+    After `failure_threshold` failures in a row a subscription's circuit
+    opens and its deliveries are deferred for `cooldown` seconds. Then one
+    probe delivery is let through (half-open): success closes the circuit,
+    failure opens it again for twice as long, up to `max_cooldown`. A
+    subscription that keeps failing for `deactivate_after` seconds should be
+    deactivated. State is kept in memory, per dispatcher process.
+    """
+
+    def __init__(
+            self,
+            failure_threshold: int = settings.WEBHOOK_CIRCUIT_FAILURE_THRESHOLD,
+            cooldown: float = settings.WEBHOOK_CIRCUIT_COOLDOWN_SECONDS,
+            max_cooldown: float = settings.WEBHOOK_CIRCUIT_MAX_COOLDOWN_SECONDS,
+            deactivate_after: float = settings.WEBHOOK_CIRCUIT_DEACTIVATE_AFTER_SECONDS,
+            probe_timeout: float = settings.WEBHOOK_TIMEOUT * 2
+    ):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.deactivate_after = deactivate_after
+        self.probe_timeout = probe_timeout
+        self._circuits: dict[int, _Circuit] = {}
+
+    def state(self, subscription_id: int) -> str:
+        circuit = self._circuits.get(subscription_id)
+        if circuit is None or circuit.opened_until is None:
+            return CircuitState.CLOSED
+        if time.monotonic() < circuit.opened_until:
+            return CircuitState.OPEN
+        return CircuitState.HALF_OPEN
+
+    def allow(self, subscription_id: int) -> bool:
+        """Whether a delivery may be attempted now; when half-open, only one probe at a time"""
+        state = self.state(subscription_id)
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.OPEN:
+            return False
+
+        circuit = self._circuits[subscription_id]
+        now = time.monotonic()
+        if circuit.probe_started_at is not None and now - circuit.probe_started_at < self.probe_timeout:
+            return False
+        circuit.probe_started_at = now
+        return True
+
+    def blocked(self) -> list[int]:
+        """Subscriptions whose deliveries should not be claimed right now"""
+        return [
+            subscription_id for subscription_id in self._circuits
+            if not self._claimable(subscription_id)
+        ]
+
+    def retry_after(self, subscription_id: int) -> float:
+        """Seconds to defer a delivery that was not allowed"""
+        circuit = self._circuits.get(subscription_id)
+        if circuit is None or circuit.opened_until is None:
+            return 0.0
+        return max(circuit.opened_until - time.monotonic(), circuit.cooldown)
+
+    def record_success(self, subscription_id: int) -> None:
+        self._circuits.pop(subscription_id, None)
+
+    def record_failure(self, subscription_id: int) -> None:
+        circuit = self._circuits.setdefault(subscription_id, _Circuit())
+        now = time.monotonic()
+        circuit.failures += 1
+        if circuit.failing_since is None:
+            circuit.failing_since = now
+
+        if circuit.probe_started_at is not None:
+            # Failed probe
+            circuit.cooldown = min(circuit.cooldown * 2, self.max_cooldown)
+        elif circuit.opened_until is None and circuit.failures >= self.failure_threshold:
+            circuit.cooldown = self.cooldown
+        else:
+            return
+
+        circuit.opened_until = now + circuit.cooldown
+        circuit.probe_started_at = None
+
+    def should_deactivate(self, subscription_id: int) -> bool:
+        circuit = self._circuits.get(subscription_id)
+        if not self.deactivate_after or circuit is None or circuit.opened_until is None:
+            return False
+        return time.monotonic() - circuit.failing_since >= self.deactivate_after
+
+    def reset(self, subscription_id: int) -> None:
+        self._circuits.pop(subscription_id, None)
+
+    def _claimable(self, subscription_id: int) -> bool:
+        circuit = self._circuits[subscription_id]
+        if circuit.opened_until is None:
+            return True
+        return self.state(subscription_id) == CircuitState.HALF_OPEN and (
+            circuit.probe_started_at is None
+            or time.monotonic() - circuit.probe_started_at >= self.probe_timeout
+        )
@@ -0,0 +1,9 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.webhook_config import get_settings
+from db import Database
+
+settings = get_settings()
+
+# Webhook tables live in their own database, shared by the app and the dispatcher
+database = Database(settings.WEBHOOK_DATABASE_URL, session_class=AsyncSession)
@@ -0,0 +1,176 @@
+import asyncio
+import gzip
+import hashlib
+import hmac
+import time
+from contextlib import asynccontextmanager
+from typing import NamedTuple, Optional
+
+import httpx
+
+from core.cache import TTLCache
+from core.webhook_config import get_settings
+from . import metrics
+
+settings = get_settings()
+
+SUCCESS_STATUS_CODES = {200, 201, 202, 204}
+
+BASE_HEADERS = {
+    "Content-Type": "application/json",
+    "User-Agent": "MyApp-Webhook/1.0",
+}
+
+# Signatures of single-event deliveries by (event id, SHA-256 of the secret):
+# subscribers sharing a secret get the same signature, computed once per event
+signature_cache = TTLCache(
+    max_size=settings.WEBHOOK_SIGNATURE_CACHE_MAX_SIZE,
+    ttl=settings.WEBHOOK_SIGNATURE_CACHE_TTL_SECONDS
+)
+
+
+class DeliveryResult(NamedTuple):
+    success: bool
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    elapsed: float = 0.0  # Seconds the request took, not counting the wait for a slot
+
+
+class HostLimiter:
+    """
+    Caps requests in flight, per receiver host and overall
+
+    The host slot is taken before the global one, so requests queued behind
+    a slow host do not hold global slots that other hosts could use.
+    Per-host semaphores are dropped once nobody holds or waits on them.
+    """
+
+    def __init__(self, max_in_flight: int, max_per_host: int):
+        self.max_per_host = max_per_host
+        self._global = asyncio.Semaphore(max_in_flight)
+        self._hosts: dict[str, tuple[asyncio.Semaphore, int]] = {}
+
+    @asynccontextmanager
+    async def limit(self, host: str):
+        semaphore, users = self._hosts.get(host, (None, 0))
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_per_host)
+        self._hosts[host] = (semaphore, users + 1)
+
+        try:
+            async with semaphore:
+                async with self._global:
+                    yield
+        finally:
+            semaphore, users = self._hosts[host]
+            if users == 1:
+                del self._hosts[host]
+            else:
+                self._hosts[host] = (semaphore, users - 1)
+
+    def in_flight(self, host: str) -> int:
+        """Requests holding or waiting for a slot on `host`"""
+        return self._hosts.get(host, (None, 0))[1]
+
+
+limiter = HostLimiter(settings.WEBHOOK_MAX_IN_FLIGHT, settings.WEBHOOK_MAX_PER_HOST)
+
+_webhook_client: Optional[httpx.AsyncClient] = None
+
+
+def get_webhook_client() -> httpx.AsyncClient:
+    """Return the shared delivery client, creating it on first use"""
+    global _webhook_client
+    if _webhook_client is None or _webhook_client.is_closed:
+        _webhook_client = httpx.AsyncClient(
+            http2=settings.WEBHOOK_HTTP2,
+            timeout=settings.WEBHOOK_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=settings.WEBHOOK_MAX_IN_FLIGHT,
+                max_keepalive_connections=settings.WEBHOOK_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.WEBHOOK_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _webhook_client
+
+
+async def close_webhook_client() -> None:
+    global _webhook_client
+    if _webhook_client is not None:
+        await _webhook_client.aclose()
+        _webhook_client = None
+
+
+def batch_body(payloads: list[bytes]) -> bytes:
+    """Join already serialized event payloads into one batch body, without parsing them"""
+    return b'{"events":[' + b",".join(payloads) + b"]}"
+
+
+def generate_signature(payload: bytes, secret: str) -> str:
+    signature = hmac.new(
+        secret.encode(),
+        payload,
+        hashlib.sha256
+    ).hexdigest()
+    return f"sha256={signature}"
+
+
+def event_signature(event_id: int, payload: bytes, secret: str) -> str:
+    key = (event_id, hashlib.sha256(secret.encode()).digest())
+    signature = signature_cache.get(key)
+    if signature is None:
+        signature = generate_signature(payload, secret)
+        signature_cache.set(key, signature)
+    return signature
+
+
+async def deliver_webhook(
+        url: str,
+        event: str,
+        content: bytes,
+        secret: Optional[str] = None,
+        compress: bool = False,
+        batch_size: Optional[int] = None,
+        event_id: Optional[int] = None
+) -> DeliveryResult:
+    """
+    Make a single delivery attempt, retries are scheduled by the dispatcher
+    For a batch, `content` is its batch_body and `event` is "batch".
+    The signature is over the uncompressed body, and memoized per event
+    when `event_id` is given.
+    """
+
+    headers = {**BASE_HEADERS, "X-Event-Type": event}
+
+    if batch_size is not None:
+        headers["X-Webhook-Batch-Size"] = str(batch_size)
+
+    if secret:
+        if event_id is not None:
+            headers["X-Webhook-Signature"] = event_signature(event_id, content, secret)
+        else:
+            headers["X-Webhook-Signature"] = generate_signature(content, secret)
+
+    if compress and len(content) >= settings.WEBHOOK_GZIP_MIN_BYTES:
+        # Large batches take milliseconds to compress, keep that off the event loop
+        content = await asyncio.to_thread(gzip.compress, content, settings.WEBHOOK_GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+
+    start = None
+    try:
+        async with limiter.limit(httpx.URL(url).netloc.decode()):
+            start = time.perf_counter()
+            metrics.in_flight.inc()
+            try:
+                response = await get_webhook_client().post(url, content=content, headers=headers)
+            finally:
+                metrics.in_flight.dec()
+    except Exception as e:
+        elapsed = time.perf_counter() - start if start is not None else 0.0
+        return DeliveryResult(success=False, error=str(e), elapsed=elapsed)
+
+    return DeliveryResult(
+        success=response.status_code in SUCCESS_STATUS_CODES,
+        status_code=response.status_code,
+        elapsed=time.perf_counter() - start
+    )
@@ -0,0 +1,558 @@
+import asyncio
+import random
+import signal
+import uuid
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+
+import orjson
+from sqlalchemy import and_, delete, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.webhook_config import get_settings
+from db import Database
+from . import metrics
+from .circuit import CircuitBreaker
+from .delivery import DeliveryResult, batch_body, close_webhook_client, deliver_webhook
+from .log_writer import WebhookLogWriter
+from .models import DeliveryStatus, WebhookDelivery, WebhookEvent, WebhookSubscription
+from .retention import compact_logs
+from .routing import subscription_router
+
+settings = get_settings()
+
+
+class ClaimedDelivery(NamedTuple):
+    id: int
+    subscription_id: int
+    event: str
+    event_id: int
+    attempts: int
+    due_at: datetime
+    lease_token: str
+    payload: bytes  # Shared by every delivery of the event in the same claim
+
+
+async def enqueue_event(db: AsyncSession, event: str, data: dict) -> int:
+    """
+    Store the event once, write one outbox row per matching subscription
+    and commit
+    Returns the number of deliveries queued; raises orjson.JSONEncodeError
+    if `data` cannot be serialized
+    """
+    now = datetime.utcnow()
+    payload = orjson.dumps({
+        "event": event,
+        "data": data,
+        "timestamp": now.isoformat()
+    }).decode()
+
+    routes = await subscription_router.match(db, event)
+    if not routes:
+        return 0
+
+    webhook_event = WebhookEvent(event=event, payload=payload)
+    db.add(webhook_event)
+    await db.flush()
+
+    await db.execute(insert(WebhookDelivery), [
+        {
+            "subscription_id": route.subscription_id,
+            "event": event,
+            "event_id": webhook_event.id,
+            "next_attempt_at": now + timedelta(seconds=route.delay)
+        }
+        for route in routes
+    ])
+    await db.commit()
+
+    metrics.events_enqueued.inc(event)
+    metrics.deliveries_enqueued.inc(event, amount=len(routes))
+    return len(routes)
+
+
+def backoff_delay(attempts: int) -> float:
+    """Exponential backoff with equal jitter, so retries of one outage spread out"""
+    delay = min(
+        settings.WEBHOOK_BACKOFF_MAX_SECONDS,
+        settings.WEBHOOK_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1)
+    )
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class WebhookDispatcher:
+    """
+    Delivers outbox rows with a pool of concurrent workers
+
+    A fetcher claims due rows by leasing them (status in_progress, a random
+    lease token and an expiry) and hands them to the workers. Each worker
+    makes one attempt per claim. Successful deliveries are removed from the
+    outbox. Failed ones go back to pending with the next attempt time stored
+    in the database, or are marked failed once out of attempts. A claim
+    whose lease expires (e.g. the process died) becomes due again, so
+    delivery is at-least-once across restarts and multiple dispatchers.
+    Every attempt is logged through a WebhookLogWriter, off the delivery path.
+    A CircuitBreaker defers the deliveries of subscriptions that keep failing,
+    so dead receivers do not take up workers, and deactivates them
+    eventually. Old logs are compacted periodically (see compact_logs).
+    """
+
+    def __init__(
+            self,
+            database: Database,
+            workers: int = settings.WEBHOOK_WORKERS,
+            claim_batch_size: int = settings.WEBHOOK_CLAIM_BATCH_SIZE,
+            lease_seconds: float = settings.WEBHOOK_LEASE_SECONDS,
+            poll_interval: float = settings.WEBHOOK_POLL_INTERVAL_SECONDS,
+            max_attempts: int = settings.WEBHOOK_MAX_ATTEMPTS,
+            log_retention_days: int = settings.WEBHOOK_LOG_RETENTION_DAYS
+    ):
+        self.database = database
+        self.workers = workers
+        self.claim_batch_size = claim_batch_size
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.log_retention_days = log_retention_days
+        self.log_writer = WebhookLogWriter(database)
+        self.circuit_breaker = CircuitBreaker()
+        self._queue: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._fetcher: Optional[asyncio.Task] = None
+        self._compactor: Optional[asyncio.Task] = None
+        self._worker_tasks: list[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return self._fetcher is not None
+
+    def start(self) -> None:
+        # A small local queue keeps claimed jobs from waiting out their lease here
+        self._queue = asyncio.Queue(maxsize=self.workers)
+        self._wakeup = asyncio.Event()
+        self.log_writer.start()
+        self._fetcher = asyncio.create_task(self._fetch_loop())
+        self._worker_tasks = [asyncio.create_task(self._work_loop()) for _ in range(self.workers)]
+        if self.log_retention_days:
+            self._compactor = asyncio.create_task(self._compact_loop())
+
+    def notify(self) -> None:
+        """Wake the fetcher now instead of at the next poll, after enqueueing"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def stop(self, timeout: float = settings.WEBHOOK_SHUTDOWN_TIMEOUT_SECONDS) -> None:
+        if self._fetcher is None:
+            return
+
+        for task in (self._fetcher, self._compactor):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._fetcher = None
+        self._compactor = None
+
+        # Hand back jobs nobody started, then let workers finish the ones in flight
+        unstarted = []
+        while not self._queue.empty():
+            unstarted.extend(self._queue.get_nowait())
+        metrics.dispatcher_queued.dec(amount=len(unstarted))
+        await self._release(unstarted)
+
+        for _ in self._worker_tasks:
+            self._queue.put_nowait(None)
+        done, pending = await asyncio.wait(self._worker_tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        await self.log_writer.stop()
+
+    async def run_until_idle(self) -> None:
+        """Deliver everything currently due, then return (benchmarks, scripts)"""
+        self.start()
+        try:
+            while True:
+                # Deliveries parked behind an open circuit are not due
+                query = (
+                    select(WebhookDelivery.id)
+                    .where(WebhookDelivery.status != DeliveryStatus.FAILED)
+                    .where(WebhookDelivery.next_attempt_at <= datetime.utcnow())
+                    .limit(1)
+                )
+                blocked = self.circuit_breaker.blocked()
+                if blocked:
+                    query = query.where(WebhookDelivery.subscription_id.not_in(blocked))
+
+                async with self.database.session_maker() as db:
+                    remaining = await db.scalar(query)
+                if remaining is None and self._queue.empty():
+                    break
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            await self.stop()
+
+    async def _fetch_loop(self) -> None:
+        while True:
+            try:
+                jobs = await self._claim(self.claim_batch_size)
+            except Exception as e:
+                print(f"Webhook dispatcher failed to claim jobs: {e}")
+                jobs = []
+
+            for group in await self._group(jobs):
+                metrics.dispatcher_queued.inc(amount=len(group))
+                try:
+                    await self._queue.put(group)
+                except asyncio.CancelledError:
+                    metrics.dispatcher_queued.dec(amount=len(group))
+                    raise
+
+            if len(jobs) < self.claim_batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def _compact_loop(self) -> None:
+        while True:
+            try:
+                removed = await compact_logs(self.database, self.log_retention_days)
+                if removed:
+                    print(f"Compacted {removed} webhook logs older than {self.log_retention_days} days")
+            except Exception as e:
+                print(f"Webhook log compaction failed: {e}")
+            await asyncio.sleep(settings.WEBHOOK_LOG_COMPACT_INTERVAL_SECONDS)
+
+    async def _work_loop(self) -> None:
+        while True:
+            jobs = await self._queue.get()
+            if jobs is None:
+                return
+            metrics.dispatcher_queued.dec(amount=len(jobs))
+            try:
+                await self._process(jobs)
+            except Exception as e:
+                # The lease expires and the jobs are retried
+                print(f"Webhook deliveries {[job.id for job in jobs]} failed unexpectedly: {e}")
+
+    async def _group(self, jobs: list[ClaimedDelivery]) -> list[list[ClaimedDelivery]]:
+        """
+        Split claimed jobs into work items: one per job, except that the
+        jobs of a subscription in batch mode stay together for one batch
+        """
+        if not jobs:
+            return []
+
+        async with self.database.session_maker() as db:
+            result = await db.execute(
+                select(WebhookSubscription.id)
+                .where(WebhookSubscription.id.in_({job.subscription_id for job in jobs}))
+                .where(WebhookSubscription.batch_max_size != None)
+            )
+            batched = set(result.scalars().all())
+
+        groups: dict[int, list[ClaimedDelivery]] = {}
+        singles = []
+        for job in jobs:
+            if job.subscription_id in batched:
+                groups.setdefault(job.subscription_id, []).append(job)
+            else:
+                singles.append([job])
+        return singles + list(groups.values())
+
+    async def _claim(self, limit: int) -> list[ClaimedDelivery]:
+        now = datetime.utcnow()
+
+        due = (
+            select(WebhookDelivery.id)
+            .where(or_(
+                and_(
+                    WebhookDelivery.status == DeliveryStatus.PENDING,
+                    WebhookDelivery.next_attempt_at <= now
+                ),
+                and_(
+                    WebhookDelivery.status == DeliveryStatus.IN_PROGRESS,
+                    WebhookDelivery.lease_expires_at <= now
+                ),
+            ))
+            .order_by(WebhookDelivery.next_attempt_at)
+            .limit(limit)
+        )
+        blocked = self.circuit_breaker.blocked()
+        if blocked:
+            due = due.where(WebhookDelivery.subscription_id.not_in(blocked))
+
+        return await self._lease(due)
+
+    async def _claim_batch(self, subscription_id: int, limit: int) -> list[ClaimedDelivery]:
+        """
+        Claim a subscription's pending deliveries to fill a batch: new ones
+        even if their batch window is still open, retries only when due
+        """
+        due = (
+            select(WebhookDelivery.id)
+            .where(WebhookDelivery.subscription_id == subscription_id)
+            .where(WebhookDelivery.status == DeliveryStatus.PENDING)
+            .where(or_(
+                WebhookDelivery.attempts == 0,
+                WebhookDelivery.next_attempt_at <= datetime.utcnow()
+            ))
+            .order_by(WebhookDelivery.id)
+            .limit(limit)
+        )
+        return await self._lease(due)
+
+    async def _lease(self, due) -> list[ClaimedDelivery]:
+        """Lease the deliveries selected by `due` in one UPDATE ... RETURNING"""
+        now = datetime.utcnow()
+        lease_token = uuid.uuid4().hex
+        due = due.with_for_update(skip_locked=True)  # Postgres; SQLite serializes writers anyway
+
+        async with self.database.session_maker() as db:
+            result = await db.execute(
+                update(WebhookDelivery)
+                .where(WebhookDelivery.id.in_(due.scalar_subquery()))
+                .values(
+                    status=DeliveryStatus.IN_PROGRESS,
+                    lease_token=lease_token,
+                    lease_expires_at=now + timedelta(seconds=self.lease_seconds),
+                    attempts=WebhookDelivery.attempts + 1
+                )
+                .returning(
+                    WebhookDelivery.id,
+                    WebhookDelivery.subscription_id,
+                    WebhookDelivery.event,
+                    WebhookDelivery.event_id,
+                    WebhookDelivery.attempts,
+                    WebhookDelivery.next_attempt_at
+                )
+                .execution_options(synchronize_session=False)
+            )
+            rows = result.all()
+
+            payloads = {}
+            if rows:
+                # Each payload is loaded and encoded once, however many deliveries share it
+                result = await db.execute(
+                    select(WebhookEvent.id, WebhookEvent.payload)
+                    .where(WebhookEvent.id.in_({row.event_id for row in rows}))
+                )
+                payloads = {event_id: payload.encode() for event_id, payload in result.all()}
+            await db.commit()
+
+        return sorted(
+            (ClaimedDelivery(*row, lease_token=lease_token, payload=payloads[row.event_id]) for row in rows),
+            key=lambda job: job.id
+        )
+
+    async def _process(self, jobs: list[ClaimedDelivery]) -> None:
+        """Deliver a work item: a single job, or jobs of one subscription in batch mode"""
+        subscription_id = jobs[0].subscription_id
+        async with self.database.session_maker() as db:
+            subscription = await db.get(WebhookSubscription, subscription_id)
+
+        if subscription is None:
+            # Unsubscribed while queued, nothing to deliver
+            await self._finish(jobs, delete(WebhookDelivery))
+            return
+
+        if not subscription.active:
+            # Kept for inspection, the subscription may be activated again
+            await self._finish(jobs, update(WebhookDelivery).values(
+                status=DeliveryStatus.FAILED,
+                lease_token=None,
+                lease_expires_at=None,
+                last_error="Subscription is inactive"
+            ))
+            return
+
+        if not self.circuit_breaker.allow(subscription_id):
+            # Circuit open, or another delivery is already probing it
+            await self._defer(jobs, self.circuit_breaker.retry_after(subscription_id))
+            return
+
+        if not subscription.batch_max_size:
+            for job in jobs:
+                result = await deliver_webhook(
+                    subscription.url,
+                    job.event,
+                    job.payload,
+                    subscription.secret,
+                    compress=subscription.gzip,
+                    event_id=job.event_id
+                )
+                await self._record(subscription, [job], result)
+            return
+
+        # Batch mode: keep sending full batches while the subscriber keeps up
+        pending = jobs
+        while True:
+            batch, pending, full = await self._fill_batch(subscription, pending)
+            if not batch:
+                return
+
+            result = await deliver_webhook(
+                subscription.url,
+                "batch",
+                batch_body([job.payload for job in batch]),
+                subscription.secret,
+                compress=subscription.gzip,
+                batch_size=len(batch)
+            )
+            await self._record(subscription, batch, result)
+
+            if not result.success:
+                await self._defer(pending, 0)
+                return
+            if not full:
+                return
+
+    async def _fill_batch(
+            self,
+            subscription: WebhookSubscription,
+            pending: list[ClaimedDelivery]
+    ) -> tuple[list[ClaimedDelivery], list[ClaimedDelivery], bool]:
+        """
+        Take the next batch from `pending`, topped up with the subscription's
+        other pending deliveries; returns the batch, what is left and
+        whether the batch is full
+        """
+        max_size = subscription.batch_max_size
+        max_bytes = subscription.batch_max_bytes or settings.WEBHOOK_BATCH_MAX_BYTES
+
+        if len(pending) < max_size:
+            pending = pending + await self._claim_batch(subscription.id, max_size - len(pending))
+        batch, rest = pending[:max_size], pending[max_size:]
+
+        size = 0
+        for count, job in enumerate(batch):
+            size += len(job.payload) + 2
+            if size > max_bytes and count > 0:
+                # Over the byte limit, the rest starts the next batch
+                return batch[:count], batch[count:] + rest, True
+
+        return batch, rest, len(batch) >= max_size
+
+    async def _record(
+            self,
+            subscription: WebhookSubscription,
+            jobs: list[ClaimedDelivery],
+            result: DeliveryResult
+    ) -> None:
+        """Store the outcome of one request, for a single delivery or a batch"""
+        metrics.record_attempt(jobs, result.success, result.elapsed, self.max_attempts)
+        if result.success:
+            self.circuit_breaker.record_success(subscription.id)
+            await self._finish(jobs, delete(WebhookDelivery))
+        else:
+            self.circuit_breaker.record_failure(subscription.id)
+            if self.circuit_breaker.should_deactivate(subscription.id):
+                await self._deactivate(subscription.id)
+
+            outcome = {
+                "lease_token": None,
+                "lease_expires_at": None,
+                "last_status_code": result.status_code,
+                "last_error": result.error,
+            }
+            exhausted = [job for job in jobs if job.attempts >= self.max_attempts]
+            retrying = [job for job in jobs if job.attempts < self.max_attempts]
+            if exhausted:
+                await self._finish(exhausted, update(WebhookDelivery).values(
+                    status=DeliveryStatus.FAILED,
+                    **outcome
+                ))
+            if retrying:
+                delay = backoff_delay(max(job.attempts for job in retrying))
+                await self._finish(retrying, update(WebhookDelivery).values(
+                    status=DeliveryStatus.PENDING,
+                    next_attempt_at=datetime.utcnow() + timedelta(seconds=delay),
+                    **outcome
+                ))
+
+        for job in jobs:
+            await self._log(job, result)
+
+    async def _finish(self, jobs: list[ClaimedDelivery], statement) -> None:
+        """Apply the outcome only to the deliveries whose lease we still hold"""
+        if not jobs:
+            return
+
+        leases: dict[str, list[int]] = {}
+        for job in jobs:
+            leases.setdefault(job.lease_token, []).append(job.id)
+
+        async with self.database.session_maker() as db:
+            for lease_token, ids in leases.items():
+                await db.execute(
+                    statement
+                    .where(WebhookDelivery.id.in_(ids))
+                    .where(WebhookDelivery.lease_token == lease_token)
+                    .execution_options(synchronize_session=False)
+                )
+            await db.commit()
+
+    async def _log(self, job: ClaimedDelivery, result: DeliveryResult) -> None:
+        await self.log_writer.write(
+            subscription_id=job.subscription_id,
+            event=job.event,
+            event_id=job.event_id,
+            status_code=result.status_code,
+            success=result.success,
+            attempts=job.attempts,
+            error_message=result.error
+        )
+
+    async def _release(self, jobs: list[ClaimedDelivery]) -> None:
+        """Return claimed but unstarted jobs to the outbox without using an attempt"""
+        await self._defer(jobs, 0)
+
+    async def _defer(self, jobs: list[ClaimedDelivery], delay: float) -> None:
+        await self._finish(jobs, update(WebhookDelivery).values(
+            status=DeliveryStatus.PENDING,
+            lease_token=None,
+            lease_expires_at=None,
+            attempts=WebhookDelivery.attempts - 1,
+            next_attempt_at=datetime.utcnow() + timedelta(seconds=delay)
+        ))
+
+    async def _deactivate(self, subscription_id: int) -> None:
+        async with self.database.session_maker() as db:
+            await db.execute(
+                update(WebhookSubscription)
+                .where(WebhookSubscription.id == subscription_id)
+                .values(active=False)
+            )
+            await db.commit()
+
+        # The circuit stays open until the subscription is activated again, so
+        # deliveries already claimed for it are not attempted
+        subscription_router.invalidate()
+        print(f"Webhook subscription {subscription_id} deactivated after failing continuously")
+
+
+async def main():
+    """Run the dispatcher as its own process: python -m webhooks.dispatcher"""
+    from .db import database
+    from .models import Base
+
+    await database.create_all(Base.metadata)
+    dispatcher = WebhookDispatcher(database)
+    dispatcher.start()
+    print(f"Webhook dispatcher running with {dispatcher.workers} workers")
+
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+    await stopped.wait()
+
+    await dispatcher.stop()
+    await close_webhook_client()
+    await database.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
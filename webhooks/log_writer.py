@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import insert
+
+from core.webhook_config import get_settings
+from db import Database
+from .models import WebhookLog
+
+settings = get_settings()
+
+
+class WebhookLogWriter:
+    """
+    Writes delivery attempt logs in the background, in bulk
+
+    Records are queued in memory and a single writer task inserts them in one
+    transaction per batch: up to `batch_size` records, or whatever arrived
+    within `flush_interval` seconds of the first one. A full queue makes
+    `write` wait, which slows delivery down instead of growing without bound.
+    Logs are a record of attempts, not the delivery state; the outbox is, so
+    a crash loses at most the unflushed logs.
+    """
+
+    def __init__(
+            self,
+            database: Database,
+            batch_size: int = settings.WEBHOOK_LOG_BATCH_SIZE,
+            flush_interval: float = settings.WEBHOOK_LOG_FLUSH_INTERVAL_SECONDS,
+            max_queue_size: int = settings.WEBHOOK_LOG_QUEUE_MAX_SIZE
+    ):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def write(self, **record) -> None:
+        """Queue one webhook_logs row, given as column values"""
+        record.setdefault("created_at", datetime.utcnow())
+        await self._queue.put(record)
+
+    async def stop(self) -> None:
+        """Flush everything queued so far, then stop the writer"""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch = [await self._queue.get()]
+            deadline = asyncio.get_running_loop().time() + self.flush_interval
+
+            # Stop collecting at the sentinel, so stop() does not wait out the interval
+            while len(batch) < self.batch_size and batch[-1] is not None:
+                timeout = deadline - asyncio.get_running_loop().time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            if None in batch:
+                stopping = True
+                batch = [record for record in batch if record is not None]
+            if batch:
+                await self._flush(batch)
+
+    async def _flush(self, batch: list[dict]) -> None:
+        try:
+            async with self.database.session_maker() as db:
+                await db.execute(insert(WebhookLog), batch)
+                await db.commit()
+        except Exception as e:
+            print(f"Failed to write {len(batch)} webhook logs: {e}")
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+from core.metrics import MetricsRegistry
+
+# Metrics of this process; the dispatcher's are only complete here when it
+# is embedded in the app (WEBHOOK_DISPATCHER_EMBEDDED)
+registry = MetricsRegistry()
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 15)
+QUEUED_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+RETRY_BUCKETS = (0, 1, 2, 3, 5, 10)
+
+events_enqueued = registry.counter(
+    "webhook_events_enqueued_total", "Events stored for delivery", ("event",)
+)
+deliveries_enqueued = registry.counter(
+    "webhook_deliveries_enqueued_total", "Outbox rows written, one per matching subscription", ("event",)
+)
+# Per event and per subscription separately, not by both, to keep the
+# number of series down with many subscribers
+attempts = registry.counter(
+    "webhook_delivery_attempts_total", "Delivery attempts by event", ("event", "result")
+)
+subscription_attempts = registry.counter(
+    "webhook_subscription_delivery_attempts_total", "Delivery attempts by subscription", ("subscription_id", "result")
+)
+subscription_seconds = registry.counter(
+    "webhook_subscription_request_seconds_total",
+    "Time spent in requests to the subscription, for its mean latency",
+    ("subscription_id",)
+)
+request_latency = registry.histogram(
+    "webhook_request_duration_seconds", "Duration of webhook requests, a batch counting once", LATENCY_BUCKETS
+)
+queued_time = registry.histogram(
+    "webhook_delivery_queued_seconds", "Time from a delivery becoming due to its attempt starting", QUEUED_BUCKETS
+)
+retries = registry.histogram(
+    "webhook_delivery_retries", "Retries of deliveries that succeeded or ran out of attempts", RETRY_BUCKETS
+)
+in_flight = registry.gauge(
+    "webhook_requests_in_flight", "Webhook requests being sent"
+)
+dispatcher_queued = registry.gauge(
+    "webhook_dispatcher_queued_deliveries", "Claimed deliveries waiting for a worker"
+)
+outbox_pending = registry.gauge(
+    "webhook_outbox_pending_deliveries", "Deliveries pending in the outbox, due or not"
+)
+
+
+def record_attempt(jobs: list, success: bool, elapsed: float, max_attempts: int) -> None:
+    """Count one request's outcome for each delivery it carried (ClaimedDelivery)"""
+    result = "success" if success else "failure"
+    subscription_id = str(jobs[0].subscription_id)
+    started = datetime.utcnow() - timedelta(seconds=elapsed)
+
+    request_latency.observe(elapsed)
+    subscription_seconds.inc(subscription_id, amount=elapsed)
+    subscription_attempts.inc(subscription_id, result, amount=len(jobs))
+
+    for job in jobs:
+        attempts.inc(job.event, result)
+        # A batch can take new deliveries before their batch window ends
+        queued_time.observe(max(0.0, (started - job.due_at).total_seconds()))
+        if success or job.attempts >= max_attempts:
+            retries.observe(job.attempts - 1)
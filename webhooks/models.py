@@ -0,0 +1,104 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, Text, Index, ForeignKey, Float
+from sqlalchemy.orm import declarative_base
+
+Base = declarative_base()
+
+
+class DeliveryStatus:
+    PENDING = "pending"
+    IN_PROGRESS = "in_progress"
+    FAILED = "failed"  # Out of attempts, kept for inspection
+
+
+class WebhookSubscription(Base):
+    __tablename__ = "webhook_subscriptions"
+
+    id = Column(Integer, primary_key=True)
+    url = Column(String, nullable=False)
+    events = Column(Text, nullable=False)  # JSON array as string, routing uses webhook_subscription_events
+    secret = Column(String, nullable=True)
+    active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    # Batch mode: events are grouped into one request of up to this many, None sends one per request
+    batch_max_size = Column(Integer, nullable=True)
+    batch_max_bytes = Column(Integer, nullable=True)  # None uses WEBHOOK_BATCH_MAX_BYTES
+    batch_window_seconds = Column(Float, nullable=True)  # None uses WEBHOOK_BATCH_WINDOW_SECONDS
+    gzip = Column(Boolean, default=False)  # Content-Encoding: gzip for bodies of WEBHOOK_GZIP_MIN_BYTES or more
+
+
+class WebhookSubscriptionEvent(Base):
+    """One event name a subscription receives ("*" for all), indexed for routing"""
+    __tablename__ = "webhook_subscription_events"
+
+    # Primary key leads with event, so looking up an event's subscribers is an index range scan
+    event = Column(String, primary_key=True)
+    subscription_id = Column(
+        Integer,
+        ForeignKey("webhook_subscriptions.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True  # For the cascade when a subscription is deleted
+    )
+
+
+class WebhookEvent(Base):
+    """An event's payload, stored once however many subscriptions receive it"""
+    __tablename__ = "webhook_events"
+
+    id = Column(Integer, primary_key=True)
+    event = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)  # The JSON body as sent
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class WebhookLog(Base):
+    __tablename__ = "webhook_logs"
+    __table_args__ = (
+        # Newest-first pages per subscription, keyed by id
+        Index("ix_webhook_logs_subscription", "subscription_id", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    subscription_id = Column(Integer, nullable=False)
+    event = Column(String, nullable=False)
+    event_id = Column(Integer, ForeignKey("webhook_events.id"), nullable=False, index=True)
+    status_code = Column(Integer, nullable=True)
+    success = Column(Boolean, default=False)
+    attempts = Column(Integer, default=1)
+    error_message = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # Retention works by day
+
+
+class WebhookLogSummary(Base):
+    """Daily totals of webhook_logs rows removed by retention"""
+    __tablename__ = "webhook_log_summaries"
+
+    day = Column(Date, primary_key=True)
+    subscription_id = Column(Integer, primary_key=True)
+    event = Column(String, primary_key=True)
+    attempts = Column(Integer, nullable=False)  # One per log row
+    successes = Column(Integer, nullable=False)
+
+
+class WebhookDelivery(Base):
+    """Outbox: one event waiting to be delivered to one subscription"""
+    __tablename__ = "webhook_deliveries"
+    __table_args__ = (
+        Index("ix_webhook_deliveries_due", "status", "next_attempt_at"),
+        Index("ix_webhook_deliveries_lease", "status", "lease_expires_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    subscription_id = Column(Integer, nullable=False, index=True)
+    event = Column(String, nullable=False)
+    event_id = Column(Integer, ForeignKey("webhook_events.id"), nullable=False, index=True)
+    status = Column(String, nullable=False, default=DeliveryStatus.PENDING)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # Set while a dispatcher worker holds the job
+    lease_token = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    last_status_code = Column(Integer, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,96 @@
+from datetime import datetime, time, timedelta
+from typing import Optional
+
+from sqlalchemy import Date, case, delete, exists, func, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db import Database
+from .models import WebhookDelivery, WebhookEvent, WebhookLog, WebhookLogSummary
+
+SUMMARY_COLUMNS = ["day", "subscription_id", "event", "attempts", "successes"]
+
+
+def _summarize(day, logs):
+    """Per (subscription, event) totals of the `logs` rows (the table or the deleted rows)"""
+    return (
+        select(
+            literal(day, Date),
+            logs.c.subscription_id,
+            logs.c.event,
+            func.count(),
+            func.sum(case((logs.c.success == True, 1), else_=0))
+        )
+        .group_by(logs.c.subscription_id, logs.c.event)
+    )
+
+
+def _add_to_summaries(dialect, rows):
+    """INSERT the summary rows, adding to the totals of a day already summarized"""
+    upsert = dialect.insert(WebhookLogSummary).from_select(SUMMARY_COLUMNS, rows)
+    return upsert.on_conflict_do_update(
+        index_elements=[WebhookLogSummary.day, WebhookLogSummary.subscription_id, WebhookLogSummary.event],
+        set_={
+            "attempts": WebhookLogSummary.attempts + upsert.excluded.attempts,
+            "successes": WebhookLogSummary.successes + upsert.excluded.successes,
+        }
+    )
+
+
+async def compact_logs(database: Database, retention_days: int, now: Optional[datetime] = None) -> int:
+    """
+    Fold webhook_logs older than `retention_days` whole days into daily
+    webhook_log_summaries rows and delete them, one day per transaction so
+    writers are never held up for long. Events no longer referenced by a
+    log or an outbox row are deleted as well.
+    Several dispatchers may compact at once: a log row is only counted by
+    the transaction that deletes it, and totals for a day that is already
+    summarized are added to.
+    Returns the number of log rows removed.
+    """
+    now = now or datetime.utcnow()
+    cutoff = datetime.combine(now.date() - timedelta(days=retention_days), time.min)
+    postgres = database.engine.dialect.name == "postgresql"
+    removed = 0
+
+    while True:
+        async with database.session_maker() as db:
+            oldest = await db.scalar(select(func.min(WebhookLog.created_at)))
+        if oldest is None or oldest >= cutoff:
+            break
+
+        day_start = datetime.combine(oldest.date(), time.min)
+        day_end = day_start + timedelta(days=1)
+        in_day = (WebhookLog.created_at >= day_start, WebhookLog.created_at < day_end)
+
+        # A new transaction, whose first statement writes
+        async with database.session_maker() as db:
+            if postgres:
+                # Summarize exactly the rows this statement deletes; a concurrent
+                # compaction that deleted them first leaves none to count twice
+                deleted = (
+                    delete(WebhookLog).where(*in_day)
+                    .returning(WebhookLog.subscription_id, WebhookLog.event, WebhookLog.success)
+                    .cte("deleted")
+                )
+                summaries = _add_to_summaries(postgresql, _summarize(day_start.date(), deleted)).cte("summaries")
+                removed += await db.scalar(select(func.count()).select_from(deleted).add_cte(summaries))
+            else:
+                # SQLite has one writer at a time, and a statement that has to wait
+                # for it sees the rows a concurrent compaction left
+                await db.execute(_add_to_summaries(
+                    sqlite, _summarize(day_start.date(), WebhookLog.__table__).where(*in_day)
+                ))
+                result = await db.execute(delete(WebhookLog).where(*in_day))
+                removed += result.rowcount
+            await db.commit()
+
+    async with database.session_maker() as db:
+        await db.execute(
+            delete(WebhookEvent)
+            .where(WebhookEvent.created_at < cutoff)
+            .where(~exists().where(WebhookLog.event_id == WebhookEvent.id))
+            .where(~exists().where(WebhookDelivery.event_id == WebhookEvent.id))
+        )
+        await db.commit()
+
+    return removed
@@ -0,0 +1,101 @@
+import json
+from typing import Iterable, NamedTuple
+
+from sqlalchemy import exists, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.cache import TTLCache
+from core.webhook_config import get_settings
+from .models import WebhookSubscription, WebhookSubscriptionEvent
+
+settings = get_settings()
+
+WILDCARD = "*"
+
+
+class Route(NamedTuple):
+    subscription_id: int
+    delay: float  # Seconds new events wait before delivery, the batch window in batch mode
+
+
+class SubscriptionRouter:
+    """
+    Finds the active subscriptions for an event name, and how long their
+    new events wait before delivery
+
+    Lookups go through webhook_subscription_events, so they cost about as
+    much as the number of matching subscriptions, and results are cached
+    per event name. Anything that changes subscriptions must call
+    `invalidate`. A generation counter keeps a lookup that raced with an
+    invalidation from putting its stale result back in the cache.
+    """
+
+    def __init__(
+            self,
+            max_size: int = settings.WEBHOOK_ROUTING_CACHE_MAX_SIZE,
+            ttl: float = settings.WEBHOOK_ROUTING_CACHE_TTL_SECONDS
+    ):
+        self.cache = TTLCache(max_size=max_size, ttl=ttl)
+        self._generation = 0
+
+    async def match(self, db: AsyncSession, event: str) -> tuple[Route, ...]:
+        routes = self.cache.get(event)
+        if routes is not None:
+            return routes
+
+        generation = self._generation
+        result = await db.execute(
+            select(
+                WebhookSubscription.id,
+                WebhookSubscription.batch_max_size,
+                WebhookSubscription.batch_window_seconds
+            )
+            .join(WebhookSubscriptionEvent, WebhookSubscription.id == WebhookSubscriptionEvent.subscription_id)
+            .where(WebhookSubscriptionEvent.event.in_((event, WILDCARD)))
+            .where(WebhookSubscription.active == True)
+            .distinct()
+        )
+        routes = tuple(
+            Route(subscription_id, batch_window if batch_window is not None else settings.WEBHOOK_BATCH_WINDOW_SECONDS)
+            if batch_max_size else Route(subscription_id, 0.0)
+            for subscription_id, batch_max_size, batch_window in result.all()
+        )
+
+        if generation == self._generation:
+            self.cache.set(event, routes)
+        return routes
+
+    def invalidate(self) -> None:
+        # Wildcard subscriptions belong to every event name, so clear them all
+        self._generation += 1
+        self.cache.clear()
+
+
+def subscription_events(subscription_id: int, events: Iterable[str]) -> list[WebhookSubscriptionEvent]:
+    return [
+        WebhookSubscriptionEvent(subscription_id=subscription_id, event=event)
+        for event in set(events)
+    ]
+
+
+async def backfill_subscription_events(db: AsyncSession) -> int:
+    """
+    Create routing rows for subscriptions that have none, such as ones
+    created before webhook_subscription_events existed
+    """
+    result = await db.execute(
+        select(WebhookSubscription.id, WebhookSubscription.events)
+        .where(~exists().where(WebhookSubscriptionEvent.subscription_id == WebhookSubscription.id))
+    )
+    rows = [
+        {"subscription_id": subscription_id, "event": event}
+        for subscription_id, events in result.all()
+        for event in set(json.loads(events))
+    ]
+    if rows:
+        await db.execute(insert(WebhookSubscriptionEvent), rows)
+    await db.commit()
+    return len(rows)
+
+
+subscription_router = SubscriptionRouter()